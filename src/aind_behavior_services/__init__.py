@@ -1,9 +1,45 @@
 __version__ = "0.10.2"
 
+import importlib
 import logging
+from typing import TYPE_CHECKING
 
-from .rig import AindBehaviorRigModel  # noqa: F401
-from .session import AindBehaviorSessionModel  # noqa: F401
-from .task_logic import AindBehaviorTaskLogicModel  # noqa: F401
+if TYPE_CHECKING:
+    from .rig import AindBehaviorRigModel  # noqa: F401
+    from .session import AindBehaviorSessionModel  # noqa: F401
+    from .task_logic import AindBehaviorTaskLogicModel  # noqa: F401
 
 logger = logging.getLogger(__name__)
+
+# Submodules and top-level models are only imported on first access,
+# so that importing a single subpackage does not build every model.
+_LAZY_SUBMODULES = (
+    "base",
+    "calibration",
+    "data_types",
+    "db_utils",
+    "patterns",
+    "rig",
+    "session",
+    "task_logic",
+    "utils",
+)
+_LAZY_ATTRIBUTES = {
+    "AindBehaviorRigModel": "rig",
+    "AindBehaviorSessionModel": "session",
+    "AindBehaviorTaskLogicModel": "task_logic",
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(f"{__name__}.{_LAZY_ATTRIBUTES[name]}"), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted({*globals(), *_LAZY_SUBMODULES, *_LAZY_ATTRIBUTES})
@@ -13,8 +13,6 @@ from typing import (
     get_args,
 )
 
-import git
-from aind_behavior_curriculum.task import SEMVER_REGEX
 from pydantic import (
     AwareDatetime,
     BaseModel,
@@ -32,6 +30,13 @@ from aind_behavior_services import __version__ as pkg_version
 
 logger = logging.getLogger(__name__)
 
+# Same pattern as `aind_behavior_curriculum.task.SEMVER_REGEX`, defined here to avoid importing the curriculum package
+SEMVER_REGEX = (
+    r"^(0|[1-9]\d*)\.(0|[1-9]\d*)\.(0|[1-9]\d*)"
+    r"(?:-((?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*))*))?"
+    r"(?:\+([0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?$"
+)
+
 
 class SchemaVersionedModel(BaseModel):
     aind_behavior_services_pkg_version: Literal[pkg_version] = Field(
@@ -103,6 +108,8 @@ def coerce_schema_version(
 
 def get_commit_hash(repository: Optional[PathLike] = None) -> str:
     """Get the commit hash of the repository."""
+    import git
+
     try:
         if repository is None:
             repo = git.Repo(search_parent_directories=True)
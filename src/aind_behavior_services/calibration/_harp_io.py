@@ -0,0 +1,78 @@
+import logging
+import os
+from os import PathLike
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Harp binary protocol. Mirrors the definitions of `harp.io`, which reads whole files into memory.
+_SECONDS_PER_TICK = 32e-6
+_PAYLOAD_TIMESTAMP_MASK = 0x10
+_DTYPE_FROM_PAYLOAD_TYPE = {
+    1: np.dtype(np.uint8),
+    2: np.dtype(np.uint16),
+    4: np.dtype(np.uint32),
+    8: np.dtype(np.uint64),
+    129: np.dtype(np.int8),
+    130: np.dtype(np.int16),
+    132: np.dtype(np.int32),
+    136: np.dtype(np.int64),
+    68: np.dtype(np.float32),
+}
+
+
+def iter_register_chunks(
+    path: PathLike,
+    chunk_size: int = 1 << 16,
+    address: Optional[int] = None,
+    dtype: Optional[np.dtype] = None,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Reads timestamped single-register Harp data in chunks of messages.
+
+    The file is memory-mapped, so only one chunk is held in memory at a time.
+
+    Args:
+        path (PathLike): Path to the binary file of a single device register.
+        chunk_size (int, optional): Maximum number of messages per chunk. Defaults to 65536.
+        address (Optional[int], optional): Expected register address. Defaults to None.
+        dtype (Optional[np.dtype], optional): Expected payload data type. Defaults to None.
+
+    Yields:
+        Tuple[np.ndarray, np.ndarray]: Timestamps in seconds, and payloads of shape (messages, payload length).
+
+    Raises:
+        ValueError: If the messages are not timestamped, or do not match the expected address or type.
+    """
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be positive.")
+    if os.path.getsize(path) == 0:
+        return
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    if address is not None and address != data[2]:
+        raise ValueError(f"Expected address {address} but got {data[2]}.")
+    payload_type = int(data[4])
+    if payload_type & _PAYLOAD_TIMESTAMP_MASK == 0:
+        raise ValueError("Only timestamped messages are supported.")
+    payload_dtype = _DTYPE_FROM_PAYLOAD_TYPE[payload_type & ~_PAYLOAD_TIMESTAMP_MASK]
+    if dtype is not None and np.dtype(dtype) != payload_dtype:
+        raise ValueError(f"Expected payload type {np.dtype(dtype)} but got {payload_dtype}.")
+
+    stride = int(data[1]) + 2
+    rows = len(data) // stride
+    payload_length = (stride - 12) // payload_dtype.itemsize
+    for start in range(0, rows, chunk_size):
+        count = min(chunk_size, rows - start)
+        offset = start * stride
+        seconds = np.ndarray(count, dtype=np.uint32, buffer=data, offset=offset + 5, strides=stride)
+        ticks = np.ndarray(count, dtype=np.uint16, buffer=data, offset=offset + 9, strides=stride)
+        payload = np.ndarray(
+            (count, payload_length),
+            dtype=payload_dtype,
+            buffer=data,
+            offset=offset + 11,
+            strides=(stride, payload_dtype.itemsize),
+        )
+        # Copy the payload, so that chunks do not keep the memory map alive
+        yield seconds + ticks * _SECONDS_PER_TICK, np.array(payload)
@@ -1,7 +1,9 @@
 import logging
 from enum import IntEnum
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, NamedTuple, Optional, Sequence, Union
 
+import numpy as np
+from numpy.typing import ArrayLike
 from pydantic import BaseModel, Field
 
 from aind_behavior_services.calibration import Calibration
@@ -94,6 +96,215 @@ class AindManipulatorCalibrationInput(BaseModel):
     )
 
 
+_AXES = (Axis.X, Axis.Y1, Axis.Y2, Axis.Z)
+"""Axes in the order of the fields of `ManipulatorPosition`, which is the column order of position arrays."""
+
+
+def trapezoidal_move_time(
+    steps: ArrayLike,
+    step_interval: ArrayLike,
+    maximum_step_interval: ArrayLike,
+    step_acceleration_interval: ArrayLike,
+) -> np.ndarray:
+    """Estimates the duration of moves with a discrete trapezoidal velocity profile.
+
+    A move starts with a step interval of `maximum_step_interval`, which is shortened by
+    `step_acceleration_interval` on every step until it reaches `step_interval`, and is ramped back
+    symmetrically before stopping. Moves that are too short to reach `step_interval` follow a
+    triangular profile. All arguments are broadcast against each other, and intervals are in microseconds.
+
+    Args:
+        steps (ArrayLike): Number of (micro)steps of each move. The sign is ignored.
+        step_interval (ArrayLike): Step interval at cruise speed (us).
+        maximum_step_interval (ArrayLike): Step interval when starting or stopping (us).
+        step_acceleration_interval (ArrayLike): Change of the step interval per step (us).
+
+    Returns:
+        np.ndarray: Duration of each move (s).
+    """
+    steps = np.abs(np.asarray(steps, dtype=np.int64))
+    step_interval = np.asarray(step_interval, dtype=float)
+    start_interval = np.maximum(np.asarray(maximum_step_interval, dtype=float), step_interval)
+    acceleration = np.asarray(step_acceleration_interval, dtype=float)
+
+    # Number of steps taken at intervals longer than the cruise interval, while accelerating
+    ramp_steps = np.ceil((start_interval - step_interval) / acceleration).astype(np.int64)
+    accelerating = np.minimum(ramp_steps, (steps + 1) // 2)
+    decelerating = np.minimum(ramp_steps, steps // 2)
+
+    def ramp_time(count: np.ndarray) -> np.ndarray:
+        # Sum of the first `count` intervals of the ramp: start, start - a, start - 2a, ...
+        return count * start_interval - acceleration * count * (count - 1) / 2
+
+    cruise_steps = steps - accelerating - decelerating
+    total = ramp_time(accelerating) + ramp_time(decelerating) + cruise_steps * step_interval
+    return total * 1e-6
+
+
+class MotionPlan(NamedTuple):
+    """Estimated timing of a manipulator move, split into stages that run one after the other.
+
+    All axes within a stage move concurrently, so each stage lasts as long as its slowest axis.
+    """
+
+    stages: List[List[Axis]]
+    """Axes that move in each stage."""
+    stage_times: List[float]
+    """Duration of each stage (s)."""
+    axis_times: Dict[Axis, float]
+    """Duration of the move of each axis (s)."""
+
+    @property
+    def total_time(self) -> float:
+        """Duration of the whole plan (s)."""
+        return float(sum(self.stage_times))
+
+    @property
+    def sequential_time(self) -> float:
+        """Duration if every axis moved on its own, one after the other (s)."""
+        return float(sum(self.axis_times.values()))
+
+
+class ManipulatorMotionPlanner:
+    """Converts manipulator positions to motor steps and estimates the duration of moves.
+
+    Positions are arrays with one column per axis, in the order of the fields of `ManipulatorPosition`
+    (x, y1, y2, z), or `ManipulatorPosition` objects. Steps are counted in microsteps, i.e.
+    `full_step_to_mm` divided by the microstep resolution of each axis. Axes without an
+    `AxisConfiguration` are disabled: their position must stay at 0, so moving them raises a
+    ValueError, and they are not homed.
+
+    Args:
+        calibration (AindManipulatorCalibrationInput): The manipulator calibration.
+    """
+
+    def __init__(self, calibration: AindManipulatorCalibrationInput) -> None:
+        self.calibration = calibration
+        configurations = {c.axis: c for c in calibration.axis_configuration}
+        self.enabled = np.array([axis in configurations for axis in _AXES])
+        # Disabled axes keep the default configuration, so that conversions stay defined at position 0
+        self.axis_configuration = [configurations.get(axis, AxisConfiguration(axis=axis)) for axis in _AXES]
+        full_step_to_mm = self.to_array(calibration.full_step_to_mm)
+        microsteps = np.array([8 << int(c.microstep_resolution) for c in self.axis_configuration])
+        self.mm_per_step = full_step_to_mm / microsteps
+        # A limit of 0 disables it, while disabled axes are held at 0
+        min_limit = [c.min_limit if c.min_limit != 0 else -np.inf for c in self.axis_configuration]
+        max_limit = [c.max_limit if c.max_limit != 0 else np.inf for c in self.axis_configuration]
+        self.min_limit = np.where(self.enabled, min_limit, 0.0)
+        self.max_limit = np.where(self.enabled, max_limit, 0.0)
+
+    @staticmethod
+    def to_array(positions: Union[ArrayLike, ManipulatorPosition, Sequence[ManipulatorPosition]]) -> np.ndarray:
+        """Converts one or more `ManipulatorPosition` objects to an array of positions."""
+        if isinstance(positions, ManipulatorPosition):
+            return np.array([positions.x, positions.y1, positions.y2, positions.z], dtype=float)
+        if len(positions) > 0 and isinstance(positions[0], ManipulatorPosition):
+            return np.array([[p.x, p.y1, p.y2, p.z] for p in positions], dtype=float)
+        return np.asarray(positions, dtype=float)
+
+    def to_steps(
+        self,
+        positions: Union[ArrayLike, ManipulatorPosition, Sequence[ManipulatorPosition]],
+        out_of_range: Literal["raise", "clip"] = "raise",
+    ) -> np.ndarray:
+        """Converts positions (mm) to motor steps, enforcing the limits of each axis.
+
+        Args:
+            positions (Union[ArrayLike, ManipulatorPosition, Sequence[ManipulatorPosition]]): Positions (mm).
+            out_of_range (Literal["raise", "clip"], optional): Whether positions outside of the axis limits,
+              or away from 0 on disabled axes, raise a ValueError, or are clipped. Defaults to "raise".
+
+        Returns:
+            np.ndarray: Steps of each axis, rounded to the nearest step.
+        """
+        positions = self.to_array(positions)
+        outside = (positions < self.min_limit) | (positions > self.max_limit)
+        if np.any(outside):
+            if out_of_range == "raise":
+                outside = np.any(outside.reshape(-1, len(_AXES)), axis=0)
+                disabled = [_AXES[i].name for i in np.flatnonzero(outside & ~self.enabled)]
+                if disabled:
+                    raise ValueError(f"Axes {disabled} are not configured, and must stay at 0.")
+                axes = [_AXES[i].name for i in np.flatnonzero(outside)]
+                raise ValueError(f"Positions of axes {axes} are outside of their limits.")
+            positions = np.clip(positions, self.min_limit, self.max_limit)
+        return np.rint(positions / self.mm_per_step).astype(np.int64)
+
+    def to_position(self, steps: ArrayLike) -> np.ndarray:
+        """Converts motor steps to positions (mm)."""
+        return np.asarray(steps, dtype=float) * self.mm_per_step
+
+    def move_time(self, steps: ArrayLike) -> np.ndarray:
+        """Estimates the duration (s) of moving each axis by a number of steps."""
+        return trapezoidal_move_time(
+            steps,
+            [c.step_interval for c in self.axis_configuration],
+            [c.maximum_step_interval for c in self.axis_configuration],
+            [c.step_acceleration_interval for c in self.axis_configuration],
+        )
+
+    def plan_move(
+        self,
+        start: Union[ArrayLike, ManipulatorPosition],
+        target: Union[ArrayLike, ManipulatorPosition],
+        max_concurrent_axes: Optional[int] = None,
+    ) -> MotionPlan:
+        """Plans a move between two positions, moving as many axes concurrently as allowed.
+
+        With at most `max_concurrent_axes` axes per stage, the total time is minimized by grouping
+        axes with similar move durations, longest first.
+
+        Args:
+            start (Union[ArrayLike, ManipulatorPosition]): Start position (mm).
+            target (Union[ArrayLike, ManipulatorPosition]): Target position (mm).
+            max_concurrent_axes (Optional[int], optional): Maximum number of axes that may move at once.
+              Defaults to None, which moves all axes concurrently.
+
+        Returns:
+            MotionPlan: The planned move.
+        """
+        times = self.move_time(self.to_steps(target) - self.to_steps(start))
+        axis_times = {axis: float(t) for axis, t in zip(_AXES, times) if t > 0}
+        order = sorted(axis_times, key=lambda axis: axis_times[axis], reverse=True)
+        group = max_concurrent_axes or max(len(order), 1)
+        stages = [order[i : i + group] for i in range(0, len(order), group)]
+        return MotionPlan(
+            stages=stages,
+            stage_times=[max(axis_times[axis] for axis in stage) for stage in stages],
+            axis_times=axis_times,
+        )
+
+    def plan_homing(
+        self, start: Union[ArrayLike, ManipulatorPosition], max_concurrent_axes: Optional[int] = None
+    ) -> MotionPlan:
+        """Plans homing the axes from a position, and then moving to the initial position.
+
+        Axes are homed one at a time, in `homing_order`, by moving them to the zero position.
+        Disabled axes, and `Axis.NONE` entries, are not homed. The move to `initial_position` is
+        then planned with `plan_move`.
+
+        Args:
+            start (Union[ArrayLike, ManipulatorPosition]): Position before homing (mm).
+            max_concurrent_axes (Optional[int], optional): Maximum number of axes that may move at once
+              when moving to the initial position. Defaults to None.
+
+        Returns:
+            MotionPlan: The planned homing and positioning.
+        """
+        times = self.move_time(self.to_steps(start, out_of_range="clip"))
+        homing = [axis for axis in self.calibration.homing_order if axis in _AXES and self.enabled[_AXES.index(axis)]]
+        homing_times = {axis: float(times[_AXES.index(axis)]) for axis in homing}
+        positioning = self.plan_move(np.zeros(len(_AXES)), self.calibration.initial_position, max_concurrent_axes)
+        axis_times = dict(homing_times)
+        for axis, time in positioning.axis_times.items():
+            axis_times[axis] = axis_times.get(axis, 0.0) + time
+        return MotionPlan(
+            stages=[[axis] for axis in homing] + positioning.stages,
+            stage_times=[homing_times[axis] for axis in homing] + positioning.stage_times,
+            axis_times=axis_times,
+        )
+
+
 class AindManipulatorCalibrationOutput(BaseModel):
     pass
 
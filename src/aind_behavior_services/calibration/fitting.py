@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import logging
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+logger = logging.getLogger(__name__)
+
+
+class LinearFit(NamedTuple):
+    """Result of a (weighted) least-squares fit of `y = slope * x + intercept`.
+
+    For a single dataset, every field except `residuals` is a scalar. For batched fits, they have
+    the batch shape, and `residuals` has the shape of the data.
+    """
+
+    slope: np.ndarray
+    intercept: np.ndarray
+    r2: np.ndarray
+    residuals: np.ndarray
+    slope_stderr: np.ndarray
+    intercept_stderr: np.ndarray
+
+    def predict(self, x: ArrayLike) -> np.ndarray:
+        """Evaluates the fitted line(s) at `x`."""
+        return np.asarray(self.slope)[..., None] * np.asarray(x) + np.asarray(self.intercept)[..., None]
+
+
+def solve_line_from_moments(
+    sum_w: ArrayLike, x_mean: ArrayLike, y_mean: ArrayLike, sxx: ArrayLike, sxy: ArrayLike
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Solves the least-squares line from the (weighted) means and centered second moments of the data.
+
+    Args:
+        sum_w (ArrayLike): Sum of the sample weights.
+        x_mean (ArrayLike): Weighted mean of `x`.
+        y_mean (ArrayLike): Weighted mean of `y`.
+        sxx (ArrayLike): Weighted sum of squared deviations of `x` from its mean.
+        sxy (ArrayLike): Weighted sum of the products of the deviations of `x` and `y` from their means.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Slope, intercept, and whether the fit is degenerate
+          (i.e. all `x` are equal, in which case the slope is 0).
+    """
+    sum_w, x_mean, y_mean, sxx, sxy = (np.asarray(v, dtype=float) for v in (sum_w, x_mean, y_mean, sxx, sxy))
+    # Centering equal values can leave round-off residue, so compare the spread of `x` to its magnitude
+    degenerate = sxx <= np.finfo(float).eps * (sxx + sum_w * x_mean * x_mean)
+    slope = np.where(degenerate, 0.0, sxy / np.where(degenerate, 1.0, sxx))
+    intercept = y_mean - slope * x_mean
+    return slope, intercept, degenerate
+
+
+def r2_score_from_moments(ss_res: ArrayLike, syy: ArrayLike) -> np.ndarray:
+    """Coefficient of determination from the residual and total sums of squares.
+
+    Follows `sklearn.metrics.r2_score`, which reports 1.0 for a perfect fit of a constant `y` and 0.0 otherwise.
+    """
+    ss_res, syy = np.asarray(ss_res, dtype=float), np.asarray(syy, dtype=float)
+    constant = syy == 0
+    return np.where(constant, np.where(ss_res == 0, 1.0, 0.0), 1.0 - ss_res / np.where(constant, 1.0, syy))
+
+
+def fit_linear(
+    x: ArrayLike,
+    y: ArrayLike,
+    sample_weight: Optional[ArrayLike] = None,
+    mask: Optional[ArrayLike] = None,
+) -> LinearFit:
+    """Fits a straight line to one or more datasets using closed-form weighted least squares.
+
+    Datasets are stacked along the leading axes and samples along the last axis, such that a batch
+    of `k` datasets of up to `n` samples each is passed as arrays of shape `(k, n)`. Datasets with
+    fewer samples can be padded and the padding excluded with `mask`. `x`, `y`, `sample_weight`
+    and `mask` are broadcast against each other.
+
+    Results match `sklearn.linear_model.LinearRegression`: if all `x` of a dataset are equal, the
+    slope is 0 and the intercept is the (weighted) mean of `y`, and `r2` is 1.0 for a perfect fit
+    of a constant `y` and 0.0 otherwise. Standard errors use the residual variance with `n - 2`
+    degrees of freedom, and are NaN when they are undefined.
+
+    Args:
+        x (ArrayLike): Independent variable, with samples along the last axis.
+        y (ArrayLike): Dependent variable, with samples along the last axis.
+        sample_weight (Optional[ArrayLike], optional): Non-negative weight of each sample, for instance
+          the inverse of its variance. Defaults to None, which weights all samples equally.
+        mask (Optional[ArrayLike], optional): Boolean array that is False for samples to exclude. Defaults to None.
+
+    Returns:
+        LinearFit: The fitted parameters. Residuals of excluded samples are NaN.
+
+    Raises:
+        ValueError: If weights are negative, or a dataset has no samples with a positive weight.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    w = np.ones(np.broadcast_shapes(x.shape, y.shape)) if sample_weight is None else np.asarray(sample_weight, float)
+    if np.any(w < 0):
+        raise ValueError("Sample weights must be non-negative.")
+    if mask is not None:
+        w = np.where(mask, w, 0.0)
+    x, y, w = np.broadcast_arrays(x, y, w)
+    if x.ndim == 0:
+        raise ValueError("At least one sample is required.")
+
+    sum_w = w.sum(axis=-1)
+    if np.any(sum_w == 0):
+        raise ValueError("At least one sample with a positive weight is required for each dataset.")
+    included = w > 0
+    # Excluded samples may hold arbitrary (even non-finite) padding values, so zero them out
+    x = np.where(included, x, 0.0)
+    y = np.where(included, y, 0.0)
+
+    x_mean = (w * x).sum(axis=-1) / sum_w
+    y_mean = (w * y).sum(axis=-1) / sum_w
+    dx = x - x_mean[..., None]
+    dy = y - y_mean[..., None]
+    sxx = (w * dx * dx).sum(axis=-1)
+    sxy = (w * dx * dy).sum(axis=-1)
+    syy = (w * dy * dy).sum(axis=-1)
+
+    slope, intercept, degenerate = solve_line_from_moments(sum_w, x_mean, y_mean, sxx, sxy)
+    safe_sxx = np.where(degenerate, 1.0, sxx)
+
+    residuals = y - (slope[..., None] * x + intercept[..., None])
+    ss_res = (w * residuals * residuals).sum(axis=-1)
+    r2 = r2_score_from_moments(ss_res, syy)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dof = included.sum(axis=-1) - 2
+        sigma2 = np.where(dof > 0, ss_res / np.maximum(dof, 1), np.nan)
+        slope_stderr = np.where(degenerate, np.nan, np.sqrt(sigma2 / safe_sxx))
+        intercept_stderr = np.where(degenerate, np.nan, np.sqrt(sigma2 * (1.0 / sum_w + x_mean * x_mean / safe_sxx)))
+
+    # Indexing with an empty tuple unpacks 0-d arrays to scalars and leaves other arrays untouched
+    return LinearFit(
+        slope=slope[()],
+        intercept=intercept[()],
+        r2=r2[()],
+        residuals=np.where(included, residuals, np.nan),
+        slope_stderr=slope_stderr[()],
+        intercept_stderr=intercept_stderr[()],
+    )
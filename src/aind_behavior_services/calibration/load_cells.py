@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 import logging
-from typing import Annotated, List, Literal, Optional
+from itertools import chain, islice
+from os import PathLike
+from typing import Annotated, Callable, Dict, Generator, Iterable, Iterator, List, Literal, Optional, Sequence, Tuple
 
 import numpy as np
+from numpy.typing import ArrayLike
 from pydantic import BaseModel, Field, field_validator
-from sklearn.linear_model import LinearRegression
 
 from aind_behavior_services.calibration import Calibration
+from aind_behavior_services.calibration._harp_io import iter_register_chunks
+from aind_behavior_services.calibration.fitting import fit_linear
 from aind_behavior_services.rig import HarpLoadCells
 
 logger = logging.getLogger(__name__)
@@ -17,6 +21,10 @@ LoadCellChannel = Annotated[int, Field(ge=0, le=7, description="Load cell channe
 
 LoadCellOffset = Annotated[int, Field(ge=-255, le=255, description="Load cell offset value [-255, 255]")]
 
+OffsetCriterion = Literal["minimum", "closest_to_zero"]
+"""How the optimum offset is picked from the measured offsets: the offset with the lowest baseline
+("minimum"), or the offset whose baseline is closest to zero ("closest_to_zero"), as found by `OffsetSearch`."""
+
 
 class MeasuredOffset(BaseModel):
     offset: LoadCellOffset = Field(..., description="The applied offset resistor value[-255, 255]")
@@ -66,36 +74,91 @@ class LoadCellsCalibrationInput(BaseModel):
         return values
 
     @classmethod
-    def calibrate_loadcell_output(cls, value: LoadCellCalibrationInput) -> "LoadCellCalibrationOutput":
-        x = np.array([m.weight for m in value.weight_measurement])
-        y = np.array([m.baseline for m in value.weight_measurement])
-
-        # Calculate the linear regression
-        model = LinearRegression()
-        model.fit(x.reshape(-1, 1), y)
-        optimum_offset = cls.get_optimum_offset(value.offset_measurement)
-        if not optimum_offset:
-            logger.warning("No optimum offset found for channel %s. Using default (0).", value.channel)
-            optimum_offset = 0
-
-        return LoadCellCalibrationOutput(
-            channel=value.channel,
-            offset=optimum_offset,
-            baseline=model.intercept_,
-            slope=model.coef_[0],
-            weight_lookup=value.weight_measurement,
-        )
+    def calibrate_loadcell_output(
+        cls, value: LoadCellCalibrationInput, offset_criterion: OffsetCriterion = "minimum"
+    ) -> "LoadCellCalibrationOutput":
+        return _calibrate_loadcells([value], offset_criterion)[0]
 
     @staticmethod
-    def get_optimum_offset(value: Optional[List[MeasuredOffset]]) -> Optional[LoadCellOffset]:
+    def get_optimum_offset(
+        value: Optional[List[MeasuredOffset]], criterion: OffsetCriterion = "minimum"
+    ) -> Optional[LoadCellOffset]:
         if not value:
             return None
         if len(value) == 0:
             return None
-        return value[np.argmin([m.baseline for m in value])].offset
+        baseline = np.array([m.baseline for m in value])
+        return value[np.argmin(np.abs(baseline) if criterion == "closest_to_zero" else baseline)].offset
+
+    def calibrate_output(self, offset_criterion: OffsetCriterion = "minimum") -> LoadCellsCalibrationOutput:
+        return LoadCellsCalibrationOutput(channels=_calibrate_loadcells(self.channels, offset_criterion))
+
+    @classmethod
+    def calibrate_outputs(
+        cls, inputs: Sequence[LoadCellsCalibrationInput], offset_criterion: OffsetCriterion = "minimum"
+    ) -> List[LoadCellsCalibrationOutput]:
+        """Calibrates the load cells of several rigs at once.
+
+        The channels of all inputs are solved together, so the cost of a calibration scales with
+        the total number of measurements rather than with the number of channels.
+
+        Args:
+            inputs (Sequence[LoadCellsCalibrationInput]): Calibration data of each rig.
+            offset_criterion (OffsetCriterion, optional): How the optimum offset is picked. Defaults to "minimum".
+
+        Returns:
+            List[LoadCellsCalibrationOutput]: Calibration output of each rig, in the order of `inputs`.
+        """
+        channels = [channel for value in inputs for channel in value.channels]
+        outputs = iter(_calibrate_loadcells(channels, offset_criterion))
+        return [LoadCellsCalibrationOutput(channels=list(islice(outputs, len(value.channels)))) for value in inputs]
+
+
+def _pad(rows: List[List[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Packs ragged rows into a zero-padded array and a mask of the valid entries."""
+    lengths = np.fromiter(map(len, rows), dtype=int, count=len(rows))
+    mask = np.arange(max(lengths.max(initial=0), 1)) < lengths[:, None]
+    values = np.zeros(mask.shape)
+    values[mask] = np.fromiter(chain.from_iterable(rows), dtype=float, count=lengths.sum())
+    return values, mask
+
+
+def _calibrate_loadcells(
+    channels: List[LoadCellCalibrationInput], offset_criterion: OffsetCriterion = "minimum"
+) -> List[LoadCellCalibrationOutput]:
+    """Calibrates a set of load cell channels in a single vectorized pass."""
+    if len(channels) == 0:
+        return []
+    for value in channels:
+        if len(value.weight_measurement) == 0:
+            raise ValueError(f"Channel {value.channel} has no weight measurements.")
 
-    def calibrate_output(self) -> LoadCellsCalibrationOutput:
-        return LoadCellsCalibrationOutput(channels=[self.calibrate_loadcell_output(c) for c in self.channels])
+    weight, weight_mask = _pad([[m.weight for m in c.weight_measurement] for c in channels])
+    baseline, _ = _pad([[m.baseline for m in c.weight_measurement] for c in channels])
+    fit = fit_linear(weight, baseline, mask=weight_mask)
+
+    offset, offset_mask = _pad([[m.offset for m in c.offset_measurement] for c in channels])
+    offset_baseline, _ = _pad([[m.baseline for m in c.offset_measurement] for c in channels])
+    if offset_criterion == "closest_to_zero":
+        offset_baseline = np.abs(offset_baseline)
+    optimum = np.argmin(np.where(offset_mask, offset_baseline, np.inf), axis=-1)
+    optimum_offset = offset[np.arange(len(channels)), optimum]
+    has_offset = offset_mask.any(axis=-1)
+
+    outputs = []
+    for i, value in enumerate(channels):
+        if not has_offset[i]:
+            logger.warning("No optimum offset found for channel %s. Using default (0).", value.channel)
+        outputs.append(
+            LoadCellCalibrationOutput(
+                channel=value.channel,
+                offset=int(optimum_offset[i]) if has_offset[i] else 0,
+                baseline=fit.intercept[i],
+                slope=fit.slope[i],
+                weight_lookup=value.weight_measurement,
+            )
+        )
+    return outputs
 
 
 class LoadCellsCalibrationOutput(BaseModel):
@@ -112,6 +175,230 @@ class LoadCellsCalibrationOutput(BaseModel):
         return values
 
 
+class OffsetSearch:
+    """Adaptive search of the offset that balances a load cell bridge.
+
+    Instead of measuring the baseline at every offset, the search proposes the next offset to measure
+    from the readings so far, and stops once the optimum is bracketed within `tolerance`:
+      - "bisection" assumes the baseline is monotonic in the offset, and bisects on its sign.
+        It needs about `2 + log2((high - low) / tolerance)` measurements.
+      - "golden" runs a golden-section search on the absolute baseline, which only assumes that
+        it has a single minimum in the searched range.
+
+    The search is driven by alternating calls to `propose` and `update`, or by `search_optimum_offset`.
+
+    Args:
+        method (Literal["bisection", "golden"], optional): Search method. Defaults to "bisection".
+        tolerance (int, optional): Width of the final bracket of offsets. Defaults to 1.
+        low (int, optional): Lowest offset to search. Defaults to -255.
+        high (int, optional): Highest offset to search. Defaults to 255.
+    """
+
+    def __init__(
+        self,
+        method: Literal["bisection", "golden"] = "bisection",
+        tolerance: int = 1,
+        low: int = -255,
+        high: int = 255,
+    ) -> None:
+        if tolerance < 1:
+            raise ValueError("Tolerance must be at least 1.")
+        if low >= high:
+            raise ValueError("The search range must not be empty.")
+        searches = {"bisection": self._bisection, "golden": self._golden_section}
+        if method not in searches:
+            raise ValueError(f"Invalid method: {method}")
+        self.tolerance = tolerance
+        self.low = low
+        self.high = high
+        self.measurements: List[MeasuredOffset] = []
+        self._baselines: Dict[int, float] = {}
+        self._search = searches[method]()
+        self._next: Optional[int] = next(self._search, None)
+
+    @property
+    def done(self) -> bool:
+        """Whether the search has finished."""
+        return self._next is None
+
+    @property
+    def best(self) -> Optional[MeasuredOffset]:
+        """The measurement whose baseline is closest to zero so far."""
+        if len(self.measurements) == 0:
+            return None
+        return min(self.measurements, key=lambda m: abs(m.baseline))
+
+    def propose(self) -> Optional[int]:
+        """Returns the next offset to measure, or None once the search has finished."""
+        return self._next
+
+    def update(self, baseline: float) -> None:
+        """Records the baseline measured at the proposed offset.
+
+        Args:
+            baseline (float): The measured baseline.
+        """
+        if self._next is None:
+            raise RuntimeError("The search has already finished.")
+        self.measurements.append(MeasuredOffset(offset=self._next, baseline=baseline))
+        self._baselines[self._next] = baseline
+        try:
+            self._next = self._search.send(None)
+        except StopIteration:
+            self._next = None
+
+    def _measure(self, offset: int) -> Generator[int, None, float]:
+        if offset not in self._baselines:
+            yield offset
+        return self._baselines[offset]
+
+    def _bisection(self) -> Generator[int, None, None]:
+        low, high = self.low, self.high
+        low_baseline = yield from self._measure(low)
+        high_baseline = yield from self._measure(high)
+        if np.sign(low_baseline) * np.sign(high_baseline) >= 0:
+            return  # A bound is balanced, or the baseline does not cross zero in the range
+        while high - low > self.tolerance:
+            middle = (low + high) // 2
+            baseline = yield from self._measure(middle)
+            if baseline == 0:
+                return
+            if np.sign(baseline) == np.sign(low_baseline):
+                low = middle
+            else:
+                high = middle
+
+    def _golden_section(self) -> Generator[int, None, None]:
+        ratio = (np.sqrt(5) - 1) / 2
+        low, high = self.low, self.high
+        while high - low > self.tolerance:
+            left = high - int(round((high - low) * ratio))
+            right = low + int(round((high - low) * ratio))
+            if left >= right:
+                left = (low + high) // 2
+                right = left + 1
+            left_value = abs((yield from self._measure(left)))
+            right_value = abs((yield from self._measure(right)))
+            if left_value < right_value:
+                high = right - 1
+            elif left_value > right_value:
+                low = left + 1
+            else:
+                low, high = left, right
+        # Make sure the optimum of the final bracket has been measured
+        for offset in range(low, high + 1):
+            yield from self._measure(offset)
+
+
+def search_optimum_offset(
+    channel: int,
+    measure: Callable[[int], float],
+    method: Literal["bisection", "golden"] = "bisection",
+    tolerance: int = 1,
+    weight_measurement: Optional[List[MeasuredWeight]] = None,
+) -> LoadCellCalibrationInput:
+    """Searches the offset that balances a load cell, measuring as few offsets as possible.
+
+    Args:
+        channel (int): Load cell channel.
+        measure (Callable[[int], float]): Applies an offset to the load cell and returns the measured baseline.
+        method (Literal["bisection", "golden"], optional): Search method, see `OffsetSearch`. Defaults to "bisection".
+        tolerance (int, optional): Width of the final bracket of offsets. Defaults to 1.
+        weight_measurement (Optional[List[MeasuredWeight]], optional): Weight measurements of the channel.
+
+    Returns:
+        LoadCellCalibrationInput: Calibration input with every offset measured during the search. The
+          measured baselines cross zero, so it should be calibrated with `offset_criterion="closest_to_zero"`.
+    """
+    search = OffsetSearch(method=method, tolerance=tolerance)
+    while not search.done:
+        offset = search.propose()
+        search.update(measure(offset))
+        logger.debug("Channel %s: offset %s, baseline %s", channel, offset, search.measurements[-1].baseline)
+    return LoadCellCalibrationInput(
+        channel=channel, offset_measurement=search.measurements, weight_measurement=weight_measurement or []
+    )
+
+
+class LoadCellWeightConverter:
+    """Converts raw load cell ADC values to weights using a load cells calibration.
+
+    Each channel is converted by inverting its calibration line, `adc = baseline + slope * weight`,
+    i.e. `weight = (adc - baseline) / slope`, for all channels at once. Channels whose `weight_lookup`
+    has at least two points are instead interpolated piecewise between the measured points, and
+    fall back to the calibration line outside of the measured range.
+
+    Args:
+        calibration (LoadCellsCalibrationOutput): The load cells calibration.
+
+    Raises:
+        ValueError: If a slope is zero, or a weight lookup is not monotonic.
+    """
+
+    def __init__(self, calibration: LoadCellsCalibrationOutput) -> None:
+        self.channels = [c.channel for c in calibration.channels]
+        self.baseline = np.array([c.baseline for c in calibration.channels], dtype=float)
+        self.slope = np.array([c.slope for c in calibration.channels], dtype=float)
+        if np.any(self.slope == 0):
+            raise ValueError("Load cell slopes must be non-zero.")
+        self._lookups: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        for column, channel in enumerate(calibration.channels):
+            if len(channel.weight_lookup) < 2:
+                continue
+            adc, weight = np.array([(m.baseline, m.weight) for m in channel.weight_lookup], dtype=float).T
+            order = np.argsort(adc, kind="stable")
+            adc, weight = adc[order], weight[order]
+            steps = np.diff(weight)
+            if np.any(np.diff(adc) == 0) or not (np.all(steps > 0) or np.all(steps < 0)):
+                raise ValueError(f"The weight lookup of channel {channel.channel} must be strictly monotonic.")
+            self._lookups[column] = (adc, weight)
+
+    def convert(self, adc: ArrayLike) -> np.ndarray:
+        """Converts ADC values of the calibrated channels to weights.
+
+        Args:
+            adc (ArrayLike): ADC values, with one column per calibrated channel, in the order of `channels`.
+
+        Returns:
+            np.ndarray: Weights (g), with the shape of `adc`.
+        """
+        adc = np.asarray(adc, dtype=float)
+        weight = (adc - self.baseline) / self.slope
+        for column, (lookup_adc, lookup_weight) in self._lookups.items():
+            inside = (adc[..., column] >= lookup_adc[0]) & (adc[..., column] <= lookup_adc[-1])
+            weight[..., column] = np.where(
+                inside, np.interp(adc[..., column], lookup_adc, lookup_weight), weight[..., column]
+            )
+        return weight
+
+    def iter_convert(self, chunks: Iterable[ArrayLike]) -> Iterator[np.ndarray]:
+        """Converts a stream of chunks of raw device data, with one column per hardware channel."""
+        for chunk in chunks:
+            yield self.convert(np.asarray(chunk)[..., self.channels])
+
+
+def iter_loadcell_weights(
+    path: PathLike,
+    calibration: LoadCellsCalibrationOutput,
+    chunk_size: int = 1 << 16,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Converts a Harp load cells data register file to weights, in chunks.
+
+    The file is memory-mapped, so recordings of any size are converted in bounded memory.
+
+    Args:
+        path (PathLike): Path to the binary file of the load cells data register.
+        calibration (LoadCellsCalibrationOutput): The load cells calibration.
+        chunk_size (int, optional): Maximum number of samples per chunk. Defaults to 65536.
+
+    Yields:
+        Tuple[np.ndarray, np.ndarray]: Timestamps (s), and weights (g) with one column per calibrated channel.
+    """
+    converter = LoadCellWeightConverter(calibration)
+    for time, payload in iter_register_chunks(path, chunk_size=chunk_size):
+        yield time, converter.convert(payload[:, converter.channels])
+
+
 class LoadCellsCalibration(Calibration):
     """Load cells calibration class"""
 
@@ -1,7 +1,9 @@
 import logging
 from enum import Enum, IntEnum
-from typing import Dict, Literal, Optional
+from typing import Dict, List, Literal, NamedTuple, Optional, Union
 
+import numpy as np
+from numpy.typing import ArrayLike
 from pydantic import BaseModel, Field
 
 from aind_behavior_services.calibration import Calibration
@@ -45,6 +47,164 @@ class OlfactometerCalibrationInput(BaseModel):
     )
 
 
+class FlowSetPointTable(NamedTuple):
+    """Compact table of the flow set-points of a session.
+
+    Trials that share set-points share a row of `set_points`, and `index` maps each trial to its row.
+    """
+
+    set_points: np.ndarray
+    """Unique flow set-points (mL/min), with one column per `OlfactometerChannel`."""
+    index: np.ndarray
+    """Row of `set_points` used by each trial."""
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, trial: Union[int, slice, ArrayLike]) -> np.ndarray:
+        """Flow set-points of one or more trials."""
+        return self.set_points[self.index[trial]]
+
+
+class OlfactometerFlowSolver:
+    """Computes the flow set-points of the olfactometer channels that deliver target odor concentrations.
+
+    Each odor channel flows through a vial of its odorant at `odorant_dilution`, and is mixed with the
+    carrier channel. The concentration of an odorant in the output is therefore its dilution times the
+    fraction of the total flow that goes through its channel. The flow of the odor channels follows from
+    the target concentrations, and the carrier makes up the rest of the total flow.
+
+    Concentrations are expressed in the same units as `odorant_dilution` (%v/v), and flows in mL/min.
+    Set-points have one column per `OlfactometerChannel`, and unconfigured channels are always 0.
+
+    Args:
+        calibration (OlfactometerCalibrationInput): The olfactometer channel configuration.
+        total_flow (Optional[float], optional): Total output flow. Defaults to None, which uses the
+          capacity of the carrier channel.
+
+    Raises:
+        ValueError: If there is not exactly one carrier channel, or the total flow exceeds the capacity
+          of the olfactometer.
+    """
+
+    def __init__(self, calibration: OlfactometerCalibrationInput, total_flow: Optional[float] = None) -> None:
+        config = calibration.channel_config
+        carriers = [c for c, cfg in config.items() if cfg.channel_type == OlfactometerChannelType.CARRIER]
+        if len(carriers) != 1:
+            raise ValueError(f"Expected exactly one carrier channel, got {len(carriers)}.")
+        self.carrier = carriers[0]
+        self.odor_channels: List[OlfactometerChannel] = sorted(c for c in config if c != self.carrier)
+        self.total_flow = float(config[self.carrier].flow_rate_capacity if total_flow is None else total_flow)
+        self.capacity = np.array([config[c].flow_rate_capacity if c in config else 0.0 for c in OlfactometerChannel])
+        if not 0 < self.total_flow <= self.capacity.sum():
+            raise ValueError(f"Total flow must be positive and at most {self.capacity.sum()}, got {self.total_flow}.")
+        # Channels without an odorant dilution can not deliver any odor
+        self.dilution = np.array(
+            [
+                config[c].odorant_dilution if config[c].odorant_dilution is not None else np.nan
+                for c in self.odor_channels
+            ]
+        )
+        self._odor_columns = [int(c) for c in self.odor_channels]
+
+    def solve(
+        self,
+        concentrations: Union[ArrayLike, Dict[OlfactometerChannel, ArrayLike]],
+        out_of_range: Literal["raise", "clip"] = "raise",
+    ) -> np.ndarray:
+        """Computes the flow set-points of one or more trials.
+
+        Args:
+            concentrations (Union[ArrayLike, Dict[OlfactometerChannel, ArrayLike]]): Target concentration
+              of each odor channel, either as an array with one column per channel in `odor_channels`,
+              or as a dictionary of per-trial concentrations. Channels missing from the dictionary are off.
+            out_of_range (Literal["raise", "clip"], optional): Whether set-points that exceed the capacity
+              of a channel raise a ValueError, or are clipped to it. Clipping changes the delivered
+              concentrations. Defaults to "raise".
+
+        Returns:
+            np.ndarray: Flow set-points (mL/min) of shape (..., len(OlfactometerChannel)).
+        """
+        concentrations = self._to_array(concentrations)
+        if np.any(concentrations < 0):
+            raise ValueError("Concentrations must be non-negative.")
+        odor_flow = concentrations * self.total_flow / self.dilution
+        active = concentrations > 0
+        undiluted = np.any((active & np.isnan(self.dilution)).reshape(-1, len(self.odor_channels)), axis=0)
+        if np.any(undiluted):
+            channels = [self.odor_channels[i].name for i in np.flatnonzero(undiluted)]
+            raise ValueError(f"Channels {channels} have no odorant dilution, so their concentration must be 0.")
+        odor_flow = np.where(active, odor_flow, 0.0)
+
+        set_points = np.zeros(concentrations.shape[:-1] + (len(OlfactometerChannel),))
+        set_points[..., self._odor_columns] = odor_flow
+        set_points[..., int(self.carrier)] = self.total_flow - odor_flow.sum(axis=-1)
+
+        exceeded = (set_points > self.capacity) | (set_points < 0)
+        if np.any(exceeded):
+            if out_of_range == "raise":
+                trials = np.flatnonzero(np.any(exceeded.reshape(-1, exceeded.shape[-1]), axis=-1))
+                raise ValueError(f"Flow set-points exceed the channel capacities in trials {trials[:10].tolist()}.")
+            set_points = self._clip(set_points)
+        return set_points
+
+    def _clip(self, set_points: np.ndarray) -> np.ndarray:
+        odor = np.minimum(set_points[..., self._odor_columns], self.capacity[self._odor_columns])
+        # Scale down the odor flows that do not leave room for the carrier, keeping their ratios
+        carrier = self.total_flow - odor.sum(axis=-1, keepdims=True)
+        scale = np.where(carrier < 0, self.total_flow / (self.total_flow - carrier), 1.0)
+        odor = odor * scale
+        set_points = set_points.copy()
+        set_points[..., self._odor_columns] = odor
+        set_points[..., int(self.carrier)] = np.minimum(
+            self.total_flow - odor.sum(axis=-1), self.capacity[int(self.carrier)]
+        )
+        return set_points
+
+    def tabulate(
+        self,
+        concentrations: Union[ArrayLike, Dict[OlfactometerChannel, ArrayLike]],
+        out_of_range: Literal["raise", "clip"] = "raise",
+    ) -> FlowSetPointTable:
+        """Computes the flow set-points of a whole session as a table of unique set-points.
+
+        Args:
+            concentrations (Union[ArrayLike, Dict[OlfactometerChannel, ArrayLike]]): Target concentrations
+              of each trial, as in `solve`.
+            out_of_range (Literal["raise", "clip"], optional): See `solve`. Defaults to "raise".
+
+        Returns:
+            FlowSetPointTable: The set-points of the session.
+        """
+        set_points = self.solve(concentrations, out_of_range=out_of_range)
+        set_points = set_points.reshape(-1, set_points.shape[-1])
+        unique, index = np.unique(set_points, axis=0, return_inverse=True)
+        return FlowSetPointTable(set_points=unique, index=index.reshape(-1))
+
+    def concentration(self, set_points: ArrayLike) -> np.ndarray:
+        """Computes the odor concentrations delivered by flow set-points, with one column per odor channel."""
+        set_points = np.asarray(set_points, dtype=float)
+        total = set_points.sum(axis=-1, keepdims=True)
+        dilution = np.nan_to_num(self.dilution)
+        return set_points[..., self._odor_columns] * dilution / total
+
+    def _to_array(self, concentrations: Union[ArrayLike, Dict[OlfactometerChannel, ArrayLike]]) -> np.ndarray:
+        if isinstance(concentrations, dict):
+            unknown = set(concentrations) - set(self.odor_channels)
+            if unknown:
+                raise ValueError(f"Channels {sorted(unknown)} are not odor channels.")
+            columns = np.broadcast_arrays(
+                *[np.asarray(concentrations.get(c, 0.0), dtype=float) for c in self.odor_channels]
+            )
+            return np.stack(columns, axis=-1)
+        concentrations = np.asarray(concentrations, dtype=float)
+        if concentrations.ndim == 0 or concentrations.shape[-1] != len(self.odor_channels):
+            raise ValueError(
+                f"Expected {len(self.odor_channels)} concentrations per trial, got {concentrations.shape}."
+            )
+        return concentrations
+
+
 class OlfactometerCalibrationOutput(BaseModel):
     pass
 
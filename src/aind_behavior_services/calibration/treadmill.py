@@ -1,9 +1,15 @@
+from __future__ import annotations
+
 import logging
-from typing import ClassVar, List, Literal, Optional
+from os import PathLike
+from typing import ClassVar, Iterable, Iterator, List, Literal, NamedTuple, Optional, Tuple
 
+import numpy as np
+from numpy.typing import ArrayLike
 from pydantic import BaseModel, Field, field_validator
 
 from aind_behavior_services.calibration import Calibration
+from aind_behavior_services.calibration._harp_io import iter_register_chunks
 from aind_behavior_services.patterns import ValuePair
 from aind_behavior_services.rig import HarpTreadmill
 
@@ -43,6 +49,198 @@ class TreadmillCalibrationOutput(BaseModel):
         return value
 
 
+class BrakeLookupInterpolator:
+    """Converts torques to brake set-points using the brake lookup calibration of a treadmill.
+
+    Breakpoints are sorted by torque once, when the interpolator is built. Torques are then
+    linearly interpolated in a single vectorized call. Torques beyond the calibrated range map to
+    the set-point of the nearest breakpoint, and set-points are clipped to the U16 brake output range.
+
+    Args:
+        calibration (TreadmillCalibrationOutput): The treadmill calibration.
+
+    Raises:
+        ValueError: If a torque appears more than once, or set-points are not monotonic in torque.
+    """
+
+    def __init__(self, calibration: TreadmillCalibrationOutput) -> None:
+        torque, set_point = np.asarray(calibration.brake_lookup_calibration, dtype=float).T
+        order = np.argsort(torque, kind="stable")
+        self.torque = torque[order]
+        self.set_point = set_point[order]
+        if np.any(np.diff(self.torque) == 0):
+            raise ValueError("Brake lookup calibration must not contain repeated torque values.")
+        steps = np.diff(self.set_point)
+        if not (np.all(steps >= 0) or np.all(steps <= 0)):
+            raise ValueError("Brake lookup calibration set-points must be monotonic in torque.")
+
+    def __call__(self, torque: ArrayLike) -> np.ndarray:
+        """Returns the brake set-point for each torque.
+
+        Args:
+            torque (ArrayLike): Requested torque(s).
+
+        Returns:
+            np.ndarray: Brake set-point(s) as unsigned 16-bit integers, with the shape of `torque`.
+        """
+        set_point = np.interp(np.asarray(torque, dtype=float), self.torque, self.set_point)
+        return _to_brake_output(set_point)[()]
+
+    def to_table(self, resolution: float) -> BrakeLookupTable:
+        """Precomputes the set-points on a regular torque grid spanning the calibrated range.
+
+        Args:
+            resolution (float): Torque spacing of the table.
+
+        Returns:
+            BrakeLookupTable: The precomputed table.
+        """
+        if not resolution > 0:
+            raise ValueError("Resolution must be positive.")
+        count = int(np.ceil((self.torque[-1] - self.torque[0]) / resolution)) + 1
+        return BrakeLookupTable(
+            torque_min=self.torque[0],
+            resolution=resolution,
+            table=self(self.torque[0] + resolution * np.arange(count)),
+        )
+
+
+class BrakeLookupTable:
+    """Brake set-points precomputed on a regular torque grid, for constant-time lookups.
+
+    Torques are rounded to the nearest grid point, so the lookup error is bounded by the change in
+    set-point over half of `resolution`. Build it with `BrakeLookupInterpolator.to_table`.
+
+    Args:
+        torque_min (float): Torque of the first entry of the table.
+        resolution (float): Torque spacing of the table.
+        table (np.ndarray): Brake set-points of each grid point.
+    """
+
+    def __init__(self, torque_min: float, resolution: float, table: np.ndarray) -> None:
+        self.torque_min = float(torque_min)
+        self.resolution = float(resolution)
+        self.table = np.asarray(table, dtype=np.uint16)
+
+    def lookup(self, torque: float) -> int:
+        """Returns the brake set-point of a single torque."""
+        index = int(round((torque - self.torque_min) / self.resolution))
+        return int(self.table[min(max(index, 0), len(self.table) - 1)])
+
+    def __call__(self, torque: ArrayLike) -> np.ndarray:
+        """Returns the brake set-point for each torque, with the shape of `torque`."""
+        index = np.rint((np.asarray(torque, dtype=float) - self.torque_min) / self.resolution)
+        return self.table[np.clip(index, 0, len(self.table) - 1).astype(np.intp)][()]
+
+
+def _to_brake_output(set_point: np.ndarray) -> np.ndarray:
+    output_range = (TreadmillCalibrationOutput._BRAKE_OUTPUT_MIN, TreadmillCalibrationOutput._BRAKE_OUTPUT_MAX)
+    return np.clip(np.rint(set_point), *output_range).astype(np.uint16)
+
+
+class EncoderChunk(NamedTuple):
+    """Treadmill data decoded from a chunk of encoder samples."""
+
+    time: np.ndarray
+    """Timestamp of each sample (s)."""
+    distance: np.ndarray
+    """Distance travelled since the first sample of the stream, in the units of the wheel diameter."""
+    velocity: np.ndarray
+    """Velocity since the previous sample, in the units of the wheel diameter per second.
+    NaN for the first sample of the stream."""
+
+
+class TreadmillEncoderConverter:
+    """Converts raw treadmill encoder counts to distance and velocity, one chunk at a time.
+
+    The converter carries the last sample of each chunk over to the next, so that counter
+    wraparound and velocities are handled seamlessly across chunk boundaries while only a
+    single chunk is held in memory.
+
+    Args:
+        calibration (TreadmillCalibrationOutput): The treadmill calibration.
+        counter_bits (int, optional): Width of the hardware encoder counter, used to unwrap
+          overflows. Defaults to 32.
+    """
+
+    def __init__(self, calibration: TreadmillCalibrationOutput, counter_bits: int = 32) -> None:
+        sign = -1.0 if calibration.invert_direction else 1.0
+        self.distance_per_pulse = sign * np.pi * calibration.wheel_diameter / calibration.pulses_per_revolution
+        self.counter_bits = counter_bits
+        self.reset()
+
+    def reset(self) -> None:
+        """Starts a new stream."""
+        self._last_count: Optional[int] = None
+        self._last_time: Optional[float] = None
+        self._total_count = 0
+
+    def convert(self, time: ArrayLike, counts: ArrayLike) -> EncoderChunk:
+        """Converts the next chunk of the stream.
+
+        Args:
+            time (ArrayLike): Timestamp of each sample (s).
+            counts (ArrayLike): Raw encoder count of each sample.
+
+        Returns:
+            EncoderChunk: Decoded distance and velocity of each sample.
+        """
+        time = np.asarray(time, dtype=float)
+        counts = np.asarray(counts).astype(np.int64).ravel()
+        if time.shape != counts.shape:
+            raise ValueError("Time and counts must have the same number of samples.")
+        if counts.size == 0:
+            return EncoderChunk(time=time, distance=np.empty(0), velocity=np.empty(0))
+
+        previous_count = counts[0] if self._last_count is None else self._last_count
+        steps = np.diff(counts, prepend=previous_count)
+        if self.counter_bits < 64:
+            # Reinterpret differences in the signed range of the counter, which undoes wraparound
+            half_range = 1 << (self.counter_bits - 1)
+            steps = (steps + half_range) % (2 * half_range) - half_range
+        total = self._total_count + np.cumsum(steps)
+        distance = total * self.distance_per_pulse
+
+        previous_time = np.nan if self._last_time is None else self._last_time
+        with np.errstate(divide="ignore", invalid="ignore"):
+            velocity = steps * self.distance_per_pulse / np.diff(time, prepend=previous_time)
+
+        self._last_count = int(counts[-1])
+        self._last_time = float(time[-1])
+        self._total_count = int(total[-1])
+        return EncoderChunk(time=time, distance=distance, velocity=velocity)
+
+    def iter_convert(self, chunks: Iterable[Tuple[ArrayLike, ArrayLike]]) -> Iterator[EncoderChunk]:
+        """Converts a stream of (time, counts) chunks."""
+        for time, counts in chunks:
+            yield self.convert(time, counts)
+
+
+def iter_treadmill_encoder(
+    path: PathLike,
+    calibration: TreadmillCalibrationOutput,
+    chunk_size: int = 1 << 16,
+) -> Iterator[EncoderChunk]:
+    """Decodes a Harp treadmill encoder register file to distance and velocity, in chunks.
+
+    The file is memory-mapped, so sessions of any length are decoded in bounded memory.
+    The counter width is inferred from the register data type.
+
+    Args:
+        path (PathLike): Path to the binary file of the encoder register.
+        calibration (TreadmillCalibrationOutput): The treadmill calibration.
+        chunk_size (int, optional): Maximum number of samples per chunk. Defaults to 65536.
+
+    Yields:
+        EncoderChunk: Decoded distance and velocity of each chunk.
+    """
+    converter: Optional[TreadmillEncoderConverter] = None
+    for time, payload in iter_register_chunks(path, chunk_size=chunk_size):
+        if converter is None:
+            converter = TreadmillEncoderConverter(calibration, counter_bits=payload.dtype.itemsize * 8)
+        yield converter.convert(time, payload[:, 0])
+
+
 class TreadmillCalibration(Calibration):
     """Treadmill calibration class"""
 
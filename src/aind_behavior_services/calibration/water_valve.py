@@ -1,13 +1,14 @@
 from __future__ import annotations
 
 import logging
-from typing import Annotated, Dict, List, Literal, Optional
+from typing import Annotated, Dict, Iterable, List, Literal, Optional, Tuple
 
 import numpy as np
+from numpy.typing import ArrayLike
 from pydantic import BaseModel, Field
-from sklearn.linear_model import LinearRegression
 
 from aind_behavior_services.calibration import Calibration
+from aind_behavior_services.calibration.fitting import fit_linear, r2_score_from_moments, solve_line_from_moments
 
 logger = logging.getLogger(__name__)
 
@@ -58,14 +59,90 @@ class WaterValveCalibrationInput(BaseModel):
         x_times = np.asarray(_x_times)
         y_weight = np.asarray(_y_weight)
         # Calculate the linear regression
-        model = LinearRegression()
-        model.fit(x_times.reshape(-1, 1), y_weight)
+        fit = fit_linear(x_times, y_weight)
+        intervals, inverse = np.unique(x_times, return_inverse=True)
+        averages = np.bincount(inverse, weights=y_weight) / np.bincount(inverse)
         return WaterValveCalibrationOutput(
-            interval_average={x: np.mean(y_weight[x_times == x]) for x in np.unique(x_times)},
-            slope=model.coef_[0],
-            offset=model.intercept_,
-            r2=model.score(x_times.reshape(-1, 1), y_weight),
-            valid_domain=list(np.unique(x_times)),
+            interval_average=dict(zip(intervals, averages)),
+            slope=fit.slope,
+            offset=fit.intercept,
+            r2=fit.r2,
+            valid_domain=list(intervals),
+        )
+
+
+class WaterValveCalibrationAccumulator:
+    """Water valve calibration that is updated one measurement at a time.
+
+    Keeps running means and centered second moments of the data, overall and per valve open time,
+    so that adding a measurement and computing the current fit do not depend on the number of
+    measurements seen so far. The resulting output matches `WaterValveCalibrationInput.calibrate_output`
+    on the same measurements.
+    """
+
+    def __init__(self, measurements: Optional[Iterable[Measurement]] = None) -> None:
+        self._measurements: List[Measurement] = []
+        # Sample count, means and centered (co)moments, updated with Welford's algorithm
+        self._count = 0
+        self._x_mean = 0.0
+        self._y_mean = 0.0
+        self._sxx = 0.0
+        self._sxy = 0.0
+        self._syy = 0.0
+        # Sample count and mean volume per valve open time
+        self._intervals: Dict[float, Tuple[int, float]] = {}
+        for measurement in measurements or []:
+            self.update(measurement)
+
+    @property
+    def measurements(self) -> List[Measurement]:
+        """Measurements accumulated so far."""
+        return list(self._measurements)
+
+    def update(self, measurement: Measurement) -> None:
+        """Adds a measurement to the calibration.
+
+        Args:
+            measurement (Measurement): The new measurement.
+        """
+        self._measurements.append(measurement)
+        x = measurement.valve_open_time
+        for weight in measurement.water_weight:
+            y = weight / measurement.repeat_count
+            self._count += 1
+            dx = x - self._x_mean
+            dy = y - self._y_mean
+            self._x_mean += dx / self._count
+            self._y_mean += dy / self._count
+            self._sxx += dx * (x - self._x_mean)
+            self._sxy += dx * (y - self._y_mean)
+            self._syy += dy * (y - self._y_mean)
+
+            count, mean = self._intervals.get(x, (0, 0.0))
+            self._intervals[x] = (count + 1, mean + (y - mean) / (count + 1))
+
+    def to_input(self) -> WaterValveCalibrationInput:
+        """Returns the accumulated measurements as a calibration input."""
+        return WaterValveCalibrationInput(measurements=self.measurements)
+
+    def calibrate_output(self) -> WaterValveCalibrationOutput:
+        """Computes the calibration output from the measurements accumulated so far.
+
+        Raises:
+            ValueError: If no measurements were accumulated.
+        """
+        if self._count == 0:
+            raise ValueError("At least one measurement is required to calibrate the water valve.")
+        slope, intercept, _ = solve_line_from_moments(self._count, self._x_mean, self._y_mean, self._sxx, self._sxy)
+        slope, intercept = float(slope), float(intercept)
+        ss_res = max(self._syy - slope * self._sxy, 0.0)
+        intervals = sorted(self._intervals)
+        return WaterValveCalibrationOutput(
+            interval_average={x: self._intervals[x][1] for x in intervals},
+            slope=slope,
+            offset=intercept,
+            r2=float(r2_score_from_moments(ss_res, self._syy)),
+            valid_domain=intervals,
         )
 
 
@@ -96,6 +173,128 @@ class WaterValveCalibrationOutput(BaseModel):
     )
 
 
+class ValveOpenTimeEvaluator:
+    """Converts requested water volumes to valve open times using a water valve calibration.
+
+    The evaluator is built once from a `WaterValveCalibrationOutput`, and then maps scalars or
+    arrays of volumes to open times in a single vectorized call.
+
+    Two methods are available:
+      - "linear" inverts the regression, `time = (volume - offset) / slope`.
+      - "interpolation" linearly interpolates between the measured `interval_average` points.
+
+    Volumes that fall outside the range spanned by the calibrated `valid_domain` (or, when using
+    interpolation without a `valid_domain`, by the measured intervals) are handled according to
+    `out_of_range`: "clip" clamps the open time to the calibrated domain, "nan" returns NaN and
+    "raise" raises a ValueError. A linear evaluator without a `valid_domain` is unbounded.
+
+    Args:
+        calibration (WaterValveCalibrationOutput): The water valve calibration.
+        method (Literal["linear", "interpolation"], optional): Evaluation method. Defaults to "linear".
+        out_of_range (Literal["clip", "nan", "raise"], optional): Handling of volumes outside the
+          calibrated domain. Defaults to "clip".
+
+    Raises:
+        ValueError: If the calibration cannot be inverted with the requested method.
+    """
+
+    def __init__(
+        self,
+        calibration: WaterValveCalibrationOutput,
+        method: Literal["linear", "interpolation"] = "linear",
+        out_of_range: Literal["clip", "nan", "raise"] = "clip",
+    ) -> None:
+        if out_of_range not in ("clip", "nan", "raise"):
+            raise ValueError(f"Invalid out_of_range value: {out_of_range}")
+        self.method = method
+        self.out_of_range = out_of_range
+
+        if method == "linear":
+            if not calibration.slope > 0:
+                raise ValueError("The calibration slope must be positive to convert volumes to open times.")
+            self._slope = calibration.slope
+            self._offset = calibration.offset
+            if calibration.valid_domain:
+                self.time_domain = (min(calibration.valid_domain), max(calibration.valid_domain))
+            else:
+                self.time_domain = (-np.inf, np.inf)
+        elif method == "interpolation":
+            if not calibration.interval_average or len(calibration.interval_average) < 2:
+                raise ValueError("At least two interval averages are required for interpolation.")
+            times, volumes = (np.asarray(v, dtype=float) for v in zip(*sorted(calibration.interval_average.items())))
+            if np.any(np.diff(volumes) <= 0):
+                raise ValueError("Interval averages must strictly increase with the open time to be interpolated.")
+            self._times = times
+            self._volumes = volumes
+            if calibration.valid_domain:
+                self.time_domain = (
+                    max(min(calibration.valid_domain), times[0]),
+                    min(max(calibration.valid_domain), times[-1]),
+                )
+            else:
+                self.time_domain = (times[0], times[-1])
+        else:
+            raise ValueError(f"Invalid method: {method}")
+        self.volume_domain = tuple(float(v) for v in self.volume(np.asarray(self.time_domain)))
+
+    def volume(self, time: ArrayLike) -> np.ndarray:
+        """Evaluates the calibration, returning the volume delivered for each valve open time."""
+        time = np.asarray(time, dtype=float)
+        if self.method == "linear":
+            return self._slope * time + self._offset
+        return np.interp(time, self._times, self._volumes)
+
+    def __call__(self, volume: ArrayLike) -> np.ndarray:
+        """Returns the valve open time that delivers each requested volume.
+
+        Args:
+            volume (ArrayLike): Requested volume(s).
+
+        Returns:
+            np.ndarray: Valve open time(s), with the shape of `volume`.
+
+        Raises:
+            ValueError: If `out_of_range` is "raise" and a volume is outside of the calibrated domain.
+        """
+        volume = np.asarray(volume, dtype=float)
+        if self.method == "linear":
+            time = (volume - self._offset) / self._slope
+        else:
+            # np.interp clamps to the end points, which is then overridden below if requested
+            time = np.interp(volume, self._volumes, self._times)
+
+        low, high = self.volume_domain
+        outside = (volume < low) | (volume > high)
+        if self.out_of_range == "raise" and np.any(outside):
+            raise ValueError(f"Volume(s) {volume[outside]} are outside the calibrated domain [{low}, {high}].")
+        if self.out_of_range == "nan":
+            time = np.where(outside, np.nan, time)
+        else:
+            time = np.clip(time, *self.time_domain)
+        return time[()]
+
+    def lookup_table(self, resolution: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Tabulates the calibration over the calibrated time domain.
+
+        Args:
+            resolution (float): Spacing of the valve open times in the table.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Valve open times, and the corresponding volumes.
+
+        Raises:
+            ValueError: If the calibrated domain is unbounded or `resolution` is not positive.
+        """
+        if not resolution > 0:
+            raise ValueError("Resolution must be positive.")
+        if not np.all(np.isfinite(self.time_domain)):
+            raise ValueError("A lookup table requires a bounded domain. Set the valid_domain of the calibration.")
+        low, high = self.time_domain
+        times = low + resolution * np.arange(int(np.floor((high - low) / resolution + 1e-9)) + 1)
+        times = np.minimum(times, high)
+        return times, self.volume(times)
+
+
 class WaterValveCalibration(Calibration):
     """Water valve calibration class"""
 
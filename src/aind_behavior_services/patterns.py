@@ -1,12 +1,212 @@
+import base64
 import logging
-from typing import Annotated, List
+from typing import Annotated, Any, Callable, List, Literal, Optional, Tuple
 
-from pydantic import Field, RootModel
+import numpy as np
+from pydantic import Field, GetJsonSchemaHandler, RootModel
+from pydantic.json_schema import JsonSchemaValue
+from pydantic_core import core_schema
 
 logger = logging.getLogger(__name__)
 
 ValuePair = Annotated[List[float], Field(min_length=2, max_length=2)]
 
 
+class ComparableArray(np.ndarray):
+    """The array type of fields annotated with `NDArray`, which compares as a single value.
+
+    `==` and `!=` between two such arrays compare their shapes and values as a whole, like lists do,
+    so that models holding arrays can be compared. Comparisons with anything else, indexing and ufuncs
+    keep the usual elementwise semantics and return plain arrays. `np.asarray` also returns a plain view.
+    """
+
+    def __eq__(self, other: Any) -> Any:
+        if isinstance(other, ComparableArray):
+            return np.array_equal(self.view(np.ndarray), other.view(np.ndarray))
+        return self.view(np.ndarray) == other
+
+    def __ne__(self, other: Any) -> Any:
+        if isinstance(other, ComparableArray):
+            return not self.__eq__(other)
+        return self.view(np.ndarray) != other
+
+    __hash__ = None
+
+    def __getitem__(self, key: Any) -> Any:
+        item = super().__getitem__(key)
+        return item.view(np.ndarray) if isinstance(item, np.ndarray) else item
+
+    def __array_ufunc__(self, ufunc: np.ufunc, method: str, *inputs: Any, **kwargs: Any) -> Any:
+        inputs = tuple(x.view(np.ndarray) if isinstance(x, ComparableArray) else x for x in inputs)
+        if "out" in kwargs:
+            kwargs["out"] = tuple(x.view(np.ndarray) if isinstance(x, ComparableArray) else x for x in kwargs["out"])
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+
+class NDArray:
+    """A pydantic annotation that stores a field as a NumPy array.
+
+    Values are validated and converted with a single call to `np.asarray`, which does not copy arrays
+    that already have the expected dtype, and bounds are checked on the whole array at once. Fields hold
+    a `ComparableArray` view of the array, so that models holding them can be compared with `==`.
+    Arrays are dumped as nested lists, with the same json-schema as the equivalent `List` annotation.
+    If `encoding` is "base64", arrays are instead serialized to json as an object holding the dtype,
+    shape and base64-encoded raw bytes of the array, and both forms are accepted on validation.
+
+    Examples:
+        ```python
+        Table = Annotated[np.ndarray, NDArray(dtype=float, shape=(None, 2), min_length=2)]
+        ```
+
+    Args:
+        dtype (Any, optional): NumPy dtype of the array. Defaults to float.
+        shape (Optional[Tuple[Optional[int], ...]], optional): Expected shape. A None entry accepts any
+          length along that axis. Defaults to None, which accepts any shape.
+        min_length (Optional[int], optional): Minimum length of the first axis.
+        max_length (Optional[int], optional): Maximum length of the first axis.
+        ge (Optional[float], optional): Inclusive lower bound of all elements.
+        gt (Optional[float], optional): Exclusive lower bound of all elements.
+        le (Optional[float], optional): Inclusive upper bound of all elements.
+        lt (Optional[float], optional): Exclusive upper bound of all elements.
+        encoding (Literal["list", "base64"], optional): Json serialization format. Defaults to "list".
+    """
+
+    def __init__(
+        self,
+        dtype: Any = float,
+        shape: Optional[Tuple[Optional[int], ...]] = None,
+        *,
+        min_length: Optional[int] = None,
+        max_length: Optional[int] = None,
+        ge: Optional[float] = None,
+        gt: Optional[float] = None,
+        le: Optional[float] = None,
+        lt: Optional[float] = None,
+        encoding: Literal["list", "base64"] = "list",
+    ) -> None:
+        self.dtype = np.dtype(dtype)
+        self.shape = shape
+        self.min_length = min_length
+        self.max_length = max_length
+        self.bounds = {"ge": ge, "gt": gt, "le": le, "lt": lt}
+        self.encoding = encoding
+
+    def __repr__(self) -> str:
+        return f"NDArray(dtype={self.dtype}, shape={self.shape}, encoding={self.encoding!r})"
+
+    def __get_pydantic_core_schema__(
+        self,
+        _source_type: Any,
+        _handler: Callable[[Any], core_schema.CoreSchema],
+    ) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            self.validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(self.serialize, info_arg=True),
+        )
+
+    def __get_pydantic_json_schema__(
+        self, _core_schema: core_schema.CoreSchema, handler: GetJsonSchemaHandler
+    ) -> JsonSchemaValue:
+        list_schema = handler(self._list_core_schema())
+        if self.encoding == "list":
+            return list_schema
+        return {
+            "anyOf": [
+                list_schema,
+                {
+                    "type": "object",
+                    "properties": {
+                        "dtype": {"type": "string"},
+                        "shape": {"type": "array", "items": {"type": "integer", "minimum": 0}},
+                        "data": {"type": "string", "contentEncoding": "base64"},
+                    },
+                    "required": ["dtype", "shape", "data"],
+                },
+            ]
+        }
+
+    def _list_core_schema(self) -> core_schema.CoreSchema:
+        """The core schema of the nested lists this array is equivalent to."""
+        if self.dtype.kind == "b":
+            schema = core_schema.bool_schema()
+        elif self.dtype.kind in "iu":
+            schema = core_schema.int_schema(**{k: v for k, v in self.bounds.items() if v is not None})
+        else:
+            schema = core_schema.float_schema(**{k: v for k, v in self.bounds.items() if v is not None})
+        if self.shape is None:
+            return core_schema.list_schema(schema, min_length=self.min_length, max_length=self.max_length)
+        for axis, length in reversed(list(enumerate(self.shape))):
+            min_length, max_length = length, length
+            if axis == 0 and length is None:
+                min_length, max_length = self.min_length, self.max_length
+            schema = core_schema.list_schema(schema, min_length=min_length, max_length=max_length)
+        return schema
+
+    def validate(self, value: Any) -> ComparableArray:
+        """Converts a value to an array and checks its shape and bounds."""
+        array = self._decode(value) if self.encoding == "base64" and isinstance(value, dict) else value
+        try:
+            array = np.asarray(array)
+            if self.dtype.kind in "iu" and array.dtype != self.dtype:
+                self._check_integer_cast(array)
+            array = array.astype(self.dtype, copy=False)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Value can not be converted to an array of {self.dtype}: {e}") from e
+        self._check_shape(array.shape)
+        self._check_bounds(array)
+        return array.view(ComparableArray)
+
+    def _check_integer_cast(self, array: np.ndarray) -> None:
+        if array.size == 0 or array.dtype.kind not in "biuf":
+            return
+        if array.dtype.kind == "f" and not np.all(np.mod(array, 1) == 0):
+            raise ValueError("Expected integer values.")
+        info = np.iinfo(self.dtype)
+        if array.min() < info.min or array.max() > info.max:
+            raise ValueError(f"Values must be between {info.min} and {info.max}.")
+
+    def _decode(self, value: dict) -> np.ndarray:
+        try:
+            data = base64.b64decode(value["data"], validate=True)
+            return np.frombuffer(data, dtype=np.dtype(value["dtype"])).reshape(value["shape"]).copy()
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid base64-encoded array: {e}") from e
+
+    def _check_shape(self, shape: Tuple[int, ...]) -> None:
+        if self.shape is not None:
+            if len(shape) != len(self.shape) or any(e is not None and e != s for e, s in zip(self.shape, shape)):
+                raise ValueError(f"Expected an array of shape {self.shape}, got {shape}.")
+        if self.min_length is not None or self.max_length is not None:
+            length = shape[0] if len(shape) > 0 else 0
+            if self.min_length is not None and length < self.min_length:
+                raise ValueError(f"Expected at least {self.min_length} elements, got {length}.")
+            if self.max_length is not None and length > self.max_length:
+                raise ValueError(f"Expected at most {self.max_length} elements, got {length}.")
+
+    def _check_bounds(self, array: np.ndarray) -> None:
+        checks = {
+            "ge": (np.greater_equal, "greater than or equal to"),
+            "gt": (np.greater, "greater than"),
+            "le": (np.less_equal, "less than or equal to"),
+            "lt": (np.less, "less than"),
+        }
+        for name, bound in self.bounds.items():
+            if bound is not None:
+                compare, description = checks[name]
+                if not np.all(compare(array, bound)):
+                    raise ValueError(f"All values must be {description} {bound}.")
+
+    def serialize(self, value: np.ndarray, info: core_schema.SerializationInfo) -> Any:
+        """Serializes an array to nested lists, or to its base64 encoding in json."""
+        if self.encoding == "base64" and info.mode_is_json():
+            value = np.ascontiguousarray(value)
+            return {
+                "dtype": value.dtype.str,
+                "shape": list(value.shape),
+                "data": base64.b64encode(value.tobytes()).decode("ascii"),
+            }
+        return value.tolist()
+
+
 class LookUpTable(RootModel):
-    root: List[ValuePair] = Field(..., validate_default=True, min_length=2)
+    root: Annotated[np.ndarray, NDArray(dtype=float, shape=(None, 2), min_length=2)] = Field(..., validate_default=True)
@@ -3,12 +3,16 @@ from __future__ import annotations
 import os
 from typing import Optional, TypeVar
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from aind_behavior_services.base import SchemaVersionedModel
 
 
 class Device(BaseModel):
+    # Most programs only use a handful of the available devices,
+    # so their validators are built on first use instead of at import time.
+    model_config = ConfigDict(defer_build=True)
+
     device_type: str = Field(..., description="Device type")
     additional_settings: Optional[BaseModel] = Field(default=None, description="Additional settings")
     calibration: Optional[BaseModel] = Field(default=None, description="Calibration")
@@ -1,12 +1,15 @@
+import argparse
 import inspect
 import logging
 from pathlib import Path
+from typing import List, Optional
 
 from aind_behavior_services import db_utils
 from aind_behavior_services.calibration import aind_manipulator
 from aind_behavior_services.data_types import DataTypes
 from aind_behavior_services.session import AindBehaviorSessionModel
 from aind_behavior_services.utils import (
+    SchemaCache,
     convert_pydantic_to_bonsai,
     pascal_to_snake_case,
     snake_to_pascal_case,
@@ -17,34 +20,55 @@ logger = logging.getLogger(__name__)
 SCHEMA_ROOT = Path("./src/schemas")
 EXTENSIONS_ROOT = Path("./src/Extensions/")
 NAMESPACE_PREFIX = "AindBehaviorServices"
+CACHE_ROOT = Path("./.cache/schemas")
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Regenerate json-schemas and Bonsai code from the pydantic models.")
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Regenerate all schemas, ignoring previously cached outputs."
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of schema export processes and concurrent Bonsai.SGen jobs. Defaults to 1.",
+    )
+    args = parser.parse_args(argv)
+    cache = None if args.no_cache else SchemaCache(CACHE_ROOT)
+
     models = [
         aind_manipulator.CalibrationLogic,
         aind_manipulator.CalibrationRig,
     ]
 
+    sgen_models = {}
     for model in models:
         module_name = inspect.getmodule(model).__name__
         module_name = module_name.split(".")[-1]
         schema_name = f"{module_name}_{pascal_to_snake_case(model.__name__)}"
-        namespace = f"{NAMESPACE_PREFIX}.{snake_to_pascal_case(schema_name)}"
-
-        convert_pydantic_to_bonsai(
-            {schema_name: model}, schema_path=SCHEMA_ROOT, output_path=EXTENSIONS_ROOT, namespace=namespace
-        )
+        sgen_models[schema_name] = model
+    sgen_models["aind_behavior_session"] = AindBehaviorSessionModel
 
     convert_pydantic_to_bonsai(
-        {"aind_behavior_session": AindBehaviorSessionModel},
+        sgen_models,
         schema_path=SCHEMA_ROOT,
         output_path=EXTENSIONS_ROOT,
-        namespace=f"{NAMESPACE_PREFIX}.AindBehaviorSession",
+        namespace={name: f"{NAMESPACE_PREFIX}.{snake_to_pascal_case(name)}" for name in sgen_models},
+        cache=cache,
+        max_workers=args.jobs,
     )
 
-    convert_pydantic_to_bonsai({"aind_behavior_data_types": DataTypes}, schema_path=SCHEMA_ROOT, skip_sgen=True)
     convert_pydantic_to_bonsai(
-        {"aind_behavior_subject_database": db_utils.SubjectDataBase}, schema_path=SCHEMA_ROOT, skip_sgen=True
+        {
+            "aind_behavior_data_types": DataTypes,
+            "aind_behavior_subject_database": db_utils.SubjectDataBase,
+        },
+        schema_path=SCHEMA_ROOT,
+        skip_sgen=True,
+        cache=cache,
+        max_workers=args.jobs,
     )
 
 
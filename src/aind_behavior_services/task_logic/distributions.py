@@ -2,11 +2,16 @@
 from __future__ import annotations
 
 import logging
+import math
+import sys
 from enum import Enum
-from typing import Annotated, List, Literal, Optional, Self, Union
+from functools import lru_cache
+from typing import Annotated, Any, List, Literal, NamedTuple, Optional, Self, Sequence, Tuple, Union
+
+import numpy as np
 
 # Import aind-datas-schema types
-from pydantic import BaseModel, Field, NonNegativeFloat, field_validator, model_validator
+from pydantic import BaseModel, Field, NonNegativeFloat, PrivateAttr, TypeAdapter, field_validator, model_validator
 from typing_extensions import TypeAliasType
 
 logger = logging.getLogger(__name__)
@@ -50,6 +55,20 @@ class DistributionBase(BaseModel):
         default=None, description="Scaling parameters of the distribution"
     )
 
+    @model_validator(mode="after")
+    def validate_truncation(self) -> Self:
+        truncation = self.truncation_parameters
+        if truncation is None or not truncation.is_truncated:
+            return self
+        if truncation.min > truncation.max:
+            raise ValueError(f"Truncation minimum ({truncation.min}) is larger than its maximum ({truncation.max}).")
+        if not _truncation_has_mass(self):
+            raise ValueError(
+                f"The truncation window [{truncation.min}, {truncation.max}] has no probability mass "
+                f"under the {self.family.value} distribution."
+            )
+        return self
+
 
 class ScalarDistributionParameter(DistributionParametersBase):
     family: Literal[DistributionFamily.SCALAR] = DistributionFamily.SCALAR
@@ -174,10 +193,15 @@ class PdfDistributionParameters(DistributionParametersBase):
     pdf: List[NonNegativeFloat] = Field(default=[1], description="The probability density function")
     index: List[float] = Field(default=[0], description="The index of the probability density function")
 
+    _alias_cache: _AliasTableCache = PrivateAttr(default_factory=lambda: _AliasTableCache())
+
     @field_validator("pdf")
     @classmethod
     def normalize_pdf(cls, v: List[NonNegativeFloat]) -> List[NonNegativeFloat]:
-        return [x / sum(v) for x in v]
+        total = math.fsum(v)
+        if not total > 0:
+            raise ValueError("pdf must have a positive sum")
+        return [x / total for x in v]
 
     @model_validator(mode="after")
     def validate_matching_length(self) -> Self:
@@ -185,6 +209,96 @@ class PdfDistributionParameters(DistributionParametersBase):
             raise ValueError("pdf and index must have the same length")
         return self
 
+    def alias_table(self) -> AliasTable:
+        """Returns the alias table of the pdf, which is reused until the contents of `pdf` or `index` change.
+
+        The cache holds copies of both lists and compares their contents, so it is also rebuilt when they
+        are modified in place. The comparison takes linear time, but is much cheaper than building the table.
+        """
+        cache = self._alias_cache
+        if cache.pdf != self.pdf or cache.index != self.index:
+            # Copies of the model share the cache, so a new one is set rather than updating it
+            cache = _AliasTableCache(list(self.pdf), list(self.index), AliasTable.from_pdf(self.pdf, self.index))
+            self._alias_cache = cache
+        return cache.table
+
+
+class AliasTable(NamedTuple):
+    """Walker's alias table of a discrete distribution, which draws each sample in constant time.
+
+    A sample picks a bin uniformly, and keeps it with probability `probability[bin]`, or otherwise
+    takes `alias[bin]`. The table is built with Vose's algorithm, in linear time.
+    """
+
+    probability: np.ndarray
+    """Probability of keeping each bin."""
+    alias: np.ndarray
+    """Bin that replaces each bin when it is not kept."""
+    values: np.ndarray
+    """Value of each bin."""
+
+    @classmethod
+    def from_pdf(cls, pdf: List[float], values: List[float]) -> Self:
+        """Builds the alias table of a pdf, which is normalized to sum to 1.
+
+        Raises:
+            ValueError: If `pdf` and `values` have different lengths, or `pdf` has negative
+              values or does not have a positive sum.
+        """
+        n = len(pdf)
+        if n != len(values):
+            raise ValueError("pdf and index must have the same length")
+        pdf = np.asarray(pdf, dtype=float)
+        total = pdf.sum()
+        if np.any(pdf < 0) or not total > 0:
+            raise ValueError("pdf must be non-negative and have a positive sum")
+        scaled = (pdf * (n / total)).tolist()
+        probability = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            probability[less] = scaled[less]
+            alias[less] = more
+            scaled[more] += scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+        # Bins left in either list only differ from 1 by round-off, and keep a probability of 1
+        return cls(np.array(probability), np.array(alias, dtype=np.intp), np.asarray(values, dtype=float))
+
+    def sample(self, rng: np.random.Generator, size: Any) -> np.ndarray:
+        """Draws values from the table.
+
+        Each value is drawn from a single uniform variate, whose integer part picks a bin and whose
+        fractional part picks between the bin and its alias, so longer draws extend shorter ones.
+        """
+        scaled = rng.random(size) * len(self.probability)
+        bins = np.minimum(scaled.astype(np.intp), len(self.probability) - 1)
+        bins = np.where(scaled - bins < self.probability[bins], bins, self.alias[bins])
+        return self.values[bins]
+
+
+class _AliasTableCache:
+    """Alias table of copies of the `pdf` and `index` lists it was built from.
+
+    Caches are not part of the value of a model, so all holders compare equal, and do not affect the
+    equality of the models that hold them.
+    """
+
+    __slots__ = ("pdf", "index", "table")
+
+    def __init__(
+        self, pdf: Optional[List[float]] = None, index: Optional[List[float]] = None, table: Optional[AliasTable] = None
+    ) -> None:
+        self.pdf = pdf
+        self.index = index
+        self.table = table
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _AliasTableCache)
+
+    __hash__ = None
+
 
 class PdfDistribution(DistributionBase):
     family: Literal[DistributionFamily.PDF] = DistributionFamily.PDF
@@ -232,3 +346,140 @@ DistributionParameters = TypeAliasType(
         Field(discriminator="family", title="DistributionParameters", description="Parameters of the distribution"),
     ],
 )
+
+
+@lru_cache(maxsize=None)
+def _distribution_list_adapter() -> TypeAdapter:
+    return TypeAdapter(List[Distribution])
+
+
+def validate_distributions(data: Union[str, bytes, Sequence[Any]]) -> List[DistributionBase]:
+    """Validates a list of distributions in a single call.
+
+    The whole list is validated by one cached `TypeAdapter`, which is much faster than validating
+    each entry with `TypeAdapter(Distribution)` or `model_validate` in a Python loop. Validating
+    json directly also skips building the intermediate Python objects.
+
+    Args:
+        data (Union[str, bytes, Sequence[Any]]): A json array, or a sequence of dictionaries or distributions.
+
+    Returns:
+        List[DistributionBase]: The validated distributions.
+    """
+    adapter = _distribution_list_adapter()
+    if isinstance(data, (str, bytes)):
+        return adapter.validate_json(data)
+    return adapter.validate_python(data)
+
+
+class _Support(NamedTuple):
+    """Support of a distribution, before scaling.
+
+    A distribution is either continuous or supported on the integers between `lower` and `upper`,
+    or, if `atoms` is set, a finite set of values with the probabilities in `weights`.
+    """
+
+    lower: float = -math.inf
+    upper: float = math.inf
+    integer: bool = False
+    atoms: Optional[Tuple[float, ...]] = None
+    weights: Optional[Tuple[float, ...]] = None
+
+    def restrict(self, low: float, high: float) -> "_Support":
+        """Restricts the support to the interval [low, high].
+
+        Integer and atom bounds are compared with a tolerance of a few ulps, to absorb the round-off
+        of mapping a truncation window back through its scaling.
+        """
+        if self.atoms is not None:
+            low, high = _widen(low, -1), _widen(high, 1)
+            weights = tuple(w if low <= a <= high else 0.0 for a, w in zip(self.atoms, self.weights))
+            return _Support(atoms=self.atoms, weights=weights)
+        if self.integer:
+            lower, upper = math.ceil(_widen(low, -1)), math.floor(_widen(high, 1))
+            return _Support(max(lower, self.lower), min(upper, self.upper), True)
+        return _Support(low if low > self.lower else self.lower, high if high < self.upper else self.upper)
+
+    def has_mass(self) -> bool:
+        """Whether the support has a non-zero probability."""
+        if self.atoms is not None:
+            return any(w > 0 for w in self.weights)
+        if self.integer:
+            return self.lower <= self.upper
+        return self.lower < self.upper
+
+
+def _widen(value: float, direction: int) -> float:
+    return value + direction * 4 * sys.float_info.epsilon * max(1.0, abs(value))
+
+
+def _atom(value: float) -> _Support:
+    return _Support(atoms=(value,), weights=(1.0,))
+
+
+def _uniform_support(p: UniformDistributionParameters) -> _Support:
+    low, high = (p.min, p.max) if p.min <= p.max else (p.max, p.min)
+    return _atom(low) if low == high else _Support(low, high)
+
+
+def _gamma_support(p: GammaDistributionParameters) -> _Support:
+    if p.shape == 0 or p.rate == 0:
+        return _atom(0 if p.shape == 0 else math.inf)
+    return _Support(0)
+
+
+def _beta_support(p: BetaDistributionParameters) -> _Support:
+    if p.alpha == 0 and p.beta == 0:
+        return _Support(atoms=(0, 1), weights=(0.5, 0.5))
+    if p.alpha == 0 or p.beta == 0:
+        return _atom(0 if p.alpha == 0 else 1)
+    return _Support(0, 1)
+
+
+def _binomial_support(p: BinomialDistributionParameters) -> _Support:
+    if p.p in (0, 1) or p.n == 0:
+        return _atom(p.n * p.p)
+    return _Support(0, p.n, True)
+
+
+_SUPPORTS = {
+    DistributionFamily.SCALAR: lambda p: _atom(p.value),
+    DistributionFamily.NORMAL: lambda p: _atom(p.mean) if p.std == 0 else _Support(),
+    DistributionFamily.LOGNORMAL: lambda p: _atom(math.exp(p.mean)) if p.std == 0 else _Support(0),
+    DistributionFamily.UNIFORM: _uniform_support,
+    DistributionFamily.EXPONENTIAL: lambda p: _atom(math.inf) if p.rate == 0 else _Support(0),
+    DistributionFamily.GAMMA: _gamma_support,
+    DistributionFamily.BETA: _beta_support,
+    DistributionFamily.BINOMIAL: _binomial_support,
+    DistributionFamily.POISSON: lambda p: _atom(0) if p.rate == 0 else _Support(0, math.inf, True),
+    DistributionFamily.PDF: lambda p: _Support(atoms=tuple(p.index), weights=tuple(p.pdf)),
+}
+
+
+def _support(parameters: DistributionParametersBase) -> _Support:
+    """Returns the support of a distribution, treating degenerate parameters as point masses."""
+    return _SUPPORTS[parameters.family](parameters)
+
+
+def _unscaled_truncation_window(distribution: DistributionBase) -> Optional[Tuple[float, float]]:
+    """Maps the truncation window of a distribution back through its scaling.
+
+    Returns None if the scale is 0, in which case every sample equals the offset.
+    """
+    truncation = distribution.truncation_parameters
+    scaling = distribution.scaling_parameters
+    scale, offset = (scaling.scale, scaling.offset) if scaling is not None else (1.0, 0.0)
+    if scale == 0:
+        return None
+    low = (truncation.min - offset) / scale
+    high = (truncation.max - offset) / scale
+    return (high, low) if scale < 0 else (low, high)
+
+
+def _truncation_has_mass(distribution: DistributionBase) -> bool:
+    """Whether the truncation window of a distribution has a non-zero probability."""
+    truncation = distribution.truncation_parameters
+    window = _unscaled_truncation_window(distribution)
+    if window is None:
+        return truncation.min <= distribution.scaling_parameters.offset <= truncation.max
+    return _support(distribution.distribution_parameters).restrict(*window).has_mass()
@@ -0,0 +1,423 @@
+import logging
+import math
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from numpy.typing import ArrayLike
+from pydantic import BaseModel
+
+from aind_behavior_services.task_logic.distributions import (
+    DistributionBase,
+    DistributionFamily,
+    DistributionParametersBase,
+    _Support,
+    _support,
+    _unscaled_truncation_window,
+)
+from aind_behavior_services.task_logic.sampling import _frozen, _frozen_family, _truncated_ppf
+
+logger = logging.getLogger(__name__)
+
+Distributions = Union[DistributionBase, Sequence[DistributionBase]]
+
+_Arrays = Dict[str, np.ndarray]
+
+
+class _Prepared(NamedTuple):
+    """A distribution reduced to its parameters and the support of its truncation window, before scaling."""
+
+    parameters: DistributionParametersBase
+    support: Optional[_Support]
+    """Support of the distribution, or None if the scale is 0 and every value equals the offset."""
+    truncated: bool
+    """Whether the truncation window is narrower than the support of the distribution."""
+    scale: float
+    offset: float
+
+
+class _Entry(NamedTuple):
+    prepared: _Prepared
+    mean: float
+    variance: float
+
+
+class _Memo:
+    """Least recently used cache of the moments of distributions, keyed on their parameters."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, distributions: Sequence[DistributionBase]) -> List[_Entry]:
+        """Returns the entries of the distributions, computing the missing ones together."""
+        keys = [_key(d) for d in distributions]
+        found: Dict[Hashable, _Entry] = {}
+        missing: Dict[Hashable, DistributionBase] = {}
+        for key, distribution in zip(keys, distributions):
+            if key in found or key in missing:
+                continue
+            entry = self.entries.get(key)
+            if entry is None:
+                missing[key] = distribution
+            else:
+                self.entries.move_to_end(key)
+                found[key] = entry
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        found.update(zip(missing, _compute(list(missing.values()))))
+        for key in missing:
+            self.entries[key] = found[key]
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return [found[key] for key in keys]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+
+def _freeze(model: BaseModel) -> Hashable:
+    if model is None:
+        return None
+    return tuple((name, tuple(value) if isinstance(value, list) else value) for name, value in model)
+
+
+def _key(distribution: DistributionBase) -> Hashable:
+    """Key of a distribution, equal for distributions with the same parameters."""
+    truncation = distribution.truncation_parameters
+    return (
+        _freeze(distribution.distribution_parameters),
+        _freeze(truncation) if truncation is not None and truncation.is_truncated else None,
+        _freeze(distribution.scaling_parameters),
+    )
+
+
+def _prepare(distribution: DistributionBase) -> _Prepared:
+    truncation = distribution.truncation_parameters
+    scaling = distribution.scaling_parameters
+    scale, offset = (scaling.scale, scaling.offset) if scaling is not None else (1.0, 0.0)
+    parameters = distribution.distribution_parameters
+    support = _support(parameters)
+    if truncation is None or not truncation.is_truncated:
+        return _Prepared(parameters, support, False, scale, offset)
+    window = _unscaled_truncation_window(distribution)
+    if window is None:
+        return _Prepared(parameters, None, False, scale, offset)
+    restricted = support.restrict(*window)
+    if not restricted.has_mass():
+        raise ValueError(f"The truncation window of the {distribution.family.value} distribution has no mass.")
+    return _Prepared(parameters, restricted, restricted != support, scale, offset)
+
+
+def _stack(prepared: Sequence[_Prepared]) -> Tuple[_Arrays, np.ndarray, np.ndarray]:
+    """Stacks the parameters and support bounds of distributions of the same family into arrays."""
+    names = [name for name in type(prepared[0].parameters).model_fields if name != "family"]
+    parameters = {name: np.array([getattr(p.parameters, name) for p in prepared], dtype=float) for name in names}
+    lower = np.array([p.support.lower for p in prepared], dtype=float)
+    upper = np.array([p.support.upper for p in prepared], dtype=float)
+    return parameters, lower, upper
+
+
+def _atom_arrays(support: _Support) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted atoms with a positive weight, and their normalized weights."""
+    atoms = np.asarray(support.atoms, dtype=float)
+    weights = np.asarray(support.weights, dtype=float)
+    order = np.argsort(atoms)
+    atoms, weights = atoms[order], weights[order]
+    positive = weights > 0
+    return atoms[positive], weights[positive] / weights[positive].sum()
+
+
+def _atom_moments(support: _Support) -> Tuple[float, float]:
+    atoms, weights = _atom_arrays(support)
+    mean = float(np.dot(weights, atoms))
+    variance = float(np.dot(weights, (atoms - mean) ** 2)) if np.isfinite(mean) else math.nan
+    return mean, mean**2 + variance
+
+
+def _atom_quantile(support: _Support, q: np.ndarray) -> np.ndarray:
+    atoms, weights = _atom_arrays(support)
+    cumulative = np.cumsum(weights)
+    # Smallest atom whose cumulative probability reaches q
+    return atoms[np.minimum(np.searchsorted(cumulative, q * cumulative[-1], side="left"), len(atoms) - 1)]
+
+
+# First and second raw moments of the families without truncation
+_RAW_MOMENTS: Dict[DistributionFamily, Callable[[_Arrays], Tuple[np.ndarray, np.ndarray]]] = {
+    DistributionFamily.NORMAL: lambda p: (p["mean"], p["std"] ** 2 + p["mean"] ** 2),
+    DistributionFamily.LOGNORMAL: lambda p: (
+        np.exp(p["mean"] + p["std"] ** 2 / 2),
+        np.exp(2 * p["mean"] + 2 * p["std"] ** 2),
+    ),
+    DistributionFamily.EXPONENTIAL: lambda p: (1 / p["rate"], 2 / p["rate"] ** 2),
+    DistributionFamily.GAMMA: lambda p: (p["shape"] / p["rate"], p["shape"] * (p["shape"] + 1) / p["rate"] ** 2),
+    DistributionFamily.BETA: lambda p: (
+        p["alpha"] / (p["alpha"] + p["beta"]),
+        p["alpha"] * (p["alpha"] + 1) / ((p["alpha"] + p["beta"]) * (p["alpha"] + p["beta"] + 1)),
+    ),
+    DistributionFamily.BINOMIAL: lambda p: (p["n"] * p["p"], p["n"] * p["p"] * (1 - p["p"]) + (p["n"] * p["p"]) ** 2),
+    DistributionFamily.POISSON: lambda p: (p["rate"], p["rate"] + p["rate"] ** 2),
+}
+
+
+def _mass(dist, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """Probability of (low, high] under a scipy distribution, elementwise."""
+    lower = dist.cdf(low)
+    # In the upper tail, the survival function keeps the precision that the CDF loses close to 1
+    return np.where(lower > 0.5, dist.sf(low) - dist.sf(high), dist.cdf(high) - lower)
+
+
+def _partial_terms(family: DistributionFamily, p: _Arrays) -> List[Tuple[np.ndarray, object]]:
+    """Coefficients and scipy distributions whose masses on a window give its partial moments of order 0, 1 and 2.
+
+    For example, E[X 1{a < X <= b}] = (k / rate) P(a < Y <= b) with Y ~ Gamma(k + 1, rate) for X ~ Gamma(k, rate).
+    """
+    from scipy import stats
+
+    if family in (DistributionFamily.GAMMA, DistributionFamily.EXPONENTIAL):
+        shape = p["shape"] if family == DistributionFamily.GAMMA else np.ones_like(p["rate"])
+        scale = 1 / p["rate"]
+        return [
+            (np.ones_like(shape), stats.gamma(shape, scale=scale)),
+            (shape * scale, stats.gamma(shape + 1, scale=scale)),
+            (shape * (shape + 1) * scale**2, stats.gamma(shape + 2, scale=scale)),
+        ]
+    if family == DistributionFamily.BETA:
+        a, b = p["alpha"], p["beta"]
+        return [
+            (np.ones_like(a), stats.beta(a, b)),
+            (a / (a + b), stats.beta(a + 1, b)),
+            (a * (a + 1) / ((a + b) * (a + b + 1)), stats.beta(a + 2, b)),
+        ]
+    if family == DistributionFamily.LOGNORMAL:
+        mu, sigma = p["mean"], p["std"]
+        return [
+            (np.exp(r * mu + (r * sigma) ** 2 / 2), stats.lognorm(sigma, scale=np.exp(mu + r * sigma**2)))
+            for r in range(3)
+        ]
+    raise ValueError(f"No moments for the {family.value} distribution.")
+
+
+def _integer_terms(family: DistributionFamily, p: _Arrays) -> List[Tuple[np.ndarray, object]]:
+    """Coefficients and scipy distributions of the factorial moments of order 0, 1 and 2 of an integer family.
+
+    The distribution of the moment of order r is evaluated on the window shifted down by r.
+    """
+    from scipy import stats
+
+    if family == DistributionFamily.POISSON:
+        rate = p["rate"]
+        return [(np.ones_like(rate), stats.poisson(rate)), (rate, stats.poisson(rate)), (rate**2, stats.poisson(rate))]
+    n, prob = p["n"], p["p"]
+    # The second factorial moment vanishes for n < 2, whose shifted distribution is left valid but unused
+    return [
+        (np.ones_like(n), stats.binom(n, prob)),
+        (n * prob, stats.binom(n - 1, prob)),
+        (np.where(n >= 2, n * (n - 1) * prob**2, 0.0), stats.binom(np.maximum(n - 2, 0), prob)),
+    ]
+
+
+def _truncated_raw_moments(
+    family: DistributionFamily, p: _Arrays, low: np.ndarray, high: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """First and second raw moments of distributions of a family restricted to (low, high]."""
+    from scipy import stats
+
+    if family == DistributionFamily.NORMAL:
+        mean, sd = p["mean"], p["std"]
+        first, variance = stats.truncnorm.stats((low - mean) / sd, (high - mean) / sd, mean, sd, moments="mv")
+        return np.asarray(first, dtype=float), np.asarray(variance + first**2, dtype=float)
+    if family in (DistributionFamily.BINOMIAL, DistributionFamily.POISSON):
+        # Integer supports are evaluated as (low - 1, high]
+        masses = [c * _mass(d, low - 1 - r, high - r) for r, (c, d) in enumerate(_integer_terms(family, p))]
+        first = masses[1] / masses[0]
+        return first, masses[2] / masses[0] + first
+    with np.errstate(invalid="ignore", divide="ignore"):
+        masses = [c * _mass(d, low, high) for c, d in _partial_terms(family, p)]
+        return masses[1] / masses[0], masses[2] / masses[0]
+
+
+def _family_raw_moments(family: DistributionFamily, prepared: Sequence[_Prepared]) -> Tuple[np.ndarray, np.ndarray]:
+    """First and second raw moments of distributions of the same continuous or integer family."""
+    p, low, high = _stack(prepared)
+    if family == DistributionFamily.UNIFORM:
+        return (low + high) / 2, (low**2 + low * high + high**2) / 3
+    first, second = (np.array(x, dtype=float) for x in _RAW_MOMENTS[family](p))
+    truncated = np.array([x.truncated for x in prepared])
+    if truncated.any():
+        window = {name: values[truncated] for name, values in p.items()}
+        first[truncated], second[truncated] = _truncated_raw_moments(family, window, low[truncated], high[truncated])
+    # Windows too far in the tail for their probability to be represented are integrated numerically
+    for i in np.flatnonzero(~(np.isfinite(first) & np.isfinite(second)) & truncated):
+        logger.debug("Integrating the moments of the %s distribution numerically.", family.value)
+        dist = _frozen(prepared[i].parameters)
+        first[i], second[i] = (
+            float(dist.expect(lambda x, r=r: x**r, lb=low[i], ub=high[i], conditional=True)) for r in (1, 2)
+        )
+    return first, second
+
+
+def _group(prepared: Sequence[_Prepared]) -> Tuple[List[int], List[int], Dict[DistributionFamily, List[int]]]:
+    """Splits distributions into constants, finite sets of atoms, and continuous or integer families."""
+    constants, atoms, families = [], [], {}
+    for i, p in enumerate(prepared):
+        if p.support is None:
+            constants.append(i)
+        elif p.support.atoms is not None:
+            atoms.append(i)
+        else:
+            families.setdefault(p.parameters.family, []).append(i)
+    return constants, atoms, families
+
+
+def _compute(distributions: Sequence[DistributionBase]) -> List[_Entry]:
+    prepared = [_prepare(d) for d in distributions]
+    first = np.zeros(len(prepared))
+    second = np.zeros(len(prepared))
+    _, atoms, families = _group(prepared)
+    for i in atoms:
+        first[i], second[i] = _atom_moments(prepared[i].support)
+    for family, indices in families.items():
+        first[indices], second[indices] = _family_raw_moments(family, [prepared[i] for i in indices])
+    scale = np.array([p.scale for p in prepared], dtype=float)
+    offset = np.array([p.offset for p in prepared], dtype=float)
+    with np.errstate(invalid="ignore"):
+        variance = np.where(np.isfinite(first), np.maximum(second - first**2, 0.0), math.nan)
+        mean = np.where(scale == 0, 0.0, first * scale) + offset
+        variance = np.where(scale == 0, 0.0, variance * scale**2)
+    return [_Entry(p, float(m), float(v)) for p, m, v in zip(prepared, mean, variance)]
+
+
+def _discrete_ppf(inverse: np.ndarray, cdf: Callable[[np.ndarray], np.ndarray], q: np.ndarray) -> np.ndarray:
+    """Smallest integer whose cumulative probability reaches q, from a continuous inverse of the CDF."""
+    k = np.ceil(inverse)
+    below = np.maximum(k - 1, 0)
+    # The CDF takes integer counts, and undefined inverses are resolved by the caller
+    counts = np.where(np.isfinite(below), below, 0).astype(np.int64)
+    return np.where(cdf(counts) >= q, below, k)
+
+
+def _untruncated_quantile(family: DistributionFamily, p: _Arrays, q: np.ndarray) -> np.ndarray:
+    from scipy import special
+
+    if family == DistributionFamily.NORMAL:
+        return p["mean"] + p["std"] * special.ndtri(q)
+    if family == DistributionFamily.LOGNORMAL:
+        return np.exp(p["mean"] + p["std"] * special.ndtri(q))
+    if family == DistributionFamily.EXPONENTIAL:
+        return -np.log1p(-q) / p["rate"]
+    if family == DistributionFamily.GAMMA:
+        return special.gammaincinv(p["shape"], q) / p["rate"]
+    if family == DistributionFamily.BETA:
+        return special.betaincinv(p["alpha"], p["beta"], q)
+    if family == DistributionFamily.BINOMIAL:
+        n, prob = p["n"], p["p"]
+        return _discrete_ppf(special.bdtrik(q, n, prob), lambda k: special.bdtr(k, n.astype(np.int64), prob), q)
+    if family == DistributionFamily.POISSON:
+        return _discrete_ppf(special.pdtrik(q, p["rate"]), lambda k: special.pdtr(k, p["rate"]), q)
+    raise ValueError(f"No inverse CDF for the {family.value} distribution.")
+
+
+def _family_quantile(family: DistributionFamily, prepared: Sequence[_Prepared], q: np.ndarray) -> np.ndarray:
+    """Quantiles of distributions of the same continuous or integer family, with one row of probabilities each."""
+    p, low, high = _stack(prepared)
+    p = {name: values[:, None] for name, values in p.items()}
+    low, high = low[:, None], high[:, None]
+    if family == DistributionFamily.UNIFORM:
+        return low + q * (high - low)
+    truncated = np.array([x.truncated for x in prepared])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = _untruncated_quantile(family, p, q)
+        if truncated.any():
+            window = {name: values[truncated] for name, values in p.items()}
+            # The CDF of integer families is evaluated below the first integer of the support
+            below = low[truncated] - 1 if prepared[0].support.integer else low[truncated]
+            dist = _frozen_family(family, window)
+            result[truncated] = _truncated_ppf(dist, below, high[truncated], q[truncated])
+    # The inverse of the CDF is not defined at 1 for integer families
+    result = np.where(q >= 1, high, result) if prepared[0].support.integer else result
+    return np.clip(result, low, high)
+
+
+def _quantiles(prepared: Sequence[_Prepared], q: np.ndarray) -> np.ndarray:
+    """Quantiles of distributions at probabilities q, with one row per distribution."""
+    scale = np.array([p.scale for p in prepared], dtype=float)[:, None]
+    offset = np.array([p.offset for p in prepared], dtype=float)[:, None]
+    # A negative scale reverses the order of the values
+    q = np.where(scale < 0, 1 - q[None, :], q[None, :])
+    base = np.zeros(q.shape)
+    _, atoms, families = _group(prepared)
+    for i in atoms:
+        base[i] = _atom_quantile(prepared[i].support, q[i])
+    for family, indices in families.items():
+        base[indices] = _family_quantile(family, [prepared[i] for i in indices], q[indices])
+    with np.errstate(invalid="ignore"):
+        return np.where(scale == 0, 0.0, base * scale) + offset
+
+
+def _entries(distributions: Distributions) -> List[_Entry]:
+    if isinstance(distributions, DistributionBase):
+        return _memo.lookup([distributions])
+    return _memo.lookup(list(distributions))
+
+
+def _reduce(values: np.ndarray, distributions: Distributions) -> Union[float, np.ndarray]:
+    return float(values[0]) if isinstance(distributions, DistributionBase) else values
+
+
+def mean(distributions: Distributions) -> Union[float, np.ndarray]:
+    """Computes the mean of one or more distributions, after scaling and truncation.
+
+    Distributions are evaluated together per family, and results are memoized per set of parameters,
+    so repeated distributions are only evaluated once.
+
+    Args:
+        distributions (Distributions): A distribution, or a sequence of distributions.
+
+    Returns:
+        Union[float, np.ndarray]: The mean, or an array with the mean of each distribution.
+    """
+    return _reduce(np.array([e.mean for e in _entries(distributions)], dtype=float), distributions)
+
+
+def variance(distributions: Distributions) -> Union[float, np.ndarray]:
+    """Computes the variance of one or more distributions, after scaling and truncation.
+
+    Args:
+        distributions (Distributions): A distribution, or a sequence of distributions.
+
+    Returns:
+        Union[float, np.ndarray]: The variance, or an array with the variance of each distribution.
+    """
+    return _reduce(np.array([e.variance for e in _entries(distributions)], dtype=float), distributions)
+
+
+def quantile(distributions: Distributions, q: ArrayLike) -> Union[float, np.ndarray]:
+    """Computes quantiles of one or more distributions, after scaling and truncation.
+
+    The quantile of a probability q is the smallest value whose cumulative probability is at least q.
+
+    Args:
+        distributions (Distributions): A distribution, or a sequence of distributions.
+        q (ArrayLike): Probabilities, between 0 and 1.
+
+    Returns:
+        Union[float, np.ndarray]: Quantiles with the shape of q, stacked along a first axis for a
+          sequence of distributions.
+    """
+    q = np.asarray(q, dtype=float)
+    if np.any((q < 0) | (q > 1)):
+        raise ValueError("Probabilities must be between 0 and 1.")
+    entries = _entries(distributions)
+    if not entries:
+        return np.empty((0, *q.shape))
+    result = _quantiles([e.prepared for e in entries], q.ravel())
+    if isinstance(distributions, DistributionBase):
+        return result[0].reshape(q.shape)[()]
+    return result.reshape(-1, *q.shape)
+
+
+_memo = _Memo(maxsize=65536)
@@ -0,0 +1,198 @@
+import logging
+import math
+from typing import Callable, Dict, Mapping, Tuple, Union
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from aind_behavior_services.task_logic import distributions
+from aind_behavior_services.task_logic.distributions import (
+    DistributionBase,
+    DistributionFamily,
+    _support,
+    _truncation_has_mass,
+    _unscaled_truncation_window,
+)
+
+logger = logging.getLogger(__name__)
+
+Size = Union[None, int, Tuple[int, ...]]
+RandomState = Union[None, int, np.random.SeedSequence, np.random.Generator]
+
+_Sampler = Callable[[distributions.DistributionParametersBase, np.random.Generator, Tuple[int, ...]], np.ndarray]
+
+
+def _sample_scalar(p: distributions.ScalarDistributionParameter, rng: np.random.Generator, size) -> np.ndarray:
+    return np.full(size, p.value, dtype=float)
+
+
+def _sample_normal(p: distributions.NormalDistributionParameters, rng: np.random.Generator, size) -> np.ndarray:
+    return rng.normal(p.mean, p.std, size)
+
+
+def _sample_lognormal(p: distributions.LogNormalDistributionParameters, rng: np.random.Generator, size) -> np.ndarray:
+    return rng.lognormal(p.mean, p.std, size)
+
+
+def _sample_uniform(p: distributions.UniformDistributionParameters, rng: np.random.Generator, size) -> np.ndarray:
+    return rng.uniform(p.min, p.max, size)
+
+
+def _sample_exponential(
+    p: distributions.ExponentialDistributionParameters, rng: np.random.Generator, size
+) -> np.ndarray:
+    return rng.exponential(1 / p.rate if p.rate > 0 else np.inf, size)
+
+
+def _sample_gamma(p: distributions.GammaDistributionParameters, rng: np.random.Generator, size) -> np.ndarray:
+    return rng.gamma(p.shape, 1 / p.rate if p.rate > 0 else np.inf, size)
+
+
+def _sample_binomial(p: distributions.BinomialDistributionParameters, rng: np.random.Generator, size) -> np.ndarray:
+    return rng.binomial(p.n, p.p, size).astype(float)
+
+
+def _sample_beta(p: distributions.BetaDistributionParameters, rng: np.random.Generator, size) -> np.ndarray:
+    return rng.beta(p.alpha, p.beta, size)
+
+
+def _sample_poisson(p: distributions.PoissonDistributionParameters, rng: np.random.Generator, size) -> np.ndarray:
+    return rng.poisson(p.rate, size).astype(float)
+
+
+def _sample_pdf(p: distributions.PdfDistributionParameters, rng: np.random.Generator, size) -> np.ndarray:
+    return p.alias_table().sample(rng, size)
+
+
+_SAMPLERS: Dict[DistributionFamily, _Sampler] = {
+    DistributionFamily.SCALAR: _sample_scalar,
+    DistributionFamily.NORMAL: _sample_normal,
+    DistributionFamily.LOGNORMAL: _sample_lognormal,
+    DistributionFamily.UNIFORM: _sample_uniform,
+    DistributionFamily.EXPONENTIAL: _sample_exponential,
+    DistributionFamily.GAMMA: _sample_gamma,
+    DistributionFamily.BINOMIAL: _sample_binomial,
+    DistributionFamily.BETA: _sample_beta,
+    DistributionFamily.POISSON: _sample_poisson,
+    DistributionFamily.PDF: _sample_pdf,
+}
+
+
+def _scale(distribution: DistributionBase, values: np.ndarray) -> np.ndarray:
+    scaling = distribution.scaling_parameters
+    if scaling is not None:
+        values = values * scaling.scale + scaling.offset
+    return values
+
+
+def _frozen(parameters: distributions.DistributionParametersBase):
+    """Returns the scipy distribution of a continuous or integer family."""
+    return _frozen_family(parameters.family, dict(parameters))
+
+
+def _frozen_family(family: DistributionFamily, p: Mapping[str, ArrayLike]):
+    """Returns the scipy distribution of a continuous or integer family, with scalar or array parameters."""
+    from scipy import stats
+
+    if family == DistributionFamily.NORMAL:
+        return stats.norm(p["mean"], p["std"])
+    if family == DistributionFamily.LOGNORMAL:
+        return stats.lognorm(p["std"], scale=np.exp(p["mean"]))
+    if family == DistributionFamily.EXPONENTIAL:
+        return stats.expon(scale=1 / p["rate"])
+    if family == DistributionFamily.GAMMA:
+        return stats.gamma(p["shape"], scale=1 / p["rate"])
+    if family == DistributionFamily.BETA:
+        return stats.beta(p["alpha"], p["beta"])
+    if family == DistributionFamily.BINOMIAL:
+        return stats.binom(p["n"], p["p"])
+    if family == DistributionFamily.POISSON:
+        return stats.poisson(p["rate"])
+    raise ValueError(f"No inverse CDF for the {family.value} distribution.")
+
+
+def _truncated_ppf(dist, low: ArrayLike, high: ArrayLike, q: ArrayLike) -> np.ndarray:
+    """Inverse CDF of a scipy distribution restricted to (low, high], at probabilities q, elementwise."""
+    # In the upper tail, the survival function keeps the precision that the CDF loses close to 1
+    lower = dist.cdf(low)
+    upper = dist.sf(low)
+    with np.errstate(invalid="ignore"):
+        from_sf = dist.isf(upper - q * (upper - dist.sf(high)))
+        from_cdf = dist.ppf(lower + q * (dist.cdf(high) - lower))
+    return np.where(lower > 0.5, from_sf, from_cdf)
+
+
+def _restricted_ppf(
+    parameters: distributions.DistributionParametersBase, support: distributions._Support, q: np.ndarray
+) -> np.ndarray:
+    """Inverse CDF of a continuous or integer distribution restricted to its support, before scaling."""
+    if parameters.family == DistributionFamily.UNIFORM:
+        return support.lower + q * (support.upper - support.lower)
+    # The CDF of integer families is evaluated below the first integer of the support
+    low = support.lower - 1 if support.integer else support.lower
+    return np.clip(_truncated_ppf(_frozen(parameters), low, support.upper, q), support.lower, support.upper)
+
+
+def _draw_truncated(distribution: DistributionBase, rng: np.random.Generator, count: int) -> np.ndarray:
+    truncation = distribution.truncation_parameters
+    if not _truncation_has_mass(distribution):
+        raise ValueError(
+            f"The truncation window [{truncation.min}, {truncation.max}] has no probability mass "
+            f"under the {distribution.family.value} distribution."
+        )
+    window = _unscaled_truncation_window(distribution)
+    if window is None:
+        return np.full(count, distribution.scaling_parameters.offset)
+
+    support = _support(distribution.distribution_parameters).restrict(*window)
+    if support.atoms is not None:
+        weights = np.asarray(support.weights)
+        values = rng.choice(np.asarray(support.atoms, dtype=float), size=count, p=weights / weights.sum())
+    else:
+        values = _restricted_ppf(distribution.distribution_parameters, support, rng.random(count))
+    # Clip the round-off of the scaling, so that samples never leave the window
+    return np.clip(_scale(distribution, values), truncation.min, truncation.max)
+
+
+def sample(distribution: DistributionBase, size: Size = None, rng: RandomState = None) -> Union[float, np.ndarray]:
+    """Draws samples from a distribution of the task logic.
+
+    Samples are drawn from the family of the distribution and scaled by `scaling_parameters`
+    (`value * scale + offset`). If the distribution is truncated, samples are drawn exactly from the part
+    of the distribution whose scaled values are within the bounds of `truncation_parameters`, by inverting
+    its cumulative distribution function, so narrow windows cost as much as wide ones.
+    All steps operate on whole arrays.
+
+    Examples:
+        ```python
+        rng = np.random.default_rng(42)
+        distribution = ExponentialDistribution(
+            distribution_parameters=ExponentialDistributionParameters(rate=0.5),
+            truncation_parameters=TruncationParameters(is_truncated=True, min=1, max=10),
+        )
+        inter_trial_intervals = sample(distribution, 1000, rng)
+        ```
+
+    Args:
+        distribution (DistributionBase): The distribution to sample from.
+        size (Size, optional): Shape of the output. Defaults to None, which returns a single value.
+        rng (RandomState, optional): A random number generator, or a seed to create one with
+          `np.random.default_rng`. Defaults to None, which uses fresh entropy.
+
+    Returns:
+        Union[float, np.ndarray]: The samples, as floats.
+
+    Raises:
+        ValueError: If the truncation window has no probability mass.
+    """
+    rng = np.random.default_rng(rng)
+    shape = () if size is None else (size,) if isinstance(size, int) else tuple(size)
+    count = math.prod(shape)
+    truncation = distribution.truncation_parameters
+    if truncation is not None and truncation.is_truncated:
+        values = _draw_truncated(distribution, rng, count)
+    else:
+        values = _scale(
+            distribution, _SAMPLERS[distribution.family](distribution.distribution_parameters, rng, (count,))
+        )
+    return values.reshape(shape)[()]
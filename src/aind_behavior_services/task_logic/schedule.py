@@ -0,0 +1,140 @@
+import logging
+import struct
+from os import PathLike
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+from aind_behavior_services.task_logic.distributions import DistributionBase
+from aind_behavior_services.task_logic.sampling import sample
+from aind_behavior_services.utils import iter_fields_of_type
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_FILENAME = "trial_schedule.npz"
+"""Name of the schedule file when it is saved to a directory."""
+
+
+def seed_entropy(rng_seed: Optional[float]) -> int:
+    """Converts the `rng_seed` of `TaskParameters` to the entropy of a `np.random.SeedSequence`.
+
+    Non-negative integral seeds map to the same integer, so that a seed of 42.0 is equivalent to 42.
+    Other seeds map to the bits of their double precision representation. If the seed is None,
+    fresh entropy is drawn from the operating system.
+
+    Args:
+        rng_seed (Optional[float]): The seed of the task logic.
+
+    Returns:
+        int: The entropy of the seed sequence.
+    """
+    if rng_seed is None:
+        return np.random.SeedSequence().entropy
+    if float(rng_seed).is_integer() and rng_seed >= 0:
+        return int(rng_seed)
+    return struct.unpack("<Q", struct.pack("<d", rng_seed))[0]
+
+
+class TrialSchedule:
+    """Pre-drawn values of the distributions of a task logic, with one column per distribution.
+
+    Args:
+        columns (Dict[str, np.ndarray]): Values of each distribution, all of the same length.
+        entropy (int): Entropy of the seed sequence the values were drawn with.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], entropy: int) -> None:
+        lengths = {len(v) for v in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"All columns must have the same length, got {sorted(lengths)}.")
+        self.columns = columns
+        self.entropy = entropy
+
+    @property
+    def names(self) -> List[str]:
+        """Names of the columns."""
+        return list(self.columns)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def trial(self, index: int) -> Dict[str, float]:
+        """Returns the values of all distributions in one trial."""
+        return {name: float(values[index]) for name, values in self.columns.items()}
+
+    def save(self, path: PathLike) -> Path:
+        """Saves the schedule to a binary `.npz` file.
+
+        Args:
+            path (PathLike): Path of the file, or of a directory (e.g. of the session) to save
+              `SCHEDULE_FILENAME` into.
+
+        Returns:
+            Path: Path of the saved file.
+        """
+        path = Path(path)
+        if path.is_dir():
+            path = path / SCHEDULE_FILENAME
+        # Column names are stored separately, since they may not be valid archive member names
+        arrays = {f"column_{i}": values for i, values in enumerate(self.columns.values())}
+        with open(path, "wb") as f:
+            np.savez(f, names=np.array(self.names, dtype=str), entropy=np.array(str(self.entropy)), **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path: PathLike) -> "TrialSchedule":
+        """Loads a schedule saved with `save`."""
+        path = Path(path)
+        if path.is_dir():
+            path = path / SCHEDULE_FILENAME
+        with np.load(path, allow_pickle=False) as data:
+            names = data["names"].tolist()
+            columns = {name: data[f"column_{i}"] for i, name in enumerate(names)}
+            return cls(columns, int(data["entropy"][()]))
+
+
+def build_trial_schedule(
+    task_logic: BaseModel,
+    n_trials: int,
+    rng_seed: Optional[float] = None,
+) -> TrialSchedule:
+    """Pre-draws the values of every distribution of a task logic for a number of trials.
+
+    Every field of type `Distribution` found by `iter_fields_of_type` gets an independent random
+    stream, spawned in field order from a `np.random.SeedSequence` of the seed, and a column named
+    after its JSON pointer in the task logic (e.g. `/task_parameters/inter_trial_interval`). The
+    schedule is therefore reproducible from the seed, as long as the distribution fields of the
+    task logic do not change.
+
+    Examples:
+        ```python
+        schedule = build_trial_schedule(task_logic, n_trials=1000)
+        schedule.save(session_path)
+        ```
+
+    Args:
+        task_logic (BaseModel): The task logic, or any model holding distributions.
+        n_trials (int): Number of trials to draw.
+        rng_seed (Optional[float], optional): Seed of the schedule. Defaults to None, which uses
+          `task_parameters.rng_seed` of the task logic, or fresh entropy if that is not set either.
+
+    Returns:
+        TrialSchedule: The schedule, which records the entropy it was drawn with.
+    """
+    if n_trials < 0:
+        raise ValueError("Number of trials must be non-negative.")
+    if rng_seed is None:
+        rng_seed = getattr(getattr(task_logic, "task_parameters", None), "rng_seed", None)
+    entropy = seed_entropy(rng_seed)
+    fields = list(iter_fields_of_type(task_logic, DistributionBase))
+    streams = np.random.SeedSequence(entropy).spawn(len(fields))
+    columns = {
+        path: np.asarray(sample(distribution, n_trials, np.random.default_rng(stream)), dtype=float)
+        for (path, distribution), stream in zip(fields, streams)
+    }
+    return TrialSchedule(columns, entropy)
@@ -1,27 +1,72 @@
 import datetime
+import filecmp
+import hashlib
 import inspect
 import json
 import logging
 import os
+import re
+import shlex
+import shutil
 import subprocess
+import sys
+import tempfile
+import types
+from collections import abc
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from enum import Enum
+from functools import lru_cache, partial
 from os import PathLike
 from pathlib import Path
 from string import capwords
-from subprocess import CompletedProcess, run
-from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, TypeVar, Union, get_args
+from subprocess import CalledProcessError, CompletedProcess, run
+from typing import (
+    TYPE_CHECKING,
+    Annotated,
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    ForwardRef,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+)
 
 import pydantic
 from pydantic import BaseModel, PydanticInvalidForJsonSchema
+from pydantic.fields import FieldInfo
 from pydantic.json_schema import (
+    CoreModeRef,
+    CoreRef,
     GenerateJsonSchema,
+    JsonRef,
     JsonSchemaMode,
     JsonSchemaValue,
+    JsonSchemaWarningKind,
     _deduplicate_schemas,
     models_json_schema,
 )
 from pydantic_core import PydanticOmit, core_schema, to_jsonable_python
 
+from aind_behavior_services import __version__ as pkg_version
+
+if TYPE_CHECKING:
+    from pydantic._internal._core_utils import CoreSchemaOrField
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,12 +75,160 @@ T = TypeVar("T")
 TModel = TypeVar("TModel", bound=BaseModel)
 
 
+class _CachedDefinition(NamedTuple):
+    schema: JsonSchemaValue
+    dependencies: Dict[JsonRef, CoreModeRef]
+    core_schema: "CoreSchemaOrField"
+    """Keeps the types the definition was generated from alive, so that the `id` in its core reference is not reused."""
+
+
+_DefinitionsCache = Dict[Tuple[Any, ...], Dict[CoreModeRef, _CachedDefinition]]
+
+_definitions_cache: ContextVar[Optional[_DefinitionsCache]] = ContextVar("definitions_cache", default=None)
+
+
+def _remap_json_refs(value: Any, mapping: Dict[str, str]) -> Any:
+    """Returns a copy of a json schema with all json references (including discriminator mappings) remapped."""
+    if isinstance(value, dict):
+        return {k: _remap_json_refs(v, mapping) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_remap_json_refs(v, mapping) for v in value]
+    if isinstance(value, str):
+        return mapping.get(value, value)
+    return value
+
+
+def _iter_json_strings(value: Any) -> Iterable[str]:
+    if isinstance(value, dict):
+        for v in value.values():
+            yield from _iter_json_strings(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _iter_json_strings(v)
+    elif isinstance(value, str):
+        yield value
+
+
 class CustomGenerateJsonSchema(GenerateJsonSchema):
+    use_definitions_cache: ClassVar[bool] = True
+    """If True, definitions are shared across generator instances with the same settings in a `definitions_cache`."""
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.nullable_as_oneof = kwargs.get("nullable_as_oneof", True)
         self.unions_as_oneof = kwargs.get("unions_as_oneof", True)
         self.render_x_enum_names = kwargs.get("render_x_enum_names", True)
+        self._warning_count = 0
+
+    @staticmethod
+    @contextmanager
+    def definitions_cache() -> Iterator[None]:
+        """Shares definitions across all schemas generated within the context.
+
+        Nested contexts share the cache of the outermost one, which is discarded on exit.
+        """
+        if _definitions_cache.get() is not None:
+            yield
+            return
+        token = _definitions_cache.set({})
+        try:
+            yield
+        finally:
+            _definitions_cache.reset(token)
+
+    @classmethod
+    def clear_definitions_cache(cls) -> None:
+        """Clears the definitions shared in the current `definitions_cache` context."""
+        cache = _definitions_cache.get()
+        if cache is not None:
+            cache.clear()
+
+    @property
+    def _definitions_cache_key(self) -> Tuple[Any, ...]:
+        return (
+            type(self),
+            self.by_alias,
+            self.ref_template,
+            getattr(self, "union_format", None),
+            self.nullable_as_oneof,
+            self.unions_as_oneof,
+            self.render_x_enum_names,
+        )
+
+    def emit_warning(self, kind: JsonSchemaWarningKind, detail: str) -> None:
+        self._warning_count += 1
+        super().emit_warning(kind, detail)
+
+    def generate_inner(self, schema: "CoreSchemaOrField") -> JsonSchemaValue:
+        """Generates a JSON schema for a given core schema.
+
+        Within a `definitions_cache` context, schemas with a core reference (models, enums,
+        type aliases) are memoized across generator instances with the same settings. On a hit,
+        the cached definition, and the definitions it depends on, are copied into this instance
+        with their references remapped.
+        """
+        definitions_cache = _definitions_cache.get()
+        if not self.use_definitions_cache or definitions_cache is None or "ref" not in schema:
+            return super().generate_inner(schema)
+        core_mode_ref = (CoreRef(schema["ref"]), self.mode)
+        if core_mode_ref in self.core_to_defs_refs and self.core_to_defs_refs[core_mode_ref] in self.definitions:
+            return super().generate_inner(schema)
+
+        cache = definitions_cache.setdefault(self._definitions_cache_key, {})
+        json_schema = self._restore_cached_definition(core_mode_ref, cache)
+        if json_schema is not None:
+            return json_schema
+
+        warning_count = self._warning_count
+        json_schema = super().generate_inner(schema)
+        if self._warning_count == warning_count:
+            self._cache_definition(core_mode_ref, schema, cache)
+        return json_schema
+
+    def _cache_definition(
+        self,
+        core_mode_ref: CoreModeRef,
+        schema: "CoreSchemaOrField",
+        cache: Dict[CoreModeRef, _CachedDefinition],
+    ) -> None:
+        defs_ref = self.core_to_defs_refs.get(core_mode_ref)
+        if defs_ref is None or defs_ref not in self.definitions:
+            return
+        definition = self.definitions[defs_ref]
+        dependencies: Dict[JsonRef, CoreModeRef] = {}
+        for value in _iter_json_strings(definition):
+            dependency_defs_ref = self.json_to_defs_refs.get(JsonRef(value))
+            if dependency_defs_ref is None:
+                continue
+            dependency = self.defs_to_core_refs[dependency_defs_ref]
+            if dependency[1] != core_mode_ref[1] or dependency_defs_ref in self._core_defs_invalid_for_json_schema:
+                return
+            dependencies[JsonRef(value)] = dependency
+        cache[core_mode_ref] = _CachedDefinition(_remap_json_refs(definition, {}), dependencies, schema)
+
+    def _restore_cached_definition(
+        self, core_mode_ref: CoreModeRef, cache: Dict[CoreModeRef, _CachedDefinition]
+    ) -> Optional[JsonSchemaValue]:
+        missing: Dict[CoreModeRef, _CachedDefinition] = {}
+        stack = [core_mode_ref]
+        while stack:
+            ref = stack.pop()
+            if ref in missing or (ref in self.core_to_defs_refs and self.core_to_defs_refs[ref] in self.definitions):
+                continue
+            cached = cache.get(ref)
+            if cached is None:
+                return None
+            missing[ref] = cached
+            stack.extend(cached.dependencies.values())
+
+        for ref in reversed(missing):
+            self.get_cache_defs_ref_schema(ref[0])
+        for ref, cached in missing.items():
+            mapping = {
+                json_ref: self.core_to_json_refs[dependency] for json_ref, dependency in cached.dependencies.items()
+            }
+            self.definitions[self.core_to_defs_refs[ref]] = _remap_json_refs(cached.schema, mapping)
+        return {"$ref": self.core_to_json_refs[core_mode_ref]}
 
     def nullable_schema(self, schema: core_schema.NullableSchema) -> JsonSchemaValue:
         null_schema = {"type": "null"}
@@ -181,22 +374,65 @@ class CustomGenerateJsonSchema(GenerateJsonSchema):
 ModelInputTypeSignature = Union[List[Type[BaseModel]] | Type[BaseModel]]
 
 
+def _json_schema(
+    model: ModelInputTypeSignature,
+    schema_generator: Type[GenerateJsonSchema],
+    mode: JsonSchemaMode,
+    def_keyword: str,
+    models_title: Optional[str],
+) -> Dict[str, Any]:
+    ref_template = "#/" + def_keyword.replace("{", "{{").replace("}", "}}") + "/{model}"
+    with CustomGenerateJsonSchema.definitions_cache():
+        if not isinstance(model, list):
+            schema = model.model_json_schema(ref_template=ref_template, schema_generator=schema_generator, mode=mode)
+        else:
+            models = [(m, mode) for m in model]
+            _, schema = models_json_schema(
+                models, ref_template=ref_template, schema_generator=schema_generator, title=models_title
+            )
+    # Rename the definitions keyword in place so that the key order of the schema is preserved
+    return {(def_keyword if key == "$defs" else key): value for key, value in schema.items()}
+
+
 def export_schema(
     model: ModelInputTypeSignature,
     schema_generator: Type[GenerateJsonSchema] = CustomGenerateJsonSchema,
     mode: JsonSchemaMode = "serialization",
     def_keyword: str = "definitions",
     models_title: Optional[str] = None,
-):
-    """Export the schema of a model to a json file"""
-    if not isinstance(model, list):
-        _model = model.model_json_schema(schema_generator=schema_generator, mode=mode)
-    else:
-        models = [(m, mode) for m in model]
-        _, _model = models_json_schema(models, schema_generator=schema_generator, title=models_title)
-    json_model = json.dumps(_model, indent=2)
-    json_model = json_model.replace("$defs", def_keyword)
-    return json_model
+) -> str:
+    """Export the schema of a model to a json string"""
+    return json.dumps(_json_schema(model, schema_generator, mode, def_keyword, models_title), indent=2)
+
+
+def write_schema(
+    model: ModelInputTypeSignature,
+    path: PathLike,
+    schema_generator: Type[GenerateJsonSchema] = CustomGenerateJsonSchema,
+    mode: JsonSchemaMode = "serialization",
+    def_keyword: str = "definitions",
+    models_title: Optional[str] = None,
+    compact: bool = False,
+) -> None:
+    """Export the schema of a model and encode it directly to a json file.
+
+    With the default arguments, the file contents are identical to the output of `export_schema`.
+
+    Args:
+        model (ModelInputTypeSignature): Model, or list of models, to export.
+        path (PathLike): Path of the output file.
+        schema_generator (Type[GenerateJsonSchema], optional): Json-schema generator.
+        mode (JsonSchemaMode, optional): Json-schema mode. Defaults to "serialization".
+        def_keyword (str, optional): Keyword under which definitions are stored. Defaults to "definitions".
+        models_title (Optional[str], optional): Title of the schema when exporting a list of models.
+        compact (bool, optional): Write the schema without indentation or whitespace. Defaults to False.
+    """
+    schema = _json_schema(model, schema_generator, mode, def_keyword, models_title)
+    with open(path, "w", encoding="utf-8") as f:
+        if compact:
+            json.dump(schema, f, separators=(",", ":"))
+        else:
+            json.dump(schema, f, indent=2)
 
 
 class BonsaiSgenSerializers(Enum):
@@ -205,13 +441,48 @@ class BonsaiSgenSerializers(Enum):
     YAML = "YamlDotNet"
 
 
+class BonsaiSgenJob(NamedTuple):
+    """A single Bonsai.SGen invocation. See `bonsai_sgen` for a description of the arguments."""
+
+    schema_path: PathLike
+    output_path: PathLike
+    namespace: Optional[str] = "DataSchema"
+    root_element: Optional[str] = None
+    serializer: Optional[List[BonsaiSgenSerializers]] = None
+
+
+_BONSAI_SGEN_EXECUTABLE = "dotnet tool run bonsai.sgen"
+
+
+def _split_executable(executable: PathLike | str | Sequence[str]) -> List[str]:
+    if isinstance(executable, (list, tuple)):
+        return [os.fspath(arg) for arg in executable]
+    if isinstance(executable, PathLike):
+        return [os.fspath(executable)]
+    return [arg.strip('"') for arg in shlex.split(executable, posix=os.name != "nt")]
+
+
+def _build_bonsai_sgen_args(job: BonsaiSgenJob) -> List[str]:
+    serializer = [BonsaiSgenSerializers.JSON] if job.serializer is None else job.serializer
+    args = ["--schema", os.fspath(job.schema_path), "--output", os.fspath(job.output_path)]
+    if job.namespace is not None:
+        args += ["--namespace", job.namespace]
+    if job.root_element is not None:
+        args += ["--root", job.root_element]
+    if len(serializer) == 0 or BonsaiSgenSerializers.NONE in serializer:
+        args += ["--serializer", "none"]
+    else:
+        args += ["--serializer", *[sr.value for sr in serializer]]
+    return args
+
+
 def bonsai_sgen(
     schema_path: PathLike,
     output_path: PathLike,
     namespace: str = "DataSchema",
     root_element: Optional[str] = None,
     serializer: Optional[List[BonsaiSgenSerializers]] = None,
-    executable: PathLike | str = "dotnet tool run bonsai.sgen",
+    executable: PathLike | str | Sequence[str] = _BONSAI_SGEN_EXECUTABLE,
 ) -> CompletedProcess:
     """Runs Bonsai.SGen to generate a Bonsai-compatible schema from a json-schema model
     For more information run `bonsai.sgen --help` in the command line.
@@ -231,52 +502,457 @@ def bonsai_sgen(
         serializer (Optional[List[BonsaiSgenSerializers]], optional):
           Specifies the serializer data annotations to include in the generated classes.
           Defaults to None.
+        executable (PathLike | str | Sequence[str], optional): Command used to
+          launch Bonsai.SGen. Defaults to "dotnet tool run bonsai.sgen".
     """
+    job = BonsaiSgenJob(schema_path, output_path, namespace, root_element, serializer)
+    return run(_split_executable(executable) + _build_bonsai_sgen_args(job), check=True)
+
+
+_SCHEMA_CACHE_FORMAT_VERSION = 1
+_GENERATOR_OPTIONS = ("nullable_as_oneof", "unions_as_oneof", "render_x_enum_names")
+_CORE_REF_ID_PATTERN = re.compile(r":\d+$")
+_MEMORY_ADDRESS_PATTERN = re.compile(r" at 0x[0-9a-fA-F]+")
+
+
+def _update_fingerprint_str(hasher: "hashlib._Hash", value: str) -> None:
+    hasher.update(value.encode("utf-8"))
+    hasher.update(b"\x00")
+
+
+def _update_fingerprint(hasher: "hashlib._Hash", obj: Any, _seen: Set[int], _key: Optional[str] = None) -> None:
+    """Feeds a process-independent representation of a (core) schema object into a hash."""
+
+    if isinstance(obj, dict):
+        _update_fingerprint_str(hasher, "{")
+        for key, value in obj.items():
+            _update_fingerprint(hasher, key, _seen)
+            _update_fingerprint(hasher, value, _seen, _key=key if isinstance(key, str) else None)
+        _update_fingerprint_str(hasher, "}")
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        _update_fingerprint_str(hasher, "[")
+        for value in sorted(obj, key=repr) if isinstance(obj, (set, frozenset)) else obj:
+            _update_fingerprint(hasher, value, _seen)
+        _update_fingerprint_str(hasher, "]")
+    elif isinstance(obj, Enum):
+        _update_fingerprint_str(
+            hasher, f"enum:{type(obj).__module__}.{type(obj).__qualname__}.{obj.name}={obj.value!r}"
+        )
+    elif isinstance(obj, str):
+        # Core schema references embed the id() of the referenced type, which changes between processes
+        _update_fingerprint_str(hasher, _CORE_REF_ID_PATTERN.sub("", obj) if _key in ("ref", "schema_ref") else obj)
+    elif obj is None or isinstance(obj, (bool, int, float)):
+        _update_fingerprint_str(hasher, repr(obj))
+    elif isinstance(obj, BaseModel):
+        _update_fingerprint(hasher, type(obj), _seen)
+        _update_fingerprint_str(hasher, obj.model_dump_json())
+    else:
+        _update_object_fingerprint(hasher, obj, _seen)
+
+
+def _update_object_fingerprint(hasher: "hashlib._Hash", obj: Any, _seen: Set[int]) -> None:
+    """Fingerprints types, callables and other non-data objects referenced by a core schema."""
+
+    if isinstance(obj, type):
+        _update_fingerprint_str(hasher, f"type:{obj.__module__}.{obj.__qualname__}")
+        if id(obj) in _seen:
+            return
+        _seen.add(id(obj))
+        _update_fingerprint(hasher, obj.__doc__, _seen)
+        if issubclass(obj, Enum):
+            _update_fingerprint(hasher, [(m.name, m.value) for m in obj], _seen)
+        if issubclass(obj, BaseModel):
+            _update_fingerprint(hasher, dict(obj.model_config), _seen)
+    elif isinstance(obj, types.MethodType):
+        owner = obj.__self__
+        _update_fingerprint(hasher, owner if isinstance(owner, type) else type(owner), _seen)
+        # Methods bound to instances (e.g. pydantic annotations) also depend on the instance's parameters
+        if not isinstance(owner, type) and hasattr(owner, "__dict__") and id(owner) not in _seen:
+            _seen.add(id(owner))
+            _update_fingerprint(hasher, vars(owner), _seen)
+        _update_fingerprint(hasher, obj.__func__, _seen)
+    elif isinstance(obj, types.FunctionType):
+        _update_fingerprint_str(hasher, f"function:{obj.__module__}.{obj.__qualname__}")
+        _update_fingerprint(hasher, obj.__code__, _seen)
+    elif isinstance(obj, types.CodeType):
+        hasher.update(obj.co_code)
+        _update_fingerprint(hasher, obj.co_names, _seen)
+        _update_fingerprint(hasher, obj.co_consts, _seen)
+    else:
+        _update_fingerprint_str(hasher, f"{type(obj).__module__}.{type(obj).__qualname__}:")
+        _update_fingerprint_str(hasher, _MEMORY_ADDRESS_PATTERN.sub("", repr(obj)))
 
-    if serializer is None:
-        serializer = [BonsaiSgenSerializers.JSON]
 
-    cmd_string = f'{executable} --schema "{schema_path}" --output "{output_path}"'
-    cmd_string += "" if namespace is None else f" --namespace {namespace}"
-    cmd_string += "" if root_element is None else f" --root {root_element}"
+def _module_source_fingerprint(module_name: str) -> Optional[str]:
+    """Returns a hash of the source file of a module, or None if it has no source on disk."""
+    try:
+        path = inspect.getsourcefile(sys.modules[module_name])
+    except (KeyError, TypeError):
+        return None
+    if path is None or not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
-    if len(serializer) == 0 or BonsaiSgenSerializers.NONE in serializer:
-        cmd_string += " --serializer none"
+
+def schema_fingerprint(
+    model: ModelInputTypeSignature,
+    schema_generator: Type[GenerateJsonSchema] = CustomGenerateJsonSchema,
+    mode: JsonSchemaMode = "serialization",
+    def_keyword: str = "definitions",
+    models_title: Optional[str] = None,
+) -> str:
+    """Computes a fingerprint of everything that determines the output of `export_schema`.
+
+    The fingerprint covers the core schema of the model(s), the options of the schema
+    generator, the arguments of `export_schema`, the package version, and the source of
+    this module and of the modules defining the schema generator. It is stable across processes.
+
+    Args:
+        model (ModelInputTypeSignature): The model, or list of models, to fingerprint.
+        schema_generator (Type[GenerateJsonSchema], optional): The schema generator.
+          Defaults to CustomGenerateJsonSchema.
+        mode (JsonSchemaMode, optional): The schema mode. Defaults to "serialization".
+        def_keyword (str, optional): The definitions keyword. Defaults to "definitions".
+        models_title (Optional[str], optional): The title used for a list of models. Defaults to None.
+
+    Returns:
+        str: The hex digest of the fingerprint.
+    """
+    hasher = hashlib.sha256()
+    seen: Set[int] = set()
+    generator = schema_generator()
+    _update_fingerprint(
+        hasher,
+        {
+            "format": _SCHEMA_CACHE_FORMAT_VERSION,
+            "pydantic": pydantic.VERSION,
+            "package": pkg_version,
+            "source": _module_source_fingerprint(__name__),
+            "options": {option: getattr(generator, option, None) for option in _GENERATOR_OPTIONS},
+            "mode": mode,
+            "def_keyword": def_keyword,
+            "models_title": models_title,
+        },
+        seen,
+    )
+    for cls in schema_generator.__mro__:
+        if cls.__module__.startswith("pydantic") or cls is object:
+            continue
+        _update_fingerprint(hasher, cls, seen)
+        source = _module_source_fingerprint(cls.__module__)
+        if source is not None:
+            _update_fingerprint_str(hasher, source)
+        else:  # e.g. generators defined interactively
+            _update_fingerprint(hasher, {k: v for k, v in vars(cls).items() if callable(v)}, seen)
+    for m in model if isinstance(model, list) else [model]:
+        if not m.__pydantic_complete__:
+            m.model_rebuild()  # Models with `defer_build` only have a core schema once built
+        _update_fingerprint(hasher, m, seen)
+        _update_fingerprint(hasher, m.__pydantic_core_schema__, seen)
+    return hasher.hexdigest()
+
+
+def _find_dotnet_tools_manifest(directory: Optional[PathLike] = None) -> Optional[Path]:
+    """Finds the dotnet local tool manifest the same way `dotnet tool run` does, searching up from a directory."""
+    directory = Path(directory or os.getcwd()).resolve()
+    for parent in (directory, *directory.parents):
+        for candidate in (parent / ".config" / "dotnet-tools.json", parent / "dotnet-tools.json"):
+            if candidate.is_file():
+                return candidate
+    return None
+
+
+def _bonsai_sgen_fingerprint(
+    schema_path: PathLike,
+    namespace: Optional[str],
+    serializer: Optional[List[BonsaiSgenSerializers]],
+    executable: PathLike | str | Sequence[str] = _BONSAI_SGEN_EXECUTABLE,
+) -> str:
+    """Computes a fingerprint of a Bonsai.SGen job, including the command and the pinned tool versions."""
+    hasher = hashlib.sha256()
+    with open(schema_path, "rb") as f:
+        hasher.update(f.read())
+    manifest = _find_dotnet_tools_manifest()
+    _update_fingerprint(
+        hasher,
+        {
+            "namespace": namespace,
+            "serializer": serializer,
+            "executable": _split_executable(executable),
+            "tools": manifest.read_text(encoding="utf-8") if manifest is not None else None,
+        },
+        set(),
+    )
+    return hasher.hexdigest()
+
+
+class SchemaCache:
+    """A persistent, content-addressed store of generated schema artifacts.
+
+    Artifacts (json-schemas and Bonsai.SGen outputs) are stored under a key derived from
+    everything that determines their content. On a cache hit, the stored artifact is copied
+    to its target path, skipping both the schema export and the Bonsai.SGen call.
+    """
+
+    def __init__(self, root: PathLike = Path("./.cache/schemas")) -> None:
+        """Initializes the cache.
+
+        Args:
+            root (PathLike, optional): Directory where cached artifacts are stored.
+              Defaults to "./.cache/schemas".
+        """
+        self.root = Path(root)
+
+    def _object_path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def restore(self, key: str, target: PathLike) -> bool:
+        """Restores a cached artifact to `target`.
+
+        The target is only rewritten if its content differs from the cached artifact.
+
+        Args:
+            key (str): The artifact key.
+            target (PathLike): The path the artifact is restored to.
+
+        Returns:
+            bool: True if the artifact was found in the cache, False otherwise.
+        """
+        cached = self._object_path(key)
+        if not cached.is_file():
+            return False
+        target = Path(target)
+        if not (target.is_file() and filecmp.cmp(cached, target, shallow=False)):
+            shutil.copyfile(cached, target)
+        return True
+
+    def store(self, key: str, source: PathLike) -> None:
+        """Stores the artifact at `source` under `key`.
+
+        Args:
+            key (str): The artifact key.
+            source (PathLike): The path of the artifact to store.
+        """
+        cached = self._object_path(key)
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cached.parent, prefix=f".{key}.")
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp)
+            os.replace(tmp, cached)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def clear(self) -> None:
+        """Removes all cached artifacts."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _run_jobs(
+    jobs: Dict[str, Callable[[], T]], executor: Optional[Executor] = None, note: bool = True
+) -> Tuple[Dict[str, T], Dict[str, BaseException]]:
+    """Runs a set of named jobs, optionally in an executor, collecting results and failures in submission order.
+
+    Every job is run, whether or not others fail. If `note` is True, the name of the job is added as a note
+    to each failure.
+    """
+    results: Dict[str, T] = {}
+    errors: Dict[str, BaseException] = {}
+    futures = {name: executor.submit(job) for name, job in jobs.items()} if executor is not None else jobs
+    for name, job in futures.items():
+        try:
+            results[name] = job.result() if executor is not None else job()
+        except Exception as e:
+            if note:
+                e.add_note(f"Raised while converting '{name}'.")
+            errors[name] = e
+    return results, errors
+
+
+def _write_schemas(jobs: Dict[str, Callable[[], None]]) -> Tuple[Dict[str, None], Dict[str, BaseException]]:
+    """Runs a set of schema exports sharing one definitions cache, e.g. in a worker process."""
+    with CustomGenerateJsonSchema.definitions_cache():
+        return _run_jobs(jobs)
+
+
+def bonsai_sgen_batch(
+    jobs: Sequence[BonsaiSgenJob],
+    executable: PathLike | str | Sequence[str] = _BONSAI_SGEN_EXECUTABLE,
+    max_workers: int = 1,
+    check: bool = True,
+) -> List[CompletedProcess]:
+    """Runs Bonsai.SGen for a batch of schemas.
+
+    The executable is resolved once for the whole batch, and each job is launched directly,
+    without an intermediate shell, with up to `max_workers` jobs running concurrently.
+    The output of each job is captured so that concurrent jobs do not interleave.
+
+    Args:
+        jobs (Sequence[BonsaiSgenJob]): The jobs to run.
+        executable (PathLike | str | Sequence[str], optional): Command used to
+          launch Bonsai.SGen. Defaults to "dotnet tool run bonsai.sgen".
+        max_workers (int, optional): Maximum number of concurrent jobs. Defaults to 1.
+        check (bool, optional): If True, all failed jobs are raised together as an
+          `ExceptionGroup` of `CalledProcessError` once the batch completes. Defaults to True.
+
+    Returns:
+        List[CompletedProcess]: The result of each job, in the order of `jobs`.
+    """
+    command = _split_executable(executable)
+    resolved = shutil.which(command[0])
+    if resolved is not None:
+        command[0] = resolved
+
+    def _run_job(job: BonsaiSgenJob) -> CompletedProcess:
+        return run(command + _build_bonsai_sgen_args(job), capture_output=True, text=True, check=False)
+
+    named_jobs = {str(i): partial(_run_job, job) for i, job in enumerate(jobs)}
+    if max_workers > 1 and len(named_jobs) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results, errors = _run_jobs(named_jobs, executor, note=False)
     else:
-        cmd_string += " --serializer"
-        cmd_string += " ".join([f" {sr.value}" for sr in serializer])
-    return run(cmd_string, shell=True, check=True)
+        results, errors = _run_jobs(named_jobs, note=False)
+    if errors:
+        for name, e in errors.items():
+            e.add_note(f"Raised while launching Bonsai.SGen for '{jobs[int(name)].schema_path}'.")
+        raise ExceptionGroup(
+            f"Failed to launch Bonsai.SGen for {len(errors)} of {len(jobs)} job(s)", list(errors.values())
+        )
+    completed = [results[name] for name in named_jobs]
+
+    if check:
+        failures = [e for e in map(_bonsai_sgen_error, jobs, completed) if e is not None]
+        if failures:
+            raise ExceptionGroup(f"Bonsai.SGen failed for {len(failures)} of {len(completed)} job(s)", failures)
+    return completed
+
+
+def _bonsai_sgen_error(job: BonsaiSgenJob, proc: CompletedProcess) -> Optional[CalledProcessError]:
+    """Returns the error of a failed Bonsai.SGen job, or None if it succeeded."""
+    if proc.returncode == 0:
+        return None
+    e = CalledProcessError(proc.returncode, proc.args, proc.stdout, proc.stderr)
+    e.add_note(f"Raised while generating '{job.output_path}' from '{job.schema_path}'.")
+    return e
 
 
 def convert_pydantic_to_bonsai(
     models: Dict[str, ModelInputTypeSignature],
-    namespace: str = "DataSchema",
+    namespace: Union[str, Dict[str, str]] = "DataSchema",
     schema_path: PathLike = Path("./src/DataSchemas/"),
     output_path: PathLike = Path("./src/Extensions/"),
     serializer: Optional[List[BonsaiSgenSerializers]] = None,
     skip_sgen: bool = False,
     export_schema_kwargs: Optional[Dict[str, Any]] = None,
+    cache: Optional[SchemaCache] = None,
+    max_workers: int = 1,
+    executable: PathLike | str | Sequence[str] = _BONSAI_SGEN_EXECUTABLE,
 ) -> Dict[str, Optional[CompletedProcess]]:
-    def _write_json(
-        schema_path: PathLike, output_model_name: str, model: ModelInputTypeSignature, **extra_kwargs
-    ) -> None:
-        with open(os.path.join(schema_path, f"{output_model_name}.json"), "w", encoding="utf-8") as f:
-            json_model = export_schema(model, **extra_kwargs)
-            f.write(json_model)
-
-    ret_dict: Dict[str, Optional[CompletedProcess]] = {}
-    for output_model_name, model in models.items():
-        _write_json(schema_path, output_model_name, model, **(export_schema_kwargs or {}))
-        if not skip_sgen:
-            cmd_return = bonsai_sgen(
-                schema_path=Path(os.path.join(schema_path, f"{output_model_name}.json")),
-                output_path=Path(os.path.join(output_path, f"{snake_to_pascal_case(output_model_name)}.cs")),
-                namespace=namespace,
-                serializer=serializer,
+    """Exports json-schemas for a set of models and generates the corresponding Bonsai code.
+
+    If a `cache` is provided, models whose fingerprint is unchanged are restored from it,
+    and neither the schema export nor Bonsai.SGen are run for them. For these, as well as
+    when `skip_sgen` is set, the returned value is None. Definitions shared between models
+    are generated once per call (see `CustomGenerateJsonSchema.definitions_cache`).
+
+    Bonsai.SGen is run for all models as one `bonsai_sgen_batch`, so its output is captured
+    per model. If `max_workers` is larger than 1, schemas are exported in a process pool, where
+    each worker shares definitions across its share of the models, and the batch runs up to
+    `max_workers` Bonsai.SGen jobs concurrently. Every model whose schema
+    was exported is passed to Bonsai.SGen, and all failures are raised together as an
+    `ExceptionGroup`. Results are always returned in the order of `models`.
+
+    Args:
+        models (Dict[str, ModelInputTypeSignature]): Models to convert, keyed by output name.
+        namespace (Union[str, Dict[str, str]], optional): Namespace of the generated classes.
+          A dictionary keyed by output name sets a different namespace per model. Defaults to "DataSchema".
+        schema_path (PathLike, optional): Output directory of the json-schemas.
+        output_path (PathLike, optional): Output directory of the generated code.
+        serializer (Optional[List[BonsaiSgenSerializers]], optional): Serializers passed to Bonsai.SGen.
+        skip_sgen (bool, optional): Only export the json-schemas. Defaults to False.
+        export_schema_kwargs (Optional[Dict[str, Any]], optional): Extra arguments passed to `write_schema`.
+        cache (Optional[SchemaCache], optional): Cache of previously generated artifacts. Defaults to None.
+        max_workers (int, optional): Maximum number of concurrent jobs. Defaults to 1.
+        executable (PathLike | str | Sequence[str], optional): Command used to
+          launch Bonsai.SGen. Defaults to "dotnet tool run bonsai.sgen".
+    """
+
+    export_schema_kwargs = export_schema_kwargs or {}
+    namespaces = namespace if isinstance(namespace, dict) else {name: namespace for name in models}
+    json_paths = {name: Path(os.path.join(schema_path, f"{name}.json")) for name in models}
+    schema_keys = {
+        name: schema_fingerprint(model, **export_schema_kwargs) if cache is not None else None
+        for name, model in models.items()
+    }
+
+    pending = [
+        name for name in models if schema_keys[name] is None or not cache.restore(schema_keys[name], json_paths[name])
+    ]
+    export_jobs = {
+        name: partial(write_schema, models[name], json_paths[name], **export_schema_kwargs) for name in pending
+    }
+    if max_workers > 1 and len(export_jobs) > 1:
+        # Each worker exports a share of the models, so that models in a share reuse their shared definitions
+        workers = min(max_workers, len(export_jobs))
+        shares = [dict(list(export_jobs.items())[i::workers]) for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            share_results, share_errors = _run_jobs(
+                {str(i): partial(_write_schemas, share) for i, share in enumerate(shares)}, executor, note=False
             )
-            ret_dict[output_model_name] = cmd_return
-        else:
-            ret_dict[output_model_name] = None
+        exported, errors = {}, {}
+        for i, share in enumerate(shares):
+            if str(i) in share_errors:  # e.g. a worker that died
+                errors.update({name: share_errors[str(i)] for name in share})
+            else:
+                exported.update(share_results[str(i)][0])
+                errors.update(share_results[str(i)][1])
+        errors = {name: errors[name] for name in export_jobs if name in errors}
+    else:
+        exported, errors = _write_schemas(export_jobs)
+    for name in exported:
+        if cache is not None:
+            cache.store(schema_keys[name], json_paths[name])
+
+    ret_dict: Dict[str, Optional[CompletedProcess]] = {name: None for name in models}
+    if not skip_sgen:
+        cs_paths = {name: Path(os.path.join(output_path, f"{snake_to_pascal_case(name)}.cs")) for name in models}
+        sgen_keys: Dict[str, Optional[str]] = {}
+        for name in models:
+            if name in errors:
+                continue
+            sgen_key = (
+                _bonsai_sgen_fingerprint(json_paths[name], namespaces[name], serializer, executable)
+                if cache is not None
+                else None
+            )
+            if sgen_key is not None and cache.restore(sgen_key, cs_paths[name]):
+                logger.debug("Restored %s from cache.", cs_paths[name])
+                continue
+            sgen_keys[name] = sgen_key
+
+        sgen_jobs = [
+            BonsaiSgenJob(json_paths[name], cs_paths[name], namespaces[name], serializer=serializer)
+            for name in sgen_keys
+        ]
+        completed = bonsai_sgen_batch(sgen_jobs, executable=executable, max_workers=max_workers, check=False)
+        for name, job, proc in zip(sgen_keys, sgen_jobs, completed):
+            logger.debug("Bonsai.SGen output for '%s':\n%s%s", name, proc.stdout, proc.stderr)
+            error = _bonsai_sgen_error(job, proc)
+            if error is not None:
+                error.add_note(f"Raised while converting '{name}'.")
+                errors[name] = error
+                continue
+            ret_dict[name] = proc
+            if cache is not None:
+                cache.store(sgen_keys[name], cs_paths[name])
+
+    if errors:
+        raise ExceptionGroup(
+            f"Failed to convert {len(errors)} of {len(models)} model(s): {', '.join(errors)}",
+            [errors[name] for name in models if name in errors],
+        )
     return ret_dict
 
 
@@ -314,6 +990,7 @@ def pascal_to_snake_case(s: str) -> str:
     return result
 
 
+@lru_cache(maxsize=None)
 def screaming_snake_case_to_pascal_case(s: str) -> str:
     """
     Converts a SCREAMING_SNAKE_CASE string to PascalCase.
@@ -457,6 +1134,202 @@ ISearchable = Union[pydantic.BaseModel, Dict, List]
 _ISearchableTypeChecker = tuple(get_args(ISearchable))  # pre-compute for performance
 
 
+def _is_related(cls: Any, targets: Tuple[type, ...]) -> bool:
+    """Whether a value annotated as cls may be an instance of one of the targets."""
+    try:
+        return any(issubclass(cls, t) or issubclass(t, cls) for t in targets)
+    except TypeError:
+        return True
+
+
+def _may_contain(annotation: Any, targets: Tuple[type, ...], _aliases: Tuple[Any, ...] = ()) -> bool:
+    """Whether a value of an annotation may be, or hold in a searchable container, an instance of the targets.
+
+    The answer errs on the side of True for annotations that cannot be resolved. Fields annotated with a
+    model always may, since a subclass of the model may add fields of any type.
+    """
+    if annotation is Any or annotation is object or isinstance(annotation, (TypeVar, str, ForwardRef)):
+        return True
+    if annotation is None or annotation is type(None):
+        return _is_related(type(None), targets)
+    if hasattr(annotation, "__supertype__"):  # NewType
+        return _may_contain(annotation.__supertype__, targets, _aliases)
+    if hasattr(annotation, "__value__") and not isinstance(annotation, type):  # TypeAliasType
+        if annotation in _aliases:
+            return False  # Recursive aliases are decided by their other branches
+        return _may_contain(annotation.__value__, targets, _aliases + (annotation,))
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin is Annotated:
+        return _may_contain(args[0], targets, _aliases)
+    if origin is Union or origin is types.UnionType:
+        return any(_may_contain(arg, targets, _aliases) for arg in args)
+    if origin is Literal:
+        return any(isinstance(arg, targets) for arg in args)
+    if origin is None:
+        return _class_may_contain(annotation, (), targets, _aliases)
+    return _class_may_contain(origin, args, targets, _aliases)
+
+
+def _class_may_contain(cls: Any, args: Tuple[Any, ...], targets: Tuple[type, ...], _aliases: Tuple[Any, ...]) -> bool:
+    if not isinstance(cls, type) or _is_related(cls, targets) or issubclass(cls, pydantic.BaseModel):
+        return True
+    if not args:
+        # Unparametrized containers may hold anything
+        return issubclass(cls, (list, dict)) or (issubclass(cls, abc.Iterable) and inspect.isabstract(cls))
+    if issubclass(cls, (tuple, set, frozenset, type)):
+        return False  # Only lists, dictionaries and models are searched
+    if issubclass(cls, abc.Mapping):
+        args = args[1:]
+    return any(_may_contain(arg, targets, _aliases) for arg in args)
+
+
+@lru_cache(maxsize=None)
+def _search_plan(model: Type[pydantic.BaseModel], target_type: Any) -> Tuple[str, ...]:
+    """Names of the fields of a model that may hold an instance of the target type, by annotation."""
+    if isinstance(target_type, type):
+        targets = (target_type,)
+    elif isinstance(target_type, types.UnionType):
+        targets = get_args(target_type)
+    else:
+        targets = target_type
+    if not (isinstance(targets, tuple) and all(isinstance(t, type) for t in targets)):
+        return tuple(model.model_fields)
+    return tuple(
+        name
+        for name, info in model.model_fields.items()
+        if _may_contain(info.annotation, targets) or _default_may_contain(info, targets)
+    )
+
+
+def _default_may_contain(info: FieldInfo, targets: Tuple[type, ...]) -> bool:
+    """Whether the default of a field, which is not validated against its annotation, may hold the targets."""
+    if info.validate_default:
+        return False
+    if info.default_factory is not None:
+        return True
+    default = info.default
+    if isinstance(default, (dict, list)):
+        return len(default) > 0
+    return isinstance(default, targets) or isinstance(default, pydantic.BaseModel)
+
+
+def _children(searchable: ISearchable, target_type: Any) -> Iterator[Tuple[Optional[str], Any, Any]]:
+    """Iterates the (name, json pointer token, value) of the children of a searchable value."""
+    if isinstance(searchable, dict):
+        return ((key, key, value) for key, value in searchable.items())
+    if isinstance(searchable, list):
+        return ((None, index, value) for index, value in enumerate(searchable))
+    if isinstance(searchable, pydantic.BaseModel):
+        return ((name, name, getattr(searchable, name)) for name in _search_plan(type(searchable), target_type))
+    raise ValueError(f"Unsupported model type: {type(searchable)}")
+
+
+def _join_pointer(path: str, token: Any) -> str:
+    return f"{path}/{str(token).replace('~', '~0').replace('/', '~1')}"
+
+
+def _walk_fields_of_type(
+    searchable: ISearchable,
+    target_type: Type[T],
+    recursive: bool,
+    stop_recursion_on_type: bool,
+    predicate: Optional[Callable[[T], bool]],
+) -> Iterator[Tuple[str, Any, Optional[str], T]]:
+    """Depth-first search yielding the (parent path, token, name, value) of each match."""
+    # Unsupported values raise here, rather than when the search starts
+    root = _children(searchable, target_type)
+    return _walk(searchable, root, target_type, recursive, stop_recursion_on_type, predicate)
+
+
+def _walk(
+    searchable: ISearchable,
+    root: Iterator[Tuple[Optional[str], Any, Any]],
+    target_type: Type[T],
+    recursive: bool,
+    stop_recursion_on_type: bool,
+    predicate: Optional[Callable[[T], bool]],
+) -> Iterator[Tuple[str, Any, Optional[str], T]]:
+    # Frames of (id, path, children) of the containers being searched, whose ids are tracked to detect cycles
+    stack = [(id(searchable), "", root)]
+    ancestors = {id(searchable)}
+    while stack:
+        node_id, path, children = stack[-1]
+        for name, token, value in children:
+            is_match = isinstance(value, target_type) and (predicate is None or predicate(value))
+            if is_match:
+                yield path, token, name, value
+            if recursive and isinstance(value, _ISearchableTypeChecker) and not (stop_recursion_on_type and is_match):
+                if id(value) in ancestors:
+                    logger.debug("Skipping a reference cycle at %s.", _join_pointer(path, token))
+                    continue
+                ancestors.add(id(value))
+                stack.append((id(value), _join_pointer(path, token), _children(value, target_type)))
+                break
+        else:
+            stack.pop()
+            ancestors.discard(node_id)
+
+
+def iter_fields_of_type(
+    searchable: ISearchable,
+    target_type: Type[T],
+    *,
+    recursive: bool = True,
+    stop_recursion_on_type: bool = True,
+    predicate: Optional[Callable[[T], bool]] = None,
+) -> Iterator[Tuple[str, T]]:
+    """Lazily finds the values of a model, dictionary or list that are instances of a type.
+
+    Values are yielded in depth-first order with their JSON pointer (RFC 6901) relative to the
+    searched value, e.g. `/task_parameters/patches/0/reward_amount`, so that list items are
+    unambiguous. The search only advances as values are consumed, and stops when the iterator is
+    discarded. Containers that hold one of their ancestors are not searched again, so reference
+    cycles are skipped, while values referenced more than once are still yielded each time.
+
+    Examples:
+        ```python
+        for path, device in iter_fields_of_type(rig, HarpDevice, predicate=lambda d: d.port_name == "COM3"):
+            print(path, device)
+        ```
+
+    Args:
+        searchable (ISearchable): The model, dictionary or list to search.
+        target_type (Type[T]): The type to search for.
+        recursive (bool, optional): Whether to search nested lists, dictionaries and models. Defaults to True.
+        stop_recursion_on_type (bool, optional): Whether to skip the contents of the values that are found.
+          Defaults to True.
+        predicate (Optional[Callable[[T], bool]], optional): Further condition on instances of the target
+          type. Defaults to None, which matches every instance.
+
+    Returns:
+        Iterator[Tuple[str, T]]: The JSON pointer and value of each match.
+    """
+    walk = _walk_fields_of_type(searchable, target_type, recursive, stop_recursion_on_type, predicate)
+    return ((_join_pointer(path, token), value) for path, token, _, value in walk)
+
+
+def first_of_type(
+    searchable: ISearchable,
+    target_type: Type[T],
+    *,
+    recursive: bool = True,
+    predicate: Optional[Callable[[T], bool]] = None,
+) -> Optional[Tuple[str, T]]:
+    """Returns the JSON pointer and value of the first match of `iter_fields_of_type`, or None."""
+    return next(iter_fields_of_type(searchable, target_type, recursive=recursive, predicate=predicate), None)
+
+
+def any_of_type(
+    searchable: ISearchable,
+    target_type: Type[T],
+    *,
+    recursive: bool = True,
+    predicate: Optional[Callable[[T], bool]] = None,
+) -> bool:
+    """Whether `iter_fields_of_type` has any match, stopping at the first one."""
+    return first_of_type(searchable, target_type, recursive=recursive, predicate=predicate) is not None
+
+
 def get_fields_of_type(
     searchable: ISearchable,
     target_type: Type[T],
@@ -465,31 +1338,25 @@ def get_fields_of_type(
     stop_recursion_on_type: bool = True,
     **kwargs,
 ) -> List[Tuple[Optional[str], T]]:
-    _iterable: Iterable
-    _is_type: bool
-    result: List[Tuple[Optional[str], T]] = []
+    """Finds the values of a model, dictionary or list that are instances of a type.
 
-    if isinstance(searchable, dict):
-        _iterable = searchable.items()
-    elif isinstance(searchable, list):
-        _iterable = list(zip([None for _ in range(len(searchable))], searchable))
-    elif isinstance(searchable, pydantic.BaseModel):
-        _iterable = {k: getattr(searchable, k) for k in searchable.model_fields.keys()}.items()
-    else:
-        raise ValueError(f"Unsupported model type: {type(searchable)}")
-
-    for name, field in _iterable:
-        _is_type = False
-        if isinstance(field, target_type):
-            result.append((name, field))
-            _is_type = True
-        if recursive and isinstance(field, _ISearchableTypeChecker) and not (stop_recursion_on_type and _is_type):
-            result.extend(
-                get_fields_of_type(
-                    field,
-                    target_type,
-                    recursive=recursive,
-                    stop_recursion_on_type=stop_recursion_on_type,
-                )
-            )
-    return result
+    Fields of models are only visited if their annotation admits an instance of the target type, either
+    directly or nested in a list, dictionary or model. The fields to visit are computed once per model
+    class and target type, so large models, such as rigs with many devices, are searched without
+    descending into fields that cannot hold the target.
+
+    This is the eager form of `iter_fields_of_type`, which also gives the full path of each value.
+
+    Args:
+        searchable (ISearchable): The model, dictionary or list to search.
+        target_type (Type[T]): The type to search for.
+        recursive (bool, optional): Whether to search nested lists, dictionaries and models. Defaults to True.
+        stop_recursion_on_type (bool, optional): Whether to skip the contents of the values that are found.
+          Defaults to True.
+
+    Returns:
+        List[Tuple[Optional[str], T]]: The field name, or dictionary key, and value of each instance, in
+          depth-first order. List items have no name.
+    """
+    walk = _walk_fields_of_type(searchable, target_type, recursive, stop_recursion_on_type, None)
+    return [(name, value) for _, _, name, value in walk]
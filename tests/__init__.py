@@ -1,15 +1,26 @@
 import glob
 import importlib.util
 import logging
+import os
+import unittest
 from pathlib import Path
 from types import ModuleType
 
+import numpy as np
+
 EXAMPLES_DIR = Path(__file__).parents[1] / "examples"
 
+RUN_BENCHMARKS = os.environ.get("AIND_BEHAVIOR_SERVICES_BENCHMARKS", "") not in ("", "0")
+
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
 
+def benchmark(test):
+    """Marks a wall-clock test, which only runs if the AIND_BEHAVIOR_SERVICES_BENCHMARKS environment variable is set."""
+    return unittest.skipUnless(RUN_BENCHMARKS, "Set AIND_BEHAVIOR_SERVICES_BENCHMARKS=1 to run benchmarks")(test)
+
+
 def build_example(script_path: str) -> ModuleType:
     module_name = Path(script_path).stem
     spec = importlib.util.spec_from_file_location(module_name, script_path)
@@ -25,3 +36,35 @@ def build_example(script_path: str) -> ModuleType:
 def build_examples(examples_dir: Path = EXAMPLES_DIR):
     for script_path in glob.glob(str(examples_dir / "*.py")):
         _ = build_example(script_path)
+
+
+_HARP_PAYLOAD_TYPES = {np.dtype("<u2"): 2, np.dtype("<i2"): 130, np.dtype("<i4"): 132}
+
+
+def write_harp_register(path: Path, time: np.ndarray, payload: np.ndarray, address: int = 32) -> None:
+    """Writes timestamped single-register harp event messages."""
+    payload = np.asarray(payload)
+    payload = payload.reshape(len(time), -1).astype(payload.dtype.newbyteorder("<"))
+    message = np.dtype(
+        [
+            ("type", "u1"),
+            ("length", "u1"),
+            ("address", "u1"),
+            ("port", "u1"),
+            ("payload_type", "u1"),
+            ("seconds", "<u4"),
+            ("ticks", "<u2"),
+            ("payload", payload.dtype, payload.shape[1]),
+            ("checksum", "u1"),
+        ]
+    )
+    messages = np.zeros(len(time), dtype=message)
+    messages["type"] = 3
+    messages["length"] = message.itemsize - 2
+    messages["address"] = address
+    messages["port"] = 255
+    messages["payload_type"] = _HARP_PAYLOAD_TYPES[payload.dtype] | 0x10
+    messages["seconds"] = np.floor(time)
+    messages["ticks"] = np.round((time - np.floor(time)) / 32e-6)
+    messages["payload"] = payload
+    messages.tofile(path)
@@ -0,0 +1,44 @@
+"""A stand-in for the Bonsai.SGen command line tool, used to test the driver without dotnet.
+
+It accepts the same arguments as `bonsai.sgen`, and writes a placeholder C# file
+with one class per definition found in the json-schema.
+"""
+
+import argparse
+import json
+import sys
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="bonsai.sgen")
+    parser.add_argument("--schema", required=True)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--namespace", default="DataSchema")
+    parser.add_argument("--root", default=None)
+    parser.add_argument("--serializer", nargs="+", default=["NewtonsoftJson"])
+    args = parser.parse_args()
+
+    if not all(part.isidentifier() for part in args.namespace.split(".")):
+        print(f"Error: '{args.namespace}' is not a valid namespace.", file=sys.stderr)
+        return 1
+
+    try:
+        with open(args.schema, "r", encoding="utf-8") as f:
+            schema = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    classes = [args.root or schema.get("title", "Root")] + list(schema.get("definitions", {}).keys())
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(f"// serializers: {' '.join(args.serializer)}\n")
+        f.write(f"namespace {args.namespace}\n{{\n")
+        for name in classes:
+            f.write(f"    public partial class {name} {{ }}\n")
+        f.write("}\n")
+    print(f"Generated {len(classes)} classes in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
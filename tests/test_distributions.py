@@ -0,0 +1,71 @@
+import json
+import time
+import unittest
+
+from pydantic import TypeAdapter, ValidationError
+
+from aind_behavior_services.task_logic import distributions as d
+
+from . import benchmark
+
+ENTRIES = [
+    {"family": "Normal", "distribution_parameters": {"family": "Normal", "mean": 1, "std": 2}},
+    {
+        "family": "Exponential",
+        "distribution_parameters": {"family": "Exponential", "rate": 0.5},
+        "truncation_parameters": {"is_truncated": True, "min": 1, "max": 10},
+    },
+    {"family": "Scalar", "distribution_parameters": {"family": "Scalar", "value": 3}},
+    {"family": "Pdf", "distribution_parameters": {"family": "Pdf", "pdf": [1, 2, 1], "index": [0, 1, 2]}},
+    {
+        "family": "Uniform",
+        "distribution_parameters": {"family": "Uniform", "min": 0, "max": 1},
+        "scaling_parameters": {"scale": 2, "offset": 1},
+    },
+    {"family": "Poisson"},
+]
+
+
+class DistributionValidationTests(unittest.TestCase):
+    """Tests the bulk validation of distributions."""
+
+    def test_matches_individual_validation(self):
+        adapter = TypeAdapter(d.Distribution)
+        expected = [adapter.validate_python(entry) for entry in ENTRIES]
+        self.assertEqual(d.validate_distributions(ENTRIES), expected)
+        self.assertEqual(d.validate_distributions(json.dumps(ENTRIES)), expected)
+        self.assertEqual(d.validate_distributions(json.dumps(ENTRIES).encode()), expected)
+        self.assertEqual(d.validate_distributions(expected), expected)
+        self.assertIsInstance(d.validate_distributions(ENTRIES)[3], d.PdfDistribution)
+
+    def test_errors(self):
+        invalid = ENTRIES + [{"family": "Gamma", "distribution_parameters": {"family": "Normal"}}]
+        with self.assertRaises(ValidationError) as context:
+            d.validate_distributions(invalid)
+        self.assertEqual(context.exception.errors()[0]["loc"][0], len(ENTRIES))
+        with self.assertRaises(ValidationError):
+            d.validate_distributions(
+                [{"family": "Uniform", "truncation_parameters": {"is_truncated": True, "min": 2, "max": 3}}]
+            )
+
+    @benchmark
+    def test_validation_time(self):
+        entries = ENTRIES * 2000
+        payload = json.dumps(entries)
+        adapter = TypeAdapter(d.Distribution)
+        timings = {}
+        for name, validate in (
+            ("per_entry", lambda: [adapter.validate_python(entry) for entry in entries]),
+            ("bulk", lambda: d.validate_distributions(entries)),
+            ("bulk_json", lambda: d.validate_distributions(payload)),
+        ):
+            start = time.perf_counter()
+            validate()
+            timings[name] = time.perf_counter() - start
+        self.assertLess(timings["bulk"], timings["per_entry"])
+        self.assertLess(timings["bulk"], 0.5)
+        self.assertLess(timings["bulk_json"], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
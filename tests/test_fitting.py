@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+
+from aind_behavior_services.calibration.fitting import fit_linear
+
+
+class FitLinearTests(unittest.TestCase):
+    """Tests the closed-form least-squares fitting."""
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.x = rng.uniform(0, 1, size=(4, 12))
+        self.y = 3.0 * self.x - 0.5 + rng.normal(0, 0.1, size=self.x.shape)
+        self.w = rng.uniform(0.5, 2.0, size=self.x.shape)
+
+    def test_exact_line(self):
+        fit = fit_linear([0.1, 0.2, 0.3, 0.4], [0.7, 1.7, 2.7, 3.7])
+        self.assertAlmostEqual(fit.slope, 10.0)
+        self.assertAlmostEqual(fit.intercept, -0.3)
+        self.assertAlmostEqual(fit.r2, 1.0)
+        self.assertAlmostEqual(fit.slope_stderr, 0.0)
+        np.testing.assert_allclose(fit.residuals, 0.0, atol=1e-12)
+        self.assertIsInstance(fit.slope, float)
+
+    def test_matches_polyfit(self):
+        for x, y, w in zip(self.x, self.y, self.w):
+            for weights in (None, w):
+                fit = fit_linear(x, y, sample_weight=weights)
+                # np.polyfit weights multiply the residuals, i.e. are the square root of the sample weights
+                coefficients, cov = np.polyfit(x, y, 1, w=None if weights is None else np.sqrt(weights), cov=True)
+                np.testing.assert_allclose([fit.slope, fit.intercept], coefficients)
+                np.testing.assert_allclose([fit.slope_stderr, fit.intercept_stderr], np.sqrt(np.diag(cov)))
+                np.testing.assert_allclose(fit.residuals, y - np.polyval(coefficients, x), atol=1e-12)
+
+                sample_weight = np.ones_like(x) if weights is None else weights
+                y_mean = np.average(y, weights=sample_weight)
+                r2 = 1 - np.sum(sample_weight * fit.residuals**2) / np.sum(sample_weight * (y - y_mean) ** 2)
+                self.assertAlmostEqual(fit.r2, r2)
+
+    def test_batched(self):
+        batched = fit_linear(self.x, self.y, sample_weight=self.w)
+        self.assertEqual(batched.slope.shape, (4,))
+        self.assertEqual(batched.residuals.shape, self.x.shape)
+        for i in range(self.x.shape[0]):
+            fit = fit_linear(self.x[i], self.y[i], sample_weight=self.w[i])
+            for field in fit._fields:
+                np.testing.assert_allclose(getattr(batched, field)[i], getattr(fit, field))
+        np.testing.assert_allclose(batched.predict(self.x), self.y - batched.residuals)
+
+    def test_batched_with_mask(self):
+        lengths = [12, 7, 3, 5]
+        mask = np.arange(self.x.shape[1]) < np.array(lengths)[:, None]
+        y = np.where(mask, self.y, np.nan)
+        batched = fit_linear(self.x, y, mask=mask)
+        for i, n in enumerate(lengths):
+            fit = fit_linear(self.x[i, :n], self.y[i, :n])
+            self.assertAlmostEqual(batched.slope[i], fit.slope)
+            self.assertAlmostEqual(batched.intercept[i], fit.intercept)
+            self.assertAlmostEqual(batched.r2[i], fit.r2)
+            self.assertTrue(np.all(np.isnan(batched.residuals[i, n:])))
+
+    def test_degenerate(self):
+        fit = fit_linear([0.2, 0.2, 0.2], [1.0, 2.0, 3.0])
+        self.assertEqual(fit.slope, 0.0)
+        self.assertAlmostEqual(fit.intercept, 2.0)
+        self.assertEqual(fit.r2, 0.0)
+        self.assertTrue(np.isnan(fit.slope_stderr))
+
+        fit = fit_linear([0.1, 0.2], [1.0, 1.0])
+        self.assertEqual(fit.r2, 1.0)
+        self.assertTrue(np.isnan(fit.intercept_stderr))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            fit_linear([], [])
+        with self.assertRaises(ValueError):
+            fit_linear([1.0, 2.0], [1.0, 2.0], sample_weight=[1.0, -1.0])
+        with self.assertRaises(ValueError):
+            fit_linear(self.x, self.y, mask=np.arange(self.x.shape[0])[:, None] > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
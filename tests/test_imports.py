@@ -0,0 +1,101 @@
+"""testing import-time side effects and budgets"""
+
+import json
+import subprocess
+import sys
+import unittest
+
+from . import benchmark
+
+# Maximum import time, in seconds, of each subpackage in a fresh interpreter.
+# Heavy dependencies creeping back into the import path are caught by FORBIDDEN_IMPORTS;
+# these budgets depend on the machine, so they are only checked when running benchmarks.
+IMPORT_BUDGETS = {
+    "aind_behavior_services": 0.5,
+    "aind_behavior_services.base": 1.5,
+    "aind_behavior_services.session": 1.5,
+    "aind_behavior_services.rig": 2.0,
+    "aind_behavior_services.task_logic": 2.5,
+    "aind_behavior_services.calibration.water_valve": 2.0,
+    "aind_behavior_services.calibration.load_cells": 2.5,
+    "aind_behavior_services.task_logic.sampling": 2.5,
+}
+
+# Modules that must not be imported as a side effect of importing each subpackage.
+FORBIDDEN_IMPORTS = {
+    "aind_behavior_services": ["pydantic", "git", "sklearn"],
+    "aind_behavior_services.base": ["git", "sklearn", "aind_behavior_curriculum"],
+    "aind_behavior_services.session": [
+        "git",
+        "sklearn",
+        "aind_behavior_curriculum",
+        "aind_behavior_services.rig",
+        "aind_behavior_services.task_logic",
+    ],
+    "aind_behavior_services.rig": ["git", "sklearn", "aind_behavior_curriculum", "aind_behavior_services.task_logic"],
+    "aind_behavior_services.task_logic": ["git", "sklearn", "aind_behavior_services.rig"],
+    "aind_behavior_services.calibration.water_valve": ["git", "sklearn", "aind_behavior_curriculum"],
+    "aind_behavior_services.calibration.load_cells": ["git", "sklearn", "aind_behavior_curriculum"],
+    "aind_behavior_services.task_logic.sampling": ["git", "sklearn", "scipy"],
+}
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure_import(module: str, repeat: int = 3) -> dict:
+    """Imports a module in fresh interpreters and returns the fastest run."""
+    runs = []
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, "-c", _IMPORT_SCRIPT.format(module=module)], capture_output=True, text=True, check=True
+        )
+        runs.append(json.loads(process.stdout))
+    return min(runs, key=lambda run: run["elapsed"])
+
+
+class ImportTimeTests(unittest.TestCase):
+    """tests for import-time side effects and budgets"""
+
+    def test_forbidden_imports(self):
+        for module, forbidden_modules in FORBIDDEN_IMPORTS.items():
+            with self.subTest(module=module):
+                modules = measure_import(module, repeat=1)["modules"]
+                for forbidden in forbidden_modules:
+                    self.assertNotIn(forbidden, modules, f"{module} imports {forbidden}")
+
+    @benchmark
+    def test_import_budgets(self):
+        for module, budget in IMPORT_BUDGETS.items():
+            with self.subTest(module=module):
+                result = measure_import(module)
+                self.assertLess(result["elapsed"], budget, f"{module} took {result['elapsed']:.3f}s to import")
+
+    def test_lazy_attributes(self):
+        import aind_behavior_services
+        from aind_behavior_services.rig import AindBehaviorRigModel
+        from aind_behavior_services.session import AindBehaviorSessionModel
+        from aind_behavior_services.task_logic import AindBehaviorTaskLogicModel
+
+        self.assertIs(aind_behavior_services.AindBehaviorRigModel, AindBehaviorRigModel)
+        self.assertIs(aind_behavior_services.AindBehaviorSessionModel, AindBehaviorSessionModel)
+        self.assertIs(aind_behavior_services.AindBehaviorTaskLogicModel, AindBehaviorTaskLogicModel)
+        self.assertIn("AindBehaviorRigModel", dir(aind_behavior_services))
+        with self.assertRaises(AttributeError):
+            _ = aind_behavior_services.NotAnAttribute
+
+    def test_semver_regex(self):
+        from aind_behavior_curriculum.task import SEMVER_REGEX
+
+        from aind_behavior_services.base import SEMVER_REGEX as LOCAL_SEMVER_REGEX
+
+        self.assertEqual(LOCAL_SEMVER_REGEX, SEMVER_REGEX)
+
+
+if __name__ == "__main__":
+    unittest.main()
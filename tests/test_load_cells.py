@@ -0,0 +1,228 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from aind_behavior_services.calibration.load_cells import (
+    LoadCellCalibrationInput,
+    LoadCellCalibrationOutput,
+    LoadCellsCalibrationInput,
+    LoadCellsCalibrationOutput,
+    LoadCellWeightConverter,
+    MeasuredOffset,
+    MeasuredWeight,
+    OffsetSearch,
+    iter_loadcell_weights,
+    search_optimum_offset,
+)
+
+from . import write_harp_register
+
+
+def mock_channel(
+    channel: int, slope: float, baseline: float, n_weights: int, offsets: range
+) -> LoadCellCalibrationInput:
+    rng = np.random.default_rng(channel)
+    weights = np.linspace(0, 50, n_weights)
+    return LoadCellCalibrationInput(
+        channel=channel,
+        offset_measurement=[MeasuredOffset(offset=o, baseline=(o - 3 * channel) ** 2 + 10) for o in offsets],
+        weight_measurement=[
+            MeasuredWeight(weight=w, baseline=baseline + slope * w + rng.normal(0, 0.5)) for w in weights
+        ],
+    )
+
+
+class LoadCellsTests(unittest.TestCase):
+    """Tests the load cells calibration."""
+
+    def setUp(self):
+        self.input = LoadCellsCalibrationInput(
+            channels=[
+                mock_channel(channel, slope=2.0 + channel, baseline=100.0 * channel, n_weights=3 + channel, offsets=r)
+                for channel, r in zip(range(8), [range(-10, 10), range(0, 5), range(-3, 30, 3)] * 3)
+            ]
+        )
+
+    def assertChannelAlmostEqual(self, first, second):
+        self.assertEqual(first.channel, second.channel)
+        self.assertEqual(first.offset, second.offset)
+        self.assertAlmostEqual(first.baseline, second.baseline)
+        self.assertAlmostEqual(first.slope, second.slope)
+        self.assertEqual(first.weight_lookup, second.weight_lookup)
+
+    def test_calibrate_output(self):
+        output = self.input.calibrate_output()
+        self.assertEqual([c.channel for c in output.channels], [c.channel for c in self.input.channels])
+        for value, result in zip(self.input.channels, output.channels):
+            x = [m.weight for m in value.weight_measurement]
+            y = [m.baseline for m in value.weight_measurement]
+            slope, intercept = np.polyfit(x, y, 1)
+            self.assertAlmostEqual(result.slope, slope)
+            self.assertAlmostEqual(result.baseline, intercept)
+            self.assertEqual(result.offset, LoadCellsCalibrationInput.get_optimum_offset(value.offset_measurement))
+            self.assertEqual(result.weight_lookup, value.weight_measurement)
+            self.assertChannelAlmostEqual(result, LoadCellsCalibrationInput.calibrate_loadcell_output(value))
+
+    def test_calibrate_outputs(self):
+        inputs = [
+            self.input,
+            LoadCellsCalibrationInput(channels=self.input.channels[3:5]),
+            LoadCellsCalibrationInput(),
+            LoadCellsCalibrationInput(channels=self.input.channels[:1]),
+        ]
+        outputs = LoadCellsCalibrationInput.calibrate_outputs(inputs)
+        self.assertEqual(len(outputs), len(inputs))
+        for value, output in zip(inputs, outputs):
+            expected = value.calibrate_output()
+            self.assertEqual(len(output.channels), len(expected.channels))
+            for result, expected_channel in zip(output.channels, expected.channels):
+                self.assertChannelAlmostEqual(result, expected_channel)
+
+    def test_missing_measurements(self):
+        value = mock_channel(2, slope=1.0, baseline=0.0, n_weights=4, offsets=range(0))
+        with self.assertLogs("aind_behavior_services.calibration.load_cells", level="WARNING"):
+            output = LoadCellsCalibrationInput(channels=[value]).calibrate_output()
+        self.assertEqual(output.channels[0].offset, 0)
+
+        with self.assertRaises(ValueError):
+            LoadCellsCalibrationInput(channels=[LoadCellCalibrationInput(channel=0)]).calibrate_output()
+
+
+class LoadCellWeightConverterTests(unittest.TestCase):
+    """Tests the conversion of load cell data to weights."""
+
+    def setUp(self):
+        self.calibration = LoadCellsCalibrationOutput(
+            channels=[
+                LoadCellCalibrationOutput(channel=5, baseline=100.0, slope=-4.0),
+                LoadCellCalibrationOutput(
+                    channel=1,
+                    baseline=-50.0,
+                    slope=2.0,
+                    weight_lookup=[
+                        MeasuredWeight(weight=10.0, baseline=-20.0),
+                        MeasuredWeight(weight=0.0, baseline=-50.0),
+                        MeasuredWeight(weight=20.0, baseline=0.0),
+                    ],
+                ),
+            ]
+        )
+        self.converter = LoadCellWeightConverter(self.calibration)
+
+    def test_convert(self):
+        adc = np.array([[100, -50], [60, -35], [0, -10], [-100, 10], [20, -60]])
+        weight = self.converter.convert(adc)
+        np.testing.assert_allclose(weight[:, 0], (adc[:, 0] - 100.0) / -4.0)
+        # Interpolated between (-50, 0), (-20, 10) and (0, 20), linear model outside of that range
+        np.testing.assert_allclose(weight[:, 1], [0.0, 5.0, 15.0, 30.0, -5.0])
+
+        raw = np.zeros((5, 8), dtype=np.int16)
+        raw[:, 5], raw[:, 1] = adc[:, 0], adc[:, 1]
+        chunks = list(self.converter.iter_convert([raw[:2], raw[2:]]))
+        np.testing.assert_allclose(np.concatenate(chunks), weight)
+
+    def test_invalid_calibration(self):
+        with self.assertRaises(ValueError):
+            LoadCellWeightConverter(
+                LoadCellsCalibrationOutput(channels=[LoadCellCalibrationOutput(channel=0, slope=0.0)])
+            )
+        lookup = [MeasuredWeight(weight=w, baseline=b) for w, b in [(0, 0), (10, 5), (5, 10)]]
+        with self.assertRaises(ValueError):
+            LoadCellWeightConverter(
+                LoadCellsCalibrationOutput(channels=[LoadCellCalibrationOutput(channel=0, weight_lookup=lookup)])
+            )
+
+    def test_harp_file(self):
+        rng = np.random.default_rng(0)
+        raw = rng.integers(-500, 500, size=(3000, 8)).astype(np.int16)
+        time = 10 + np.arange(3000) * 0.001
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "LoadCells_33.bin"
+            write_harp_register(path, time, raw, address=33)
+            chunks = list(iter_loadcell_weights(path, self.calibration, chunk_size=1000))
+        self.assertEqual(len(chunks), 3)
+        np.testing.assert_allclose(np.concatenate([t for t, _ in chunks]), time, atol=32e-6)
+        np.testing.assert_allclose(
+            np.concatenate([w for _, w in chunks]), self.converter.convert(raw[:, [5, 1]].astype(float))
+        )
+
+
+class SimulatedLoadCell:
+    """A load cell whose baseline changes linearly with the bridge offset, and saturates at the ADC range."""
+
+    def __init__(self, balance_offset: float, gain: float = 40.0, adc_range: float = 2**15):
+        self.balance_offset = balance_offset
+        self.gain = gain
+        self.adc_range = adc_range
+        self.measured_offsets = []
+
+    def measure(self, offset: int) -> float:
+        self.measured_offsets.append(offset)
+        baseline = self.gain * (offset - self.balance_offset)
+        return float(np.clip(baseline, -self.adc_range, self.adc_range - 1))
+
+    def optimum(self) -> int:
+        return min(range(-255, 256), key=lambda offset: abs(self.gain * (offset - self.balance_offset)))
+
+
+class OffsetSearchTests(unittest.TestCase):
+    """Tests the adaptive search of load cell offsets."""
+
+    def test_search(self):
+        for method in ("bisection", "golden"):
+            for balance_offset in (-300, -254.6, -17.3, 0, 0.4, 100.2, 254.9, 400):
+                with self.subTest(method=method, balance_offset=balance_offset):
+                    load_cell = SimulatedLoadCell(balance_offset, gain=-25.0 if balance_offset == 0.4 else 40.0)
+                    value = search_optimum_offset(3, load_cell.measure, method=method)
+                    self.assertEqual(value.channel, 3)
+                    self.assertEqual([m.offset for m in value.offset_measurement], load_cell.measured_offsets)
+                    self.assertEqual(len(set(load_cell.measured_offsets)), len(load_cell.measured_offsets))
+                    self.assertLessEqual(len(load_cell.measured_offsets), 20)
+                    self.assertEqual(
+                        LoadCellsCalibrationInput.get_optimum_offset(value.offset_measurement, "closest_to_zero"),
+                        load_cell.optimum(),
+                    )
+
+    def test_tolerance(self):
+        load_cell = SimulatedLoadCell(balance_offset=42.0)
+        value = search_optimum_offset(0, load_cell.measure, tolerance=16)
+        self.assertLessEqual(len(value.offset_measurement), 7)
+        optimum = LoadCellsCalibrationInput.get_optimum_offset(value.offset_measurement, criterion="closest_to_zero")
+        self.assertLessEqual(abs(optimum - 42), 16)
+
+    def test_offset_criterion(self):
+        load_cell = SimulatedLoadCell(balance_offset=42.0)
+        value = search_optimum_offset(0, load_cell.measure, weight_measurement=[MeasuredWeight(weight=0, baseline=0)])
+        value.weight_measurement.append(MeasuredWeight(weight=1, baseline=1))
+        measurements = value.offset_measurement
+        lowest = min(measurements, key=lambda m: m.baseline).offset
+        self.assertNotEqual(lowest, 42)
+        self.assertEqual(LoadCellsCalibrationInput.get_optimum_offset(measurements), lowest)
+        self.assertEqual(LoadCellsCalibrationInput.get_optimum_offset(measurements, "closest_to_zero"), 42)
+
+        calibration = LoadCellsCalibrationInput(channels=[value])
+        self.assertEqual(calibration.calibrate_output().channels[0].offset, lowest)
+        self.assertEqual(calibration.calibrate_output(offset_criterion="closest_to_zero").channels[0].offset, 42)
+        self.assertEqual(
+            LoadCellsCalibrationInput.calibrate_outputs([calibration], "closest_to_zero")[0].channels[0].offset, 42
+        )
+        self.assertEqual(LoadCellsCalibrationInput.calibrate_loadcell_output(value, "closest_to_zero").offset, 42)
+
+    def test_ask_tell(self):
+        load_cell = SimulatedLoadCell(balance_offset=-120.0)
+        search = OffsetSearch(method="golden")
+        self.assertIsNone(search.best)
+        while not search.done:
+            search.update(load_cell.measure(search.propose()))
+        self.assertIsNone(search.propose())
+        self.assertEqual(search.best.offset, -120)
+        with self.assertRaises(RuntimeError):
+            search.update(0.0)
+        with self.assertRaises(ValueError):
+            OffsetSearch(method="random")
+
+
+if __name__ == "__main__":
+    unittest.main()
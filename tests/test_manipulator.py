@@ -0,0 +1,143 @@
+import unittest
+
+import numpy as np
+
+from aind_behavior_services.calibration.aind_manipulator import (
+    AindManipulatorCalibrationInput,
+    Axis,
+    AxisConfiguration,
+    ManipulatorMotionPlanner,
+    ManipulatorPosition,
+    MicrostepResolution,
+    trapezoidal_move_time,
+)
+
+
+def simulate_move_time(steps: int, step_interval: int, maximum_step_interval: int, acceleration: int) -> float:
+    """Adds up the interval of every step of a move, ramping the interval at both ends."""
+    intervals = []
+    interval = maximum_step_interval
+    for _ in range((steps + 1) // 2):
+        intervals.append(max(interval, step_interval))
+        interval -= acceleration
+    ramp = intervals[: steps // 2]
+    return (sum(intervals) + sum(ramp)) * 1e-6
+
+
+class TrapezoidalMoveTimeTests(unittest.TestCase):
+    """Tests the move duration estimate."""
+
+    def test_matches_simulation(self):
+        configurations = [(100, 2000, 100), (100, 2000, 7), (500, 500, 100), (300, 200, 50), (150, 20000, 2000)]
+        steps = np.array([0, 1, 2, 3, 19, 20, 21, 40, 41, 1000, 12345])
+        for step_interval, maximum_step_interval, acceleration in configurations:
+            with self.subTest(interval=step_interval, maximum=maximum_step_interval, acceleration=acceleration):
+                result = trapezoidal_move_time(steps, step_interval, maximum_step_interval, acceleration)
+                expected = [simulate_move_time(n, step_interval, maximum_step_interval, acceleration) for n in steps]
+                np.testing.assert_allclose(result, expected)
+        np.testing.assert_allclose(
+            trapezoidal_move_time(-20, 100, 2000, 100), trapezoidal_move_time(20, 100, 2000, 100)
+        )
+
+    def test_broadcast(self):
+        result = trapezoidal_move_time([[10], [5000]], [100, 200], 2000, 100)
+        self.assertEqual(result.shape, (2, 2))
+        self.assertLess(result[1, 0], result[1, 1])
+
+
+class ManipulatorMotionPlannerTests(unittest.TestCase):
+    """Tests the conversion of manipulator positions and the planning of moves."""
+
+    def setUp(self):
+        self.calibration = AindManipulatorCalibrationInput(
+            full_step_to_mm=ManipulatorPosition(x=0.01, y1=0.02, y2=0.02, z=0.005),
+            axis_configuration=[
+                AxisConfiguration(axis=Axis.X, microstep_resolution=MicrostepResolution.MICROSTEP16),
+                AxisConfiguration(axis=Axis.Y1, max_limit=10),
+                AxisConfiguration(axis=Axis.Y2),
+                AxisConfiguration(axis=Axis.Z, min_limit=0, max_limit=0, step_interval=200),
+            ],
+            homing_order=[Axis.Z, Axis.X, Axis.Y1],
+            initial_position=ManipulatorPosition(x=5, y1=2, y2=0, z=-3),
+        )
+        self.planner = ManipulatorMotionPlanner(self.calibration)
+
+    def test_conversion(self):
+        np.testing.assert_allclose(self.planner.mm_per_step, [0.01 / 16, 0.02 / 8, 0.02 / 8, 0.005 / 8])
+        positions = np.array([[1.0, 2.0, 3.0, -40.0], [0.0, 10.0, 25.0, 100.0]])
+        steps = self.planner.to_steps(positions)
+        self.assertEqual(steps.dtype, np.int64)
+        np.testing.assert_array_equal(steps, [[1600, 800, 1200, -64000], [0, 4000, 10000, 160000]])
+        np.testing.assert_allclose(self.planner.to_position(steps), positions)
+        np.testing.assert_array_equal(self.planner.to_steps(self.calibration.initial_position), [8000, 800, 0, -4800])
+        np.testing.assert_array_equal(
+            self.planner.to_steps([self.calibration.initial_position] * 2), [[8000, 800, 0, -4800]] * 2
+        )
+
+    def test_limits(self):
+        with self.assertRaisesRegex(ValueError, r"\['Y1', 'Y2'\]"):
+            self.planner.to_steps([[0, 10.5, 0, 0], [0, 0, 26, 0]])
+        with self.assertRaises(ValueError):
+            self.planner.to_steps([-1, 0, 0, 0])
+        clipped = self.planner.to_steps([[-1, 10.5, 26, -1000]], out_of_range="clip")
+        np.testing.assert_array_equal(clipped, [[-16, 4000, 10000, -1600000]])
+
+    def test_plan_move(self):
+        start = ManipulatorPosition(x=0, y1=0, y2=0, z=0)
+        target = ManipulatorPosition(x=1, y1=5, y2=0, z=-1)
+        times = self.planner.move_time(self.planner.to_steps(target))
+        plan = self.planner.plan_move(start, target)
+        self.assertEqual(plan.stages, [[Axis.Z, Axis.Y1, Axis.X]])
+        self.assertEqual(plan.axis_times, {Axis.X: times[0], Axis.Y1: times[1], Axis.Z: times[3]})
+        self.assertAlmostEqual(plan.total_time, times.max())
+        self.assertAlmostEqual(plan.sequential_time, times.sum())
+
+        plan = self.planner.plan_move(start, target, max_concurrent_axes=2)
+        self.assertEqual(plan.stages, [[Axis.Z, Axis.Y1], [Axis.X]])
+        self.assertAlmostEqual(plan.total_time, times[3] + times[0])
+        self.assertEqual(self.planner.plan_move(target, target).stages, [])
+
+    def test_plan_homing(self):
+        start = ManipulatorPosition(x=2, y1=1, y2=3, z=4)
+        plan = self.planner.plan_homing(start)
+        homing_times = self.planner.move_time(self.planner.to_steps(start))
+        positioning = self.planner.plan_move([0, 0, 0, 0], self.calibration.initial_position)
+        self.assertEqual(plan.stages[:3], [[Axis.Z], [Axis.X], [Axis.Y1]])
+        self.assertEqual(plan.stages[3:], positioning.stages)
+        self.assertAlmostEqual(plan.total_time, homing_times[[3, 0, 1]].sum() + positioning.total_time)
+        self.assertAlmostEqual(plan.axis_times[Axis.X], homing_times[0] + positioning.axis_times[Axis.X])
+
+    def test_homing_order_none(self):
+        start = ManipulatorPosition(x=2, y1=1, y2=3, z=4)
+        homing_order = [Axis.NONE, *self.calibration.homing_order, Axis.NONE]
+        planner = ManipulatorMotionPlanner(self.calibration.model_copy(update={"homing_order": homing_order}))
+        self.assertEqual(planner.plan_homing(start), self.planner.plan_homing(start))
+
+    def test_unconfigured_axis(self):
+        calibration = self.calibration.model_copy(
+            update={
+                "axis_configuration": [c for c in self.calibration.axis_configuration if c.axis != Axis.Y2],
+                "homing_order": [Axis.Y2, Axis.Z, Axis.X, Axis.Y1],
+            }
+        )
+        planner = ManipulatorMotionPlanner(calibration)
+        np.testing.assert_array_equal(planner.enabled, [True, True, False, True])
+        with self.assertRaisesRegex(ValueError, r"\['Y2'\] are not configured"):
+            planner.to_steps([0, 0, 1, 0])
+        with self.assertRaisesRegex(ValueError, "not configured"):
+            planner.plan_move([0, 0, 0, 0], [1, 1, 1, 1])
+        np.testing.assert_array_equal(planner.to_steps([1, 0, 1, 0], out_of_range="clip"), [1600, 0, 0, 0])
+
+        target = ManipulatorPosition(x=1, y1=1, y2=0, z=1)
+        self.assertNotIn(Axis.Y2, planner.plan_move([0, 0, 0, 0], target).axis_times)
+        plan = planner.plan_homing(ManipulatorPosition(x=2, y1=1, y2=3, z=4))
+        self.assertEqual(plan.stages[:3], [[Axis.Z], [Axis.X], [Axis.Y1]])
+        self.assertNotIn(Axis.Y2, plan.axis_times)
+        with self.assertRaisesRegex(ValueError, "not configured"):
+            ManipulatorMotionPlanner(
+                calibration.model_copy(update={"initial_position": ManipulatorPosition(x=0, y1=0, y2=1, z=0)})
+            ).plan_homing([0, 0, 0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
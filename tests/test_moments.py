@@ -0,0 +1,133 @@
+import math
+import unittest
+
+import numpy as np
+
+from aind_behavior_services.task_logic import distributions as d
+from aind_behavior_services.task_logic import moments
+from aind_behavior_services.task_logic.sampling import sample
+
+N_SAMPLES = 400_000
+
+
+def truncated(distribution, low: float, high: float, scaling=None):
+    return distribution.model_copy(
+        update={
+            "truncation_parameters": d.TruncationParameters(is_truncated=True, min=low, max=high),
+            "scaling_parameters": scaling,
+        }
+    )
+
+
+FAMILIES = [
+    d.Scalar(distribution_parameters=d.ScalarDistributionParameter(value=2)),
+    d.NormalDistribution(distribution_parameters=d.NormalDistributionParameters(mean=1, std=2)),
+    d.LogNormalDistribution(distribution_parameters=d.LogNormalDistributionParameters(mean=0.2, std=0.5)),
+    d.UniformDistribution(distribution_parameters=d.UniformDistributionParameters(min=-1, max=3)),
+    d.ExponentialDistribution(distribution_parameters=d.ExponentialDistributionParameters(rate=0.5)),
+    d.GammaDistribution(distribution_parameters=d.GammaDistributionParameters(shape=3, rate=2)),
+    d.BinomialDistribution(distribution_parameters=d.BinomialDistributionParameters(n=12, p=0.3)),
+    d.BetaDistribution(distribution_parameters=d.BetaDistributionParameters(alpha=2, beta=3)),
+    d.PoissonDistribution(distribution_parameters=d.PoissonDistributionParameters(rate=4)),
+    d.PdfDistribution(distribution_parameters=d.PdfDistributionParameters(pdf=[1, 2, 3, 4], index=[0, 1, 2.5, 4])),
+]
+
+
+class MomentsTests(unittest.TestCase):
+    """Tests the closed-form moments and quantiles of distributions against samples."""
+
+    def assertMatchesSamples(self, distribution, values: np.ndarray):
+        n = len(values)
+        std = values.std()
+        self.assertAlmostEqual(moments.mean(distribution), values.mean(), delta=5 * std / math.sqrt(n) + 1e-12)
+        self.assertAlmostEqual(moments.variance(distribution), values.var(), delta=10 * std**2 / math.sqrt(n) + 1e-12)
+        probabilities = np.array([0.1, 0.5, 0.9])
+        result = moments.quantile(distribution, probabilities)
+        # The empirical cumulative probability at each quantile brackets its probability
+        below = np.array([np.mean(values < x) for x in result])
+        at_or_below = np.array([np.mean(values <= x) for x in result])
+        self.assertTrue(np.all(below <= probabilities + 0.005), (result, below))
+        self.assertTrue(np.all(at_or_below >= probabilities - 0.005), (result, at_or_below))
+
+    def test_families(self):
+        self.assertEqual({f.family for f in FAMILIES}, set(d.DistributionFamily))
+        for distribution in FAMILIES:
+            with self.subTest(family=distribution.family):
+                self.assertMatchesSamples(distribution, sample(distribution, N_SAMPLES, 0))
+
+    def test_scaled_and_truncated(self):
+        windows = {
+            d.DistributionFamily.NORMAL: (0, 2),
+            d.DistributionFamily.LOGNORMAL: (1, 1.5),
+            d.DistributionFamily.UNIFORM: (0, 5),
+            d.DistributionFamily.EXPONENTIAL: (1, 3),
+            d.DistributionFamily.GAMMA: (1, 2),
+            d.DistributionFamily.BINOMIAL: (2, 5),
+            d.DistributionFamily.BETA: (0.2, 0.5),
+            d.DistributionFamily.POISSON: (3, 20),
+            d.DistributionFamily.PDF: (0.5, 4),
+        }
+        for distribution in FAMILIES[1:]:
+            low, high = windows[distribution.family]
+            for scaling in (None, d.ScalingParameters(scale=-2, offset=1)):
+                if scaling is not None:
+                    low, high = sorted((low * scaling.scale + scaling.offset, high * scaling.scale + scaling.offset))
+                value = truncated(distribution, low, high, scaling)
+                with self.subTest(family=distribution.family, scaling=scaling):
+                    self.assertMatchesSamples(value, sample(value, N_SAMPLES, 1))
+
+    def test_closed_forms(self):
+        rate, low, high = 1.0, 20.0, 22.0
+        value = truncated(
+            FAMILIES[4].model_copy(update={"distribution_parameters": d.ExponentialDistributionParameters(rate=rate)}),
+            low,
+            high,
+        )
+        width = high - low
+        expected = low + 1 / rate - width * math.exp(-rate * width) / (1 - math.exp(-rate * width))
+        self.assertAlmostEqual(moments.mean(value), expected, places=10)
+        self.assertAlmostEqual(moments.mean(FAMILIES[2]), math.exp(0.2 + 0.5**2 / 2))
+        self.assertAlmostEqual(moments.variance(FAMILIES[6]), 12 * 0.3 * 0.7)
+        self.assertEqual(moments.quantile(FAMILIES[0], 0.3), 2)
+        self.assertAlmostEqual(moments.quantile(FAMILIES[1], 0.5), 1)
+        scaled = FAMILIES[4].model_copy(update={"scaling_parameters": d.ScalingParameters(scale=0, offset=3)})
+        self.assertEqual((moments.mean(scaled), moments.variance(scaled)), (3, 0))
+
+    def test_vectorized(self):
+        np.testing.assert_allclose(moments.mean(FAMILIES), [moments.mean(f) for f in FAMILIES])
+        result = moments.quantile(FAMILIES, [[0.25, 0.75]])
+        self.assertEqual(result.shape, (len(FAMILIES), 1, 2))
+        np.testing.assert_allclose(result[3], [[0, 2]])
+        with self.assertRaises(ValueError):
+            moments.quantile(FAMILIES[0], 1.5)
+
+    def test_memoized(self):
+        moments._memo.clear()
+        candidates = [truncated(FAMILIES[5].model_copy(deep=True), 0.5 + (i % 10) * 0.1, 3) for i in range(5000)]
+        result = moments.mean(candidates)
+        self.assertEqual((moments._memo.misses, moments._memo.hits), (10, 4990))
+        np.testing.assert_array_equal(result[:10], result[10:20])
+        self.assertEqual(len(np.unique(result)), 10)
+        moments.variance(candidates[:3])
+        self.assertEqual((moments._memo.misses, moments._memo.hits), (10, 4993))
+
+    def test_batched(self):
+        # Distributions of the same family are evaluated together, and match their individual evaluation
+        batch = [
+            truncated(FAMILIES[i].model_copy(deep=True), low, high)
+            for i in (1, 5, 6, 8)
+            for low, high in ((-1.0, 50.0), (0.5, 2.5), (1.0, 4.0))
+        ] + FAMILIES
+        means, variances = moments.mean(batch), moments.variance(batch)
+        quantiles = moments.quantile(batch, [0.1, 0.5, 0.9])
+        moments._memo.clear()
+        for i, distribution in enumerate(batch):
+            with self.subTest(family=distribution.family, index=i):
+                self.assertAlmostEqual(moments.mean(distribution), means[i], places=10)
+                self.assertAlmostEqual(moments.variance(distribution), variances[i], places=10)
+                np.testing.assert_allclose(moments.quantile(distribution, [0.1, 0.5, 0.9]), quantiles[i])
+        self.assertEqual(moments.mean([]).shape, (0,))
+
+
+if __name__ == "__main__":
+    unittest.main()
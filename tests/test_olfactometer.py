@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+
+from aind_behavior_services.calibration.olfactometer import (
+    OlfactometerCalibrationInput,
+    OlfactometerChannel,
+    OlfactometerChannelConfig,
+    OlfactometerChannelType,
+    OlfactometerFlowSolver,
+)
+
+
+class OlfactometerFlowSolverTests(unittest.TestCase):
+    """Tests the computation of olfactometer flow set-points."""
+
+    def setUp(self):
+        self.calibration = OlfactometerCalibrationInput(
+            channel_config={
+                OlfactometerChannel.Channel3: OlfactometerChannelConfig(
+                    channel_index=3, channel_type=OlfactometerChannelType.CARRIER, flow_rate_capacity=1000
+                ),
+                OlfactometerChannel.Channel0: OlfactometerChannelConfig(
+                    channel_index=0, odorant="Banana", odorant_dilution=2.0
+                ),
+                OlfactometerChannel.Channel2: OlfactometerChannelConfig(
+                    channel_index=2, odorant="Strawberry", odorant_dilution=10.0
+                ),
+            }
+        )
+        self.solver = OlfactometerFlowSolver(self.calibration, total_flow=1000)
+
+    def test_solve(self):
+        self.assertEqual(self.solver.odor_channels, [OlfactometerChannel.Channel0, OlfactometerChannel.Channel2])
+        concentrations = np.array([[0.0, 0.0], [0.1, 0.0], [0.0, 0.5], [0.2, 1.0]])
+        set_points = self.solver.solve(concentrations)
+        np.testing.assert_allclose(
+            set_points,
+            [[0, 0, 0, 1000], [50, 0, 0, 950], [0, 0, 50, 950], [100, 0, 100, 800]],
+        )
+        np.testing.assert_allclose(set_points.sum(axis=-1), 1000)
+        np.testing.assert_allclose(self.solver.concentration(set_points), concentrations)
+
+        by_channel = self.solver.solve({OlfactometerChannel.Channel2: concentrations[:, 1]})
+        np.testing.assert_allclose(by_channel[:, 2], set_points[:, 2])
+        np.testing.assert_allclose(by_channel[:, 0], 0)
+
+    def test_capacity(self):
+        with self.assertRaisesRegex(ValueError, r"\[1\]"):
+            self.solver.solve([[0.1, 0.0], [0.3, 0.0]])
+        clipped = self.solver.solve([[0.3, 0.0], [0.1, 0.0]], out_of_range="clip")
+        np.testing.assert_allclose(clipped, [[100, 0, 0, 900], [50, 0, 0, 950]])
+
+        # Without room for the carrier, the odor flows are scaled down and keep their ratio
+        solver = OlfactometerFlowSolver(self.calibration, total_flow=150)
+        clipped = solver.solve([[2.0, 10.0]], out_of_range="clip")
+        np.testing.assert_allclose(clipped, [[75, 0, 75, 0]])
+        with self.assertRaises(ValueError):
+            solver.solve([[2.0, 10.0]])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            self.solver.solve([[-0.1, 0.0]])
+        with self.assertRaises(ValueError):
+            self.solver.solve([0.1, 0.0, 0.0])
+        with self.assertRaises(ValueError):
+            self.solver.solve({OlfactometerChannel.Channel3: 0.1})
+        with self.assertRaises(ValueError):
+            OlfactometerFlowSolver(self.calibration, total_flow=2000)
+        with self.assertRaises(ValueError):
+            OlfactometerFlowSolver(OlfactometerCalibrationInput())
+
+        config = dict(self.calibration.channel_config)
+        config[OlfactometerChannel.Channel1] = OlfactometerChannelConfig(channel_index=1)
+        solver = OlfactometerFlowSolver(OlfactometerCalibrationInput(channel_config=config))
+        self.assertEqual(solver.total_flow, 1000)
+        np.testing.assert_allclose(solver.solve([0.1, 0.0, 0.0]), [50, 0, 0, 950])
+        with self.assertRaisesRegex(ValueError, "Channel1"):
+            solver.solve([0.1, 0.1, 0.0])
+
+    def test_tabulate(self):
+        rng = np.random.default_rng(0)
+        levels = np.array([[0.0, 0.0], [0.1, 0.0], [0.0, 0.5], [0.1, 0.5]])
+        concentrations = levels[rng.integers(0, len(levels), size=500)]
+        table = self.solver.tabulate(concentrations)
+        self.assertEqual(len(table), 500)
+        self.assertEqual(table.set_points.shape, (4, 4))
+        np.testing.assert_allclose(table[np.arange(500)], self.solver.solve(concentrations))
+        np.testing.assert_allclose(table[3], self.solver.solve(concentrations[3]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import base64
+import time
+import unittest
+from typing import Annotated, List
+from unittest import mock
+
+import numpy as np
+from pydantic import BaseModel, Field, RootModel, ValidationError
+
+from aind_behavior_services import patterns
+from aind_behavior_services.patterns import LookUpTable, NDArray, ValuePair
+from aind_behavior_services.utils import schema_fingerprint
+
+from . import benchmark
+
+
+class ListLookUpTable(RootModel):
+    root: List[ValuePair] = Field(..., validate_default=True, min_length=2)
+
+
+class ArrayModel(BaseModel):
+    counts: Annotated[np.ndarray, NDArray(dtype=np.uint16, shape=(None,), le=1000)]
+    matrix: Annotated[np.ndarray, NDArray(dtype=float, shape=(2, 3), encoding="base64")]
+
+
+class NDArrayTests(unittest.TestCase):
+    """Tests the NumPy array annotation."""
+
+    def test_json_schema(self):
+        expected = ListLookUpTable.model_json_schema()
+        expected["title"] = "LookUpTable"
+        self.assertEqual(LookUpTable.model_json_schema(), expected)
+
+    def test_round_trip(self):
+        table = LookUpTable([[0, 1], [2, 3.5]])
+        self.assertIsInstance(table.root, np.ndarray)
+        self.assertEqual(table.model_dump_json(), ListLookUpTable([[0, 1], [2, 3.5]]).model_dump_json())
+        self.assertEqual(LookUpTable.model_validate_json(table.model_dump_json()), table)
+
+        model = ArrayModel(counts=[1, 2, 3], matrix=np.arange(6.0).reshape(2, 3))
+        json_model = model.model_dump_json()
+        self.assertIn('"counts":[1,2,3]', json_model)
+        self.assertIn('"matrix":{"dtype":"<f8","shape":[2,3],"data":', json_model)
+        deserialized = ArrayModel.model_validate_json(json_model)
+        np.testing.assert_array_equal(deserialized.matrix, model.matrix)
+        self.assertEqual(deserialized.counts.dtype, np.uint16)
+        np.testing.assert_array_equal(ArrayModel(counts=[1], matrix=model.matrix.tolist()).matrix, model.matrix)
+
+    def test_zero_copy(self):
+        values = np.random.default_rng(0).random((10, 2))
+        self.assertIs(LookUpTable(values).root.base, values)
+
+    def test_equality(self):
+        model = ArrayModel(counts=[1, 2, 3], matrix=np.arange(6.0).reshape(2, 3))
+        self.assertEqual(model, ArrayModel(counts=[1, 2, 3], matrix=np.arange(6.0).reshape(2, 3)))
+        self.assertEqual(model, model.model_copy(deep=True))
+        self.assertNotEqual(model, ArrayModel(counts=[1, 2, 4], matrix=model.matrix))
+        self.assertNotEqual(model, ArrayModel(counts=[1, 2], matrix=model.matrix))
+        self.assertNotEqual(LookUpTable([[0, 1], [2, 3]]), LookUpTable([[0, 1], [2, 4]]))
+
+        # Anything but another validated array is compared elementwise
+        self.assertIsInstance(model.counts, patterns.ComparableArray)
+        np.testing.assert_array_equal(model.counts == 2, [False, True, False])
+        np.testing.assert_array_equal(model.counts != np.array([1, 0, 3]), [False, True, False])
+        np.testing.assert_array_equal(model.matrix[0] == model.matrix[1] - 3, [True, True, True])
+        self.assertIs(type(model.counts + 1), np.ndarray)
+        self.assertIs(type(model.matrix[0]), np.ndarray)
+
+    def test_python_dump(self):
+        model = ArrayModel(counts=[1, 2, 3], matrix=np.arange(6.0).reshape(2, 3))
+        self.assertEqual(model.model_dump(), {"counts": [1, 2, 3], "matrix": [[0.0, 1.0, 2.0], [3.0, 4.0, 5.0]]})
+        self.assertEqual(LookUpTable([[0, 1], [2, 3]]).model_dump(), [[0.0, 1.0], [2.0, 3.0]])
+        self.assertEqual(ArrayModel.model_validate(model.model_dump()), model)
+
+    def test_validation_errors(self):
+        invalid = [
+            [[0, 1, 2], [1, 2, 3]],
+            [[0, 1]],
+            [[0, 1], [2]],
+            [["a", 1], [2, 3]],
+        ]
+        for value in invalid:
+            with self.subTest(value=value), self.assertRaises(ValidationError):
+                LookUpTable(value)
+        for counts in ([1001], [-1], [1.5], [70000]):
+            with self.subTest(counts=counts), self.assertRaises(ValidationError):
+                ArrayModel(counts=counts, matrix=np.zeros((2, 3)))
+        with self.assertRaises(ValidationError):
+            ArrayModel(counts=[1], matrix={"dtype": "<f8", "shape": [2, 3], "data": "AAAA"})
+        # Only fields with base64 encoding accept the encoded form, matching their json-schema
+        counts = {"dtype": "<u2", "shape": [1], "data": base64.b64encode(np.uint16(1).tobytes()).decode("ascii")}
+        self.assertEqual(NDArray(dtype=np.uint16, encoding="base64").validate(counts).tolist(), [1])
+        with self.assertRaises(ValidationError):
+            ArrayModel(counts=counts, matrix=np.zeros((2, 3)))
+
+    def test_bulk_validation(self):
+        values = np.random.default_rng(0).random((10000, 2)).tolist()
+        with mock.patch.object(patterns.np, "asarray", wraps=np.asarray) as asarray:
+            table = LookUpTable(values)
+        asarray.assert_called_once_with(values)
+        self.assertIsInstance(table.root, np.ndarray)
+        self.assertEqual((table.root.shape, table.root.dtype), ((10000, 2), np.float64))
+        np.testing.assert_array_equal(table.root, values)
+
+    @benchmark
+    def test_validation_time(self):
+        values = np.random.default_rng(0).random((10000, 2)).tolist()
+        start = time.perf_counter()
+        LookUpTable(values)
+        self.assertLess(time.perf_counter() - start, 0.25)
+
+    def test_fingerprint(self):
+        class First(BaseModel):
+            values: Annotated[np.ndarray, NDArray(shape=(None, 2))]
+
+        class Second(BaseModel):
+            values: Annotated[np.ndarray, NDArray(shape=(None, 3))]
+
+        Second.__name__ = Second.__qualname__ = First.__qualname__
+        self.assertNotEqual(schema_fingerprint(First), schema_fingerprint(Second))
+
+
+if __name__ == "__main__":
+    unittest.main()
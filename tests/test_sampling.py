@@ -0,0 +1,312 @@
+import math
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+from pydantic import ValidationError
+
+from aind_behavior_services.task_logic import distributions as d
+from aind_behavior_services.task_logic.sampling import sample
+
+from . import benchmark
+
+N_SAMPLES = 200_000
+
+
+def normal_cdf(x: float) -> float:
+    return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+
+def normal_pdf(x: float) -> float:
+    return math.exp(-(x**2) / 2) / math.sqrt(2 * math.pi)
+
+
+class SamplingTests(unittest.TestCase):
+    """Tests the statistics of the samples of every distribution family."""
+
+    def assertMoments(self, values: np.ndarray, mean: float, variance: float):
+        # Tolerances of 5 standard errors of the sample mean and variance
+        n = len(values)
+        self.assertAlmostEqual(values.mean(), mean, delta=5 * math.sqrt(variance / n) + 1e-12)
+        fourth = np.mean((values - mean) ** 4)
+        self.assertAlmostEqual(values.var(), variance, delta=5 * math.sqrt(max(fourth - variance**2, 0) / n) + 1e-12)
+
+    def test_families(self):
+        cases = [
+            (d.Scalar(distribution_parameters=d.ScalarDistributionParameter(value=3.5)), 3.5, 0.0),
+            (d.NormalDistribution(distribution_parameters=d.NormalDistributionParameters(mean=2, std=3)), 2, 9),
+            (
+                d.LogNormalDistribution(distribution_parameters=d.LogNormalDistributionParameters(mean=0.5, std=0.4)),
+                math.exp(0.5 + 0.4**2 / 2),
+                (math.exp(0.4**2) - 1) * math.exp(1 + 0.4**2),
+            ),
+            (d.UniformDistribution(distribution_parameters=d.UniformDistributionParameters(min=-1, max=3)), 1, 16 / 12),
+            (
+                d.ExponentialDistribution(distribution_parameters=d.ExponentialDistributionParameters(rate=4)),
+                0.25,
+                1 / 16,
+            ),
+            (d.GammaDistribution(distribution_parameters=d.GammaDistributionParameters(shape=3, rate=2)), 1.5, 0.75),
+            (d.BinomialDistribution(distribution_parameters=d.BinomialDistributionParameters(n=20, p=0.3)), 6, 4.2),
+            (
+                d.BetaDistribution(distribution_parameters=d.BetaDistributionParameters(alpha=2, beta=5)),
+                2 / 7,
+                10 / 392,
+            ),
+            (d.PoissonDistribution(distribution_parameters=d.PoissonDistributionParameters(rate=7)), 7, 7),
+            (
+                d.PdfDistribution(distribution_parameters=d.PdfDistributionParameters(pdf=[1, 2, 1], index=[0, 1, 4])),
+                1.5,
+                0.25 * 0 + 0.5 * 1 + 0.25 * 16 - 1.5**2,
+            ),
+        ]
+        self.assertEqual({c[0].family for c in cases}, set(d.DistributionFamily))
+        for distribution, mean, variance in cases:
+            with self.subTest(family=distribution.family):
+                values = sample(distribution, N_SAMPLES, np.random.default_rng(0))
+                self.assertEqual(values.shape, (N_SAMPLES,))
+                self.assertEqual(values.dtype, np.float64)
+                self.assertMoments(values, mean, variance)
+
+    def test_pdf_frequencies(self):
+        distribution = d.PdfDistribution(
+            distribution_parameters=d.PdfDistributionParameters(pdf=[1, 0, 3, 6], index=[-2, 0, 0.5, 10])
+        )
+        values = sample(distribution, N_SAMPLES, 1)
+        index, counts = np.unique(values, return_counts=True)
+        np.testing.assert_array_equal(index, [-2, 0.5, 10])
+        np.testing.assert_allclose(counts / N_SAMPLES, [0.1, 0.3, 0.6], atol=0.005)
+
+    def test_scaling_and_truncation(self):
+        distribution = d.NormalDistribution(
+            distribution_parameters=d.NormalDistributionParameters(mean=0, std=1),
+            scaling_parameters=d.ScalingParameters(scale=2, offset=1),
+            truncation_parameters=d.TruncationParameters(is_truncated=True, min=0, max=4),
+        )
+        values = sample(distribution, N_SAMPLES, np.random.default_rng(2))
+        self.assertTrue(np.all((values >= 0) & (values <= 4)))
+        # The scaled normal N(1, 2) truncated to [0, 4] is a standard normal truncated to [-0.5, 1.5]
+        a, b = -0.5, 1.5
+        mass = normal_cdf(b) - normal_cdf(a)
+        mean = (normal_pdf(a) - normal_pdf(b)) / mass
+        variance = 1 + (a * normal_pdf(a) - b * normal_pdf(b)) / mass - mean**2
+        self.assertMoments(values, 1 + 2 * mean, 4 * variance)
+
+        # Truncation is ignored unless enabled
+        distribution.truncation_parameters.is_truncated = False
+        self.assertLess(sample(distribution, N_SAMPLES, 0).min(), 0)
+
+    def test_unlikely_truncation(self):
+        distribution = d.ExponentialDistribution(
+            distribution_parameters=d.ExponentialDistributionParameters(rate=1),
+            truncation_parameters=d.TruncationParameters(is_truncated=True, min=5, max=6),
+        )
+        values = sample(distribution, 1000, 0)
+        self.assertTrue(np.all((values >= 5) & (values <= 6)))
+
+        distribution.truncation_parameters = d.TruncationParameters(is_truncated=True, min=-2, max=-1)
+        with self.assertRaises(ValueError):
+            sample(distribution, 10, 0)
+        distribution.truncation_parameters = d.TruncationParameters(is_truncated=True, min=2, max=1)
+        with self.assertRaises(ValueError):
+            sample(distribution, 10, 0)
+
+    def test_size_and_rng(self):
+        distribution = d.UniformDistribution(distribution_parameters=d.UniformDistributionParameters(min=0, max=1))
+        self.assertIsInstance(sample(distribution), float)
+        self.assertEqual(sample(distribution, (3, 4)).shape, (3, 4))
+        self.assertEqual(sample(distribution, 0).shape, (0,))
+        np.testing.assert_array_equal(sample(distribution, 10, 42), sample(distribution, 10, np.random.default_rng(42)))
+        rng = np.random.default_rng(42)
+        self.assertFalse(np.array_equal(sample(distribution, 10, rng), sample(distribution, 10, rng)))
+
+
+def truncated(distribution, low: float, high: float, scaling=None):
+    return distribution.model_copy(
+        update={
+            "truncation_parameters": d.TruncationParameters(is_truncated=True, min=low, max=high),
+            "scaling_parameters": scaling,
+        }
+    )
+
+
+class TruncatedSamplingTests(unittest.TestCase):
+    """Tests the exact sampling of truncated distributions."""
+
+    def test_matches_rejection(self):
+        cases = [
+            (d.NormalDistribution(distribution_parameters=d.NormalDistributionParameters(mean=1, std=2)), -1, 0.5),
+            (d.LogNormalDistribution(distribution_parameters=d.LogNormalDistributionParameters(std=0.5)), 0.8, 2),
+            (d.UniformDistribution(distribution_parameters=d.UniformDistributionParameters(min=0, max=10)), -5, 2.5),
+            (d.ExponentialDistribution(distribution_parameters=d.ExponentialDistributionParameters(rate=2)), 0.2, 1),
+            (d.GammaDistribution(distribution_parameters=d.GammaDistributionParameters(shape=2, rate=0.5)), 1, 5),
+            (d.BetaDistribution(distribution_parameters=d.BetaDistributionParameters(alpha=2, beta=3)), 0.5, 0.9),
+            (d.BinomialDistribution(distribution_parameters=d.BinomialDistributionParameters(n=10, p=0.4)), 2, 5),
+            (d.PoissonDistribution(distribution_parameters=d.PoissonDistributionParameters(rate=4)), 1.5, 6),
+            (
+                d.PdfDistribution(distribution_parameters=d.PdfDistributionParameters(pdf=[1, 2, 3], index=[0, 1, 2])),
+                0.5,
+                2,
+            ),
+        ]
+        scalings = [None, d.ScalingParameters(scale=-2, offset=3)]
+        for (distribution, low, high), scaling in [(c, s) for c in cases for s in scalings]:
+            if scaling is not None:
+                low, high = sorted((low * scaling.scale + scaling.offset, high * scaling.scale + scaling.offset))
+            with self.subTest(family=distribution.family, scaling=scaling):
+                values = sample(truncated(distribution, low, high, scaling), N_SAMPLES, 0)
+                self.assertTrue(np.all((values >= low) & (values <= high)))
+                reference = sample(distribution.model_copy(update={"scaling_parameters": scaling}), 4 * N_SAMPLES, 1)
+                reference = reference[(reference >= low) & (reference <= high)]
+                n = min(len(values), len(reference))
+                tolerance = 6 * reference.std() * math.sqrt(1 / n + 1 / len(reference))
+                self.assertAlmostEqual(values.mean(), reference.mean(), delta=tolerance)
+                self.assertAlmostEqual(values.std(), reference.std(), delta=tolerance)
+
+    def test_narrow_tail_window(self):
+        rate, low, high = 1.0, 20.0, 22.0
+        distribution = truncated(
+            d.ExponentialDistribution(distribution_parameters=d.ExponentialDistributionParameters(rate=rate)), low, high
+        )
+        values = sample(distribution, 1_000_000, 0)
+        self.assertTrue(np.all((values >= low) & (values <= high)))
+        width = high - low
+        mean = low + 1 / rate - width * math.exp(-rate * width) / (1 - math.exp(-rate * width))
+        self.assertAlmostEqual(values.mean(), mean, delta=0.01)
+
+        distribution = truncated(
+            d.PoissonDistribution(distribution_parameters=d.PoissonDistributionParameters(rate=3)), 20, 21
+        )
+        values = sample(distribution, N_SAMPLES, 0)
+        self.assertEqual(set(np.unique(values)), {20.0, 21.0})
+        # P(21) / P(20) = rate / 21
+        self.assertAlmostEqual(np.mean(values == 21), (3 / 21) / (1 + 3 / 21), delta=0.005)
+
+    def test_scaled_discrete_window(self):
+        distribution = truncated(
+            d.BinomialDistribution(distribution_parameters=d.BinomialDistributionParameters(n=10, p=0.5)),
+            0.3,
+            0.3,
+            d.ScalingParameters(scale=0.1),
+        )
+        np.testing.assert_array_equal(sample(distribution, 100, 0), 0.3)
+
+    def test_infeasible_window(self):
+        infeasible = [
+            (d.UniformDistribution(distribution_parameters=d.UniformDistributionParameters(min=0, max=1)), 2, 3, None),
+            (d.PoissonDistribution(), 0.2, 0.8, None),
+            (d.LogNormalDistribution(distribution_parameters=d.LogNormalDistributionParameters(std=1)), -2, -1, None),
+            (d.NormalDistribution(distribution_parameters=d.NormalDistributionParameters(std=1)), 1, 1, None),
+            (d.NormalDistribution(distribution_parameters=d.NormalDistributionParameters(std=1)), 2, 1, None),
+            (d.BetaDistribution(), 0, 1, d.ScalingParameters(scale=-1)),
+            (d.ExponentialDistribution(), 0, 1, d.ScalingParameters(scale=0, offset=2)),
+            (
+                d.PdfDistribution(distribution_parameters=d.PdfDistributionParameters(pdf=[1, 0], index=[0, 1])),
+                1,
+                1,
+                None,
+            ),
+        ]
+        for distribution, low, high, scaling in infeasible:
+            with self.subTest(family=distribution.family, low=low, high=high):
+                with self.assertRaises(ValidationError):
+                    type(distribution).model_validate(truncated(distribution, low, high, scaling).model_dump())
+
+        feasible = [
+            (d.NormalDistribution(), 0, 0, None),
+            (d.ExponentialDistribution(), 1, 3, d.ScalingParameters(scale=0, offset=2)),
+            (d.BetaDistribution(), -1, 0, d.ScalingParameters(scale=-1)),
+        ]
+        for distribution, low, high, scaling in feasible:
+            with self.subTest(family=distribution.family, low=low, high=high):
+                value = type(distribution).model_validate(truncated(distribution, low, high, scaling).model_dump())
+                samples = sample(value, 100, 0)
+                self.assertTrue(np.all((samples >= low) & (samples <= high)))
+
+
+class PdfDistributionTests(unittest.TestCase):
+    """Tests the validation and alias table of empirical pdfs."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.pdf = rng.random(100_000) * (rng.random(100_000) < 0.7)
+        self.index = np.cumsum(rng.random(100_000))
+
+    @benchmark
+    def test_validation_time(self):
+        start = time.perf_counter()
+        d.PdfDistributionParameters(pdf=self.pdf.tolist(), index=self.index.tolist())
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_validation(self):
+        parameters = d.PdfDistributionParameters(pdf=self.pdf.tolist(), index=self.index.tolist())
+        self.assertAlmostEqual(math.fsum(parameters.pdf), 1.0)
+        np.testing.assert_allclose(parameters.pdf, self.pdf / self.pdf.sum())
+        for pdf in ([0, 0], []):
+            with self.subTest(pdf=pdf), self.assertRaises(ValidationError):
+                d.PdfDistributionParameters(pdf=pdf, index=list(range(len(pdf))))
+
+    def test_alias_table(self):
+        pdf = np.array([0.1, 0.0, 0.25, 0.05, 0.6])
+        table = d.AliasTable.from_pdf(pdf.tolist(), [10, 20, 30, 40, 50])
+        # Each bin is kept with probability[bin] / n, and is the alias of other bins with the rest
+        n = len(pdf)
+        mass = table.probability / n
+        np.add.at(mass, table.alias, (1 - table.probability) / n)
+        np.testing.assert_allclose(mass, pdf, atol=1e-12)
+
+        values = table.sample(np.random.default_rng(0), N_SAMPLES)
+        index, counts = np.unique(values, return_counts=True)
+        np.testing.assert_array_equal(index, [10, 30, 40, 50])
+        np.testing.assert_allclose(counts / N_SAMPLES, [0.1, 0.25, 0.05, 0.6], atol=0.005)
+
+    def test_cache(self):
+        parameters = d.PdfDistributionParameters(pdf=self.pdf.tolist(), index=self.index.tolist())
+        copy = parameters.model_copy(deep=True)
+        table = parameters.alias_table()
+        self.assertIs(parameters.alias_table(), table)
+        self.assertEqual(parameters, copy)
+
+        # Draws reuse the table of the instance, and copies that replace the pdf do not affect it
+        with mock.patch.object(d.AliasTable, "from_pdf", wraps=d.AliasTable.from_pdf) as build:
+            for _ in range(100):
+                sample(d.PdfDistribution(distribution_parameters=parameters), 10, 0)
+            build.assert_not_called()
+            other = parameters.model_copy(update={"pdf": [1.0] + [0.0] * (len(parameters.pdf) - 1)})
+            self.assertEqual(other.alias_table().values[0], parameters.index[0])
+            self.assertIs(parameters.alias_table(), table)
+            self.assertEqual(build.call_count, 1)
+
+        parameters.index = [-1.0] + parameters.index[1:]
+        self.assertIsNot(parameters.alias_table(), table)
+        self.assertEqual(parameters.alias_table().values[0], -1.0)
+        parameters.pdf = [0.0] * (len(parameters.pdf) - 1) + [1.0]
+        np.testing.assert_array_equal(
+            sample(d.PdfDistribution(distribution_parameters=parameters), 10, 0), parameters.index[-1]
+        )
+
+    def test_cache_mutation(self):
+        parameters = d.PdfDistributionParameters(pdf=[0.5, 0.5], index=[0, 1])
+        distribution = d.PdfDistribution(distribution_parameters=parameters)
+        self.assertAlmostEqual(sample(distribution, N_SAMPLES, 0).mean(), 0.5, delta=0.01)
+
+        parameters.pdf[:] = [0.0, 1.0]
+        np.testing.assert_array_equal(sample(distribution, 10, 0), 1)
+        parameters.index[1] = 2
+        np.testing.assert_array_equal(sample(distribution, 10, 0), 2)
+
+    def test_reassignment(self):
+        parameters = d.PdfDistributionParameters(pdf=[0.5, 0.5], index=[0, 1])
+        distribution = d.PdfDistribution(distribution_parameters=parameters)
+        # Reassigned pdfs are not validated, so they are normalized when the table is built
+        parameters.pdf = [1, 3]
+        self.assertAlmostEqual(sample(distribution, N_SAMPLES, 0).mean(), 0.75, delta=0.01)
+        for pdf in ([1, 2, 3], [1, -1], [0, 0]):
+            parameters.pdf = pdf
+            with self.subTest(pdf=pdf), self.assertRaises(ValueError):
+                sample(distribution, 10, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from aind_behavior_services.task_logic import AindBehaviorTaskLogicModel, TaskParameters
+from aind_behavior_services.task_logic import distributions as d
+from aind_behavior_services.task_logic.sampling import sample
+from aind_behavior_services.task_logic.schedule import (
+    SCHEDULE_FILENAME,
+    TrialSchedule,
+    build_trial_schedule,
+    seed_entropy,
+)
+
+
+class Patch(BaseModel):
+    reward_amount: d.Distribution = Field(default=d.Scalar())
+    reward_delay: d.Distribution = Field(default=d.UniformDistribution())
+
+
+class MockTaskParameters(TaskParameters):
+    inter_trial_interval: d.Distribution = Field(
+        default=d.ExponentialDistribution(
+            distribution_parameters=d.ExponentialDistributionParameters(rate=0.5),
+            truncation_parameters=d.TruncationParameters(is_truncated=True, min=1, max=10),
+        )
+    )
+    patches: List[Patch] = Field(
+        default=[
+            Patch(
+                reward_amount=d.PoissonDistribution(),
+                reward_delay=d.UniformDistribution(distribution_parameters=d.UniformDistributionParameters(max=2)),
+            ),
+            Patch(reward_amount=d.Scalar(distribution_parameters=d.ScalarDistributionParameter(value=5))),
+        ]
+    )
+    block_length: int = 10
+
+
+class MockTaskLogic(AindBehaviorTaskLogicModel):
+    name: str = "MockTask"
+    version: str = "0.1.0"
+    task_parameters: MockTaskParameters
+
+
+class TrialScheduleTests(unittest.TestCase):
+    """Tests the pre-drawn trial schedules of a task logic."""
+
+    def setUp(self):
+        self.task_logic = MockTaskLogic(task_parameters=MockTaskParameters(rng_seed=42))
+
+    def test_columns(self):
+        schedule = build_trial_schedule(self.task_logic, 500)
+        self.assertEqual(
+            schedule.names,
+            [
+                "/task_parameters/inter_trial_interval",
+                "/task_parameters/patches/0/reward_amount",
+                "/task_parameters/patches/0/reward_delay",
+                "/task_parameters/patches/1/reward_amount",
+                "/task_parameters/patches/1/reward_delay",
+            ],
+        )
+        self.assertEqual(len(schedule), 500)
+        self.assertEqual(schedule.entropy, 42)
+        self.assertTrue(
+            np.all(
+                (schedule["/task_parameters/inter_trial_interval"] >= 1)
+                & (schedule["/task_parameters/inter_trial_interval"] <= 10)
+            )
+        )
+        np.testing.assert_array_equal(schedule["/task_parameters/patches/1/reward_amount"], 5)
+        self.assertEqual(set(schedule.trial(3)), set(schedule.names))
+
+        # Each column is drawn from its own stream of the seed sequence
+        streams = np.random.SeedSequence(42).spawn(5)
+        expected = sample(
+            self.task_logic.task_parameters.patches[0].reward_delay, 500, np.random.default_rng(streams[2])
+        )
+        np.testing.assert_array_equal(schedule["/task_parameters/patches/0/reward_delay"], expected)
+
+    def test_reproducible(self):
+        first = build_trial_schedule(self.task_logic, 100)
+        second = build_trial_schedule(self.task_logic, 100, rng_seed=42.0)
+        for name in first.names:
+            np.testing.assert_array_equal(first[name], second[name])
+        other = build_trial_schedule(self.task_logic, 100, rng_seed=43)
+        self.assertFalse(
+            np.array_equal(
+                first["/task_parameters/inter_trial_interval"], other["/task_parameters/inter_trial_interval"]
+            )
+        )
+
+        unseeded = build_trial_schedule(MockTaskLogic(task_parameters=MockTaskParameters()), 100)
+        replay = build_trial_schedule(self.task_logic, 100, rng_seed=unseeded.entropy)
+        np.testing.assert_array_equal(
+            unseeded["/task_parameters/inter_trial_interval"], replay["/task_parameters/inter_trial_interval"]
+        )
+
+    def test_longer_schedules_extend_shorter_ones(self):
+        pdf = d.PdfDistribution(distribution_parameters=d.PdfDistributionParameters(pdf=[1, 2, 3], index=[0, 1, 2]))
+        task_logic = MockTaskLogic(task_parameters=MockTaskParameters(rng_seed=42, patches=[Patch(reward_amount=pdf)]))
+        shorter = build_trial_schedule(task_logic, 100)
+        longer = build_trial_schedule(task_logic, 200)
+        for name in shorter.names:
+            with self.subTest(name=name):
+                np.testing.assert_array_equal(longer[name][:100], shorter[name])
+
+    def test_seed_entropy(self):
+        self.assertEqual(seed_entropy(7.0), 7)
+        self.assertNotEqual(seed_entropy(0.5), seed_entropy(0.25))
+        self.assertNotEqual(seed_entropy(-1.0), seed_entropy(1.0))
+        self.assertNotEqual(seed_entropy(None), seed_entropy(None))
+
+    def test_save_load(self):
+        schedule = build_trial_schedule(self.task_logic, 100)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = schedule.save(tmp)
+            self.assertEqual(path, Path(tmp) / SCHEDULE_FILENAME)
+            loaded = TrialSchedule.load(tmp)
+        self.assertEqual(loaded.names, schedule.names)
+        self.assertEqual(loaded.entropy, schedule.entropy)
+        for name in schedule.names:
+            np.testing.assert_array_equal(loaded[name], schedule[name])
+
+        with self.assertRaises(ValueError):
+            TrialSchedule({"a": np.zeros(2), "b": np.zeros(3)}, 0)
+        with self.assertRaises(ValueError):
+            build_trial_schedule(self.task_logic, -1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from aind_behavior_services.calibration.treadmill import (
+    BrakeLookupInterpolator,
+    TreadmillCalibrationOutput,
+    TreadmillEncoderConverter,
+    iter_treadmill_encoder,
+)
+
+from . import write_harp_register
+
+
+class BrakeLookupTests(unittest.TestCase):
+    """Tests the brake lookup interpolation."""
+
+    def setUp(self):
+        self.output = TreadmillCalibrationOutput(brake_lookup_calibration=[[10, 65535], [0, 0], [5, 30000]])
+
+    def test_interpolator(self):
+        interpolator = BrakeLookupInterpolator(self.output)
+        np.testing.assert_array_equal(interpolator.torque, [0, 5, 10])
+        self.assertEqual(interpolator(2.5), 15000)
+        result = interpolator([[-1, 0, 7.5], [10, 20, 5]])
+        self.assertEqual(result.dtype, np.uint16)
+        np.testing.assert_array_equal(result, [[0, 0, 47768], [65535, 65535, 30000]])
+
+    def test_invalid_calibration(self):
+        with self.assertRaises(ValueError):
+            BrakeLookupInterpolator(TreadmillCalibrationOutput(brake_lookup_calibration=[[0, 0], [5, 10], [5, 20]]))
+        with self.assertRaises(ValueError):
+            BrakeLookupInterpolator(TreadmillCalibrationOutput(brake_lookup_calibration=[[0, 0], [5, 10], [6, 5]]))
+
+    def test_table(self):
+        interpolator = BrakeLookupInterpolator(self.output)
+        table = interpolator.to_table(0.01)
+        self.assertEqual(len(table.table), 1001)
+        torque = np.linspace(-2, 12, 1000)
+        # Nearest-grid lookups differ from the interpolation by at most half a step of the steepest segment
+        max_error = 0.5 * 0.01 * (65535 - 30000) / 5 + 1
+        np.testing.assert_allclose(
+            table(torque).astype(float), interpolator(torque).astype(float), rtol=0, atol=max_error
+        )
+        self.assertEqual([table.lookup(t) for t in (-1.0, 2.5, 20.0)], [0, 15000, 65535])
+        with self.assertRaises(ValueError):
+            interpolator.to_table(0)
+
+
+class TreadmillEncoderTests(unittest.TestCase):
+    """Tests the decoding of treadmill encoder data."""
+
+    def setUp(self):
+        self.calibration = TreadmillCalibrationOutput(
+            wheel_diameter=10, pulses_per_revolution=1000, brake_lookup_calibration=[[0, 0], [1, 1]]
+        )
+        self.time = np.arange(5000) * 0.001
+        # Constant velocity of 2 pulses per ms, with a counter that starts close to its maximum
+        self.counts = ((2**31 - 3000 + 2 * np.arange(5000) + 2**31) % 2**32 - 2**31).astype(np.int32)
+        self.distance_per_pulse = np.pi * 10 / 1000
+
+    def test_convert(self):
+        converter = TreadmillEncoderConverter(self.calibration)
+        result = converter.convert(self.time, self.counts)
+        np.testing.assert_allclose(result.distance, 2 * np.arange(5000) * self.distance_per_pulse)
+        self.assertTrue(np.isnan(result.velocity[0]))
+        np.testing.assert_allclose(result.velocity[1:], 2 * self.distance_per_pulse / 0.001)
+
+        inverted = self.calibration.model_copy(update={"invert_direction": True})
+        np.testing.assert_allclose(
+            TreadmillEncoderConverter(inverted).convert(self.time, self.counts).distance, -result.distance
+        )
+
+    def test_chunks(self):
+        expected = TreadmillEncoderConverter(self.calibration).convert(self.time, self.counts)
+        converter = TreadmillEncoderConverter(self.calibration)
+        bounds = [0, 1, 700, 1500, 1500, 4999, 5000]
+        chunks = list(
+            converter.iter_convert((self.time[a:b], self.counts[a:b]) for a, b in zip(bounds[:-1], bounds[1:]))
+        )
+        np.testing.assert_allclose(np.concatenate([c.distance for c in chunks]), expected.distance)
+        np.testing.assert_allclose(np.concatenate([c.velocity for c in chunks]), expected.velocity)
+
+    def test_harp_file(self):
+        expected = TreadmillEncoderConverter(self.calibration).convert(self.time, self.counts)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "Treadmill_32.bin"
+            write_harp_register(path, self.time + 100, self.counts)
+            chunks = list(iter_treadmill_encoder(path, self.calibration, chunk_size=1024))
+        self.assertEqual(len(chunks), 5)
+        np.testing.assert_allclose(np.concatenate([c.time for c in chunks]), self.time + 100, atol=32e-6)
+        np.testing.assert_allclose(np.concatenate([c.distance for c in chunks]), expected.distance)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,21 @@
+import contextlib
 import datetime
+import gc
+import json
+import subprocess
+import sys
+import tempfile
 import unittest
-from typing import Dict, List, Optional
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from unittest import mock
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, PydanticInvalidForJsonSchema, create_model
 
 import aind_behavior_services.utils as utils
+from aind_behavior_services.scripts import regenerate
+
+BONSAI_SGEN_STUB = [sys.executable, str(Path(__file__).parent / "bonsai_sgen_stub.py")]
 
 
 class UtilsTest(unittest.TestCase):
@@ -80,6 +91,445 @@ class TestGetFieldsOfType(unittest.TestCase):
         expected = [("field6", model), ("sub_model", sub_model)]
         self.assertEqual(result, expected)
 
+    def test_get_fields_of_type_search_plan(self):
+        self.assertEqual(utils._search_plan(MockModel, str), ("field2", "sub_model"))
+        self.assertEqual(utils._search_plan(MockModel, float), ("sub_model",))
+        self.assertEqual(utils._search_plan(MockModel, bool), ("field1", "field3", "field4", "field5", "sub_model"))
+        self.assertEqual(utils._search_plan(MockModel, (str, type(None))), ("field2", "field5", "sub_model"))
+        self.assertIs(utils._search_plan(MockModel, str), utils._search_plan(MockModel, str))
+
+        # Annotations cannot rule out subclasses of models, nor defaults, which are not validated
+        class PlanModel(BaseModel):
+            value: float = 1
+            values: List[float] = Field(default_factory=lambda: [1])
+            model: BaseModel = Field(default_factory=lambda: MockModel(field1=1, field2="a", field3=[], field4={}))
+
+        self.assertEqual(utils._search_plan(PlanModel, int), ("value", "values", "model"))
+        self.assertEqual(utils.get_fields_of_type(PlanModel(), int), [("value", 1), (None, 1), ("field1", 1)])
+        self.assertEqual(utils.get_fields_of_type(PlanModel(value=2, values=[2]), int), [("field1", 1)])
+
+
+def resolve_pointer(value, pointer):
+    for token in pointer.split("/")[1:]:
+        token = token.replace("~1", "/").replace("~0", "~")
+        if isinstance(value, list):
+            value = value[int(token)]
+        elif isinstance(value, dict):
+            value = value[token]
+        else:
+            value = getattr(value, token)
+    return value
+
+
+class TestIterFieldsOfType(unittest.TestCase):
+    def setUp(self):
+        self.sub_model = MockModel(field1=4, field2="test", field3=[5], field4={"a/b": 6, "c~d": 7})
+        self.model = MockModel(field1=1, field2="test", field3=[2, 3], field4={}, sub_model=self.sub_model)
+
+    def test_paths(self):
+        result = list(utils.iter_fields_of_type(self.model, int))
+        self.assertEqual(
+            [path for path, _ in result],
+            [
+                "/field1",
+                "/field3/0",
+                "/field3/1",
+                "/sub_model/field1",
+                "/sub_model/field3/0",
+                "/sub_model/field4/a~1b",
+                "/sub_model/field4/c~0d",
+            ],
+        )
+        for path, value in result:
+            self.assertIs(resolve_pointer(self.model, path), value)
+        self.assertEqual([v for _, v in result], [v for _, v in utils.get_fields_of_type(self.model, int)])
+        self.assertEqual(list(utils.iter_fields_of_type([self.model], MockModel)), [("/0", self.model)])
+        self.assertEqual(
+            [p for p, _ in utils.iter_fields_of_type(self.model, MockModel, stop_recursion_on_type=False)],
+            ["/sub_model"],
+        )
+
+    def test_predicate_and_early_exit(self):
+        visited = []
+
+        def is_large(value):
+            visited.append(value)
+            return value > 3
+
+        self.assertEqual(utils.first_of_type(self.model, int, predicate=is_large), ("/sub_model/field1", 4))
+        self.assertEqual(visited, [1, 2, 3, 4])
+        self.assertTrue(utils.any_of_type(self.model, str))
+        self.assertFalse(utils.any_of_type(self.model, float))
+        self.assertIsNone(utils.first_of_type(self.model, int, predicate=lambda v: v > 10))
+        self.assertEqual(
+            list(utils.iter_fields_of_type(self.model, int, recursive=False, predicate=lambda v: v > 0)),
+            [("/field1", 1)],
+        )
+        with self.assertRaises(ValueError):
+            utils.iter_fields_of_type(1, int)
+
+    def test_cycles(self):
+        data = [1, {"key": 2}]
+        data[1]["self"] = data
+        data.append(data)
+        self.assertEqual(list(utils.iter_fields_of_type(data, int)), [("/0", 1), ("/1/key", 2)])
+
+        self.sub_model.sub_model = self.model
+        self.assertEqual(len(utils.get_fields_of_type(self.model, int)), 7)
+        # Shared references that are not cycles are still searched each time
+        shared = {"a": self.sub_model.field3, "b": self.sub_model.field3}
+        self.assertEqual(list(utils.iter_fields_of_type(shared, int)), [("/a/0", 5), ("/b/0", 5)])
+
+
+class CallbackModel(BaseModel):
+    callback: Optional[Callable[[], None]] = None
+
+
+class SchemaCacheTest(unittest.TestCase):
+    class CachedModel(BaseModel):
+        value: int = Field(default=0, description="A value")
+
+    class OtherCachedModel(BaseModel):
+        value: int = Field(default=0, description="Another value")
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.cache = utils.SchemaCache(self.root / "cache")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_fingerprint(self):
+        self.assertEqual(utils.schema_fingerprint(self.CachedModel), utils.schema_fingerprint(self.CachedModel))
+        self.assertNotEqual(utils.schema_fingerprint(self.CachedModel), utils.schema_fingerprint(self.OtherCachedModel))
+        self.assertNotEqual(
+            utils.schema_fingerprint(self.CachedModel),
+            utils.schema_fingerprint(self.CachedModel, def_keyword="$defs"),
+        )
+
+    def test_fingerprint_source(self):
+        fingerprint = utils.schema_fingerprint(self.CachedModel)
+        self.assertIsNotNone(utils._module_source_fingerprint(utils.__name__))
+        with mock.patch.object(utils, "_module_source_fingerprint", return_value="edited"):
+            self.assertNotEqual(utils.schema_fingerprint(self.CachedModel), fingerprint)
+        with mock.patch.object(utils, "pkg_version", "0.0.0"):
+            self.assertNotEqual(utils.schema_fingerprint(self.CachedModel), fingerprint)
+
+    def test_sgen_fingerprint(self):
+        schema = self.root / "schema.json"
+        schema.write_text(utils.export_schema(self.CachedModel), encoding="utf-8")
+        manifest = self.root / ".config" / "dotnet-tools.json"
+        manifest.parent.mkdir()
+        manifest.write_text('{"tools": {"bonsai.sgen": {"version": "0.3.0"}}}', encoding="utf-8")
+        self.assertEqual(utils._find_dotnet_tools_manifest(self.root / ".config"), manifest)
+        self.assertEqual(
+            utils._find_dotnet_tools_manifest(Path(__file__).parent),
+            Path(__file__).parents[1] / ".config" / "dotnet-tools.json",
+        )
+
+        with mock.patch.object(utils, "_find_dotnet_tools_manifest", return_value=manifest):
+            fingerprint = utils._bonsai_sgen_fingerprint(schema, "DataSchema", None)
+            self.assertEqual(utils._bonsai_sgen_fingerprint(schema, "DataSchema", None), fingerprint)
+            self.assertNotEqual(
+                utils._bonsai_sgen_fingerprint(schema, "DataSchema", None, executable=BONSAI_SGEN_STUB), fingerprint
+            )
+            manifest.write_text('{"tools": {"bonsai.sgen": {"version": "0.4.0"}}}', encoding="utf-8")
+            self.assertNotEqual(utils._bonsai_sgen_fingerprint(schema, "DataSchema", None), fingerprint)
+
+    def test_cache_hit_skips_export(self):
+        models = {"cached_model": self.CachedModel}
+        utils.convert_pydantic_to_bonsai(models, schema_path=self.root, skip_sgen=True, cache=self.cache)
+        schema_file = self.root / "cached_model.json"
+        expected = schema_file.read_text(encoding="utf-8")
+        schema_file.unlink()
+
+        with mock.patch.object(utils, "write_schema", wraps=utils.write_schema) as export:
+            utils.convert_pydantic_to_bonsai(models, schema_path=self.root, skip_sgen=True, cache=self.cache)
+            export.assert_not_called()
+        self.assertEqual(schema_file.read_text(encoding="utf-8"), expected)
+
+        with mock.patch.object(utils, "write_schema", wraps=utils.write_schema) as export:
+            utils.convert_pydantic_to_bonsai(
+                {"cached_model": self.OtherCachedModel}, schema_path=self.root, skip_sgen=True, cache=self.cache
+            )
+            export.assert_called_once()
+
+    def test_cache_hit_skips_sgen(self):
+        models = {"cached_model": self.CachedModel}
+        kwargs = dict(schema_path=self.root, output_path=self.root, cache=self.cache, executable=BONSAI_SGEN_STUB)
+        with mock.patch.object(utils, "bonsai_sgen_batch", wraps=utils.bonsai_sgen_batch) as sgen:
+            first = utils.convert_pydantic_to_bonsai(models, **kwargs)
+            second = utils.convert_pydantic_to_bonsai(models, **kwargs)
+            third = utils.convert_pydantic_to_bonsai(models, namespace="Other", **kwargs)
+        self.assertEqual([len(c.args[0]) for c in sgen.call_args_list], [1, 0, 1])
+        self.assertEqual(first["cached_model"].returncode, 0)
+        self.assertIsNone(second["cached_model"])
+        self.assertEqual(third["cached_model"].returncode, 0)
+        self.assertIn("namespace Other", (self.root / "CachedModel.cs").read_text(encoding="utf-8"))
+
+
+class ExportSchemaTest(unittest.TestCase):
+    class DescribedModel(BaseModel):
+        note: str = Field(default="see $defs", description="Mentions $defs and #/$defs/MockModel.")
+        sub_model: Optional[MockModel] = None
+
+    def test_def_keyword(self):
+        schema = json.loads(utils.export_schema(self.DescribedModel, def_keyword="definitions"))
+        default_schema = json.loads(utils.export_schema(self.DescribedModel, def_keyword="$defs"))
+        self.assertEqual(list(schema), ["definitions" if key == "$defs" else key for key in default_schema])
+        self.assertEqual(schema["properties"]["note"]["default"], "see $defs")
+        self.assertEqual(schema["properties"]["note"]["description"], "Mentions $defs and #/$defs/MockModel.")
+        self.assertEqual(
+            schema["properties"]["sub_model"]["oneOf"][0]["$ref"],
+            "#/definitions/MockModel",
+        )
+
+        self.assertEqual(default_schema["properties"]["sub_model"]["oneOf"][0]["$ref"], "#/$defs/MockModel")
+
+    def test_write_schema(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "schema.json"
+            for model in (self.DescribedModel, [self.DescribedModel, MockModel]):
+                utils.write_schema(model, path, models_title="Models")
+                self.assertEqual(path.read_text(encoding="utf-8"), utils.export_schema(model, models_title="Models"))
+
+                utils.write_schema(model, path, models_title="Models", compact=True)
+                compact = path.read_text(encoding="utf-8")
+                self.assertNotIn("\n", compact)
+                self.assertNotIn('": ', compact)
+                self.assertEqual(json.loads(compact), json.loads(utils.export_schema(model, models_title="Models")))
+
+
+class DefinitionsCacheTest(unittest.TestCase):
+    def tearDown(self):
+        utils.CustomGenerateJsonSchema.use_definitions_cache = True
+
+    def _export_uncached(self, model, **kwargs) -> str:
+        utils.CustomGenerateJsonSchema.use_definitions_cache = False
+        try:
+            return utils.export_schema(model, **kwargs)
+        finally:
+            utils.CustomGenerateJsonSchema.use_definitions_cache = True
+
+    def test_shared_definitions(self):
+        from aind_behavior_services.rig import HarpDevice, SpinnakerCamera
+        from aind_behavior_services.task_logic.distributions import Distribution
+
+        class ModelA(BaseModel):
+            devices: List[HarpDevice]
+            camera: SpinnakerCamera
+
+        class ModelB(BaseModel):
+            device: Optional[HarpDevice] = None
+            distributions: Dict[str, Distribution] = {}
+            sub_model: Optional[MockModel] = None
+
+        class ModelC(BaseModel):
+            a: ModelA
+            b: List[ModelB]
+
+        expected = {model: self._export_uncached(model) for model in (ModelA, ModelB, ModelC)}
+        with utils.CustomGenerateJsonSchema.definitions_cache():
+            for model in (ModelA, ModelB, ModelC, ModelB, ModelA):
+                self.assertEqual(utils.export_schema(model), expected[model])
+            self.assertGreater(len(utils._definitions_cache.get()), 0)
+            bundle = utils.export_schema([ModelC, ModelB], models_title="Models")
+        self.assertEqual(bundle, self._export_uncached([ModelC, ModelB], models_title="Models"))
+        self.assertIsNone(utils._definitions_cache.get())
+
+    def test_clear_definitions_cache(self):
+        with utils.CustomGenerateJsonSchema.definitions_cache():
+            utils.export_schema(MockModel)
+            self.assertGreater(len(utils._definitions_cache.get()), 0)
+            utils.CustomGenerateJsonSchema.clear_definitions_cache()
+            self.assertEqual(len(utils._definitions_cache.get()), 0)
+
+    def test_dynamic_models(self):
+        # Classes created and collected in a loop may reuse the id embedded in their core reference
+        for scoped in (False, True):
+            with self.subTest(scoped=scoped):
+                with utils.CustomGenerateJsonSchema.definitions_cache() if scoped else contextlib.nullcontext():
+                    for i in range(20):
+                        inner = create_model("Inner", **{f"field_{i}": (int, 0)})
+                        outer = create_model("Outer", inner=(inner, None))
+                        schema = json.loads(utils.export_schema(outer))
+                        self.assertEqual(list(schema["definitions"]["Inner"]["properties"]), [f"field_{i}"])
+                        del inner, outer
+                        gc.collect()
+
+
+class ConvertPydanticToBonsaiTest(unittest.TestCase):
+    models = {
+        "model_a": SchemaCacheTest.CachedModel,
+        "model_b": SchemaCacheTest.OtherCachedModel,
+        "model_c": MockModel,
+    }
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_parallel_export_matches_sequential(self):
+        utils.convert_pydantic_to_bonsai(self.models, schema_path=self.root, skip_sgen=True)
+        sequential = {name: (self.root / f"{name}.json").read_text(encoding="utf-8") for name in self.models}
+        for name in self.models:
+            (self.root / f"{name}.json").unlink()
+
+        result = utils.convert_pydantic_to_bonsai(self.models, schema_path=self.root, skip_sgen=True, max_workers=2)
+        self.assertEqual(list(result.keys()), list(self.models.keys()))
+        for name in self.models:
+            self.assertEqual((self.root / f"{name}.json").read_text(encoding="utf-8"), sequential[name])
+
+    def test_export_aggregates_failures(self):
+        models = {
+            "model_a": self.models["model_a"],
+            "bad_a": CallbackModel,
+            "model_c": MockModel,
+            "bad_b": CallbackModel,
+        }
+        for max_workers in (1, 2):
+            with self.subTest(max_workers=max_workers):
+                with self.assertRaises(ExceptionGroup) as cm:
+                    utils.convert_pydantic_to_bonsai(
+                        models, schema_path=self.root, skip_sgen=True, max_workers=max_workers
+                    )
+                errors = cm.exception.exceptions
+                self.assertTrue(all(isinstance(e, PydanticInvalidForJsonSchema) for e in errors))
+                self.assertEqual(
+                    [e.__notes__[-1] for e in errors],
+                    [f"Raised while converting '{name}'." for name in ("bad_a", "bad_b")],
+                )
+                for name in ("model_a", "model_c"):
+                    self.assertTrue((self.root / f"{name}.json").is_file())
+                    (self.root / f"{name}.json").unlink()
+
+    def test_sgen_aggregates_failures(self):
+        namespaces = {"model_a": "ModelA", "model_b": "Model B", "model_c": "Model C"}
+        for max_workers in (1, 3):
+            with self.subTest(max_workers=max_workers):
+                with mock.patch.object(utils, "bonsai_sgen_batch", wraps=utils.bonsai_sgen_batch) as sgen:
+                    with self.assertRaises(ExceptionGroup) as cm:
+                        utils.convert_pydantic_to_bonsai(
+                            self.models,
+                            namespace=namespaces,
+                            schema_path=self.root,
+                            output_path=self.root,
+                            max_workers=max_workers,
+                            executable=BONSAI_SGEN_STUB,
+                        )
+                sgen.assert_called_once()
+                self.assertEqual(len(sgen.call_args.args[0]), 3)
+                self.assertEqual(sgen.call_args.kwargs["max_workers"], max_workers)
+                self.assertIn("model_b, model_c", str(cm.exception))
+                errors = cm.exception.exceptions
+                self.assertTrue(all(isinstance(e, subprocess.CalledProcessError) for e in errors))
+                self.assertEqual(
+                    [e.__notes__[-1] for e in errors],
+                    [f"Raised while converting '{name}'." for name in ("model_b", "model_c")],
+                )
+                self.assertIn("namespace ModelA", (self.root / "ModelA.cs").read_text(encoding="utf-8"))
+
+
+class BonsaiSgenBatchTest(unittest.TestCase):
+    executable = BONSAI_SGEN_STUB
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.jobs = []
+        for name, model in [("model_a", SchemaCacheTest.CachedModel), ("mock_model", MockModel)]:
+            (self.root / f"{name}.json").write_text(utils.export_schema(model), encoding="utf-8")
+            self.jobs.append(utils.BonsaiSgenJob(self.root / f"{name}.json", self.root / f"{name}.cs", name.upper()))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_single(self):
+        job = self.jobs[1]
+        utils.bonsai_sgen(
+            job.schema_path,
+            job.output_path,
+            namespace="Single",
+            root_element="Root",
+            serializer=[utils.BonsaiSgenSerializers.JSON, utils.BonsaiSgenSerializers.YAML],
+            executable=self.executable,
+        )
+        generated = Path(job.output_path).read_text(encoding="utf-8")
+        self.assertIn("// serializers: NewtonsoftJson YamlDotNet", generated)
+        self.assertIn("namespace Single", generated)
+        self.assertIn("public partial class Root", generated)
+        self.assertIn("public partial class MockModel", generated)
+
+    def test_batch(self):
+        for max_workers in (1, 2):
+            with self.subTest(max_workers=max_workers):
+                results = utils.bonsai_sgen_batch(self.jobs, executable=self.executable, max_workers=max_workers)
+                self.assertEqual(len(results), len(self.jobs))
+                for job, result in zip(self.jobs, results):
+                    self.assertEqual(result.returncode, 0)
+                    self.assertIn(str(job.output_path), result.stdout)
+                    self.assertIn(f"namespace {job.namespace}", Path(job.output_path).read_text(encoding="utf-8"))
+
+    def test_batch_failures(self):
+        jobs = [self.jobs[0], utils.BonsaiSgenJob(self.root / "missing.json", self.root / "missing.cs"), self.jobs[1]]
+        results = utils.bonsai_sgen_batch(jobs, executable=self.executable, max_workers=2, check=False)
+        self.assertEqual([r.returncode for r in results], [0, 1, 0])
+
+        with self.assertRaises(ExceptionGroup) as cm:
+            utils.bonsai_sgen_batch(jobs, executable=self.executable)
+        self.assertEqual(len(cm.exception.exceptions), 1)
+        self.assertIsInstance(cm.exception.exceptions[0], subprocess.CalledProcessError)
+
+    def test_batch_launch_failures(self):
+        for max_workers in (1, 2):
+            with self.subTest(max_workers=max_workers):
+                with self.assertRaises(ExceptionGroup) as cm:
+                    utils.bonsai_sgen_batch(self.jobs, executable=self.root / "missing", max_workers=max_workers)
+                self.assertEqual(str(cm.exception), "Failed to launch Bonsai.SGen for 2 of 2 job(s) (2 sub-exceptions)")
+                errors = cm.exception.exceptions
+                self.assertTrue(all(isinstance(e, FileNotFoundError) for e in errors))
+                self.assertEqual(
+                    [e.__notes__ for e in errors],
+                    [[f"Raised while launching Bonsai.SGen for '{job.schema_path}'."] for job in self.jobs],
+                )
+
+
+class RegenerateTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        for name, path in [("SCHEMA_ROOT", "schemas"), ("EXTENSIONS_ROOT", "Extensions")]:
+            (self.root / path).mkdir()
+            patcher = mock.patch.object(regenerate, name, self.root / path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_jobs_aggregates_failures(self):
+        bonsai_sgen_batch = utils.bonsai_sgen_batch
+
+        def _sgen_batch(jobs, executable, **kwargs):
+            return bonsai_sgen_batch(jobs, executable=BONSAI_SGEN_STUB, **kwargs)
+
+        # A directory in place of the generated file makes that single job fail.
+        (self.root / "Extensions" / "AindBehaviorSession.cs").mkdir()
+        with mock.patch.object(utils, "bonsai_sgen_batch", side_effect=_sgen_batch) as sgen:
+            with self.assertRaises(ExceptionGroup) as cm:
+                regenerate.main(["--no-cache", "--jobs", "3"])
+        sgen.assert_called_once()
+        self.assertEqual(sgen.call_args.kwargs["max_workers"], 3)
+        self.assertEqual(len(sgen.call_args.args[0]), 3)
+        self.assertEqual(len(cm.exception.exceptions), 1)
+        self.assertIsInstance(cm.exception.exceptions[0], subprocess.CalledProcessError)
+        self.assertIn("Raised while converting 'aind_behavior_session'.", cm.exception.exceptions[0].__notes__)
+        self.assertTrue((self.root / "Extensions" / "AindManipulatorCalibrationRig.cs").is_file())
+
 
 if __name__ == "__main__":
     unittest.main()
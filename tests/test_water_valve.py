@@ -1,11 +1,14 @@
 import unittest
 from datetime import datetime
 
+import numpy as np
 from pydantic import ValidationError
 
 from aind_behavior_services.calibration.water_valve import (
     Measurement,
+    ValveOpenTimeEvaluator,
     WaterValveCalibration,
+    WaterValveCalibrationAccumulator,
     WaterValveCalibrationInput,
     WaterValveCalibrationOutput,
 )
@@ -70,6 +73,96 @@ class WaterValveTests(unittest.TestCase):
         self.assertAlmostEqual(_offset, calibration.output.offset, 2, "Offset is not almost equal")
         self.assertAlmostEqual(1.0, calibration.output.r2, 2, "R2 is not almost equal")
 
+    def test_accumulator(self):
+        """Test that the incremental calibration matches the batch calibration."""
+        rng = np.random.default_rng(0)
+        _delta_times = [0.1, 0.2, 0.3, 0.4, 0.5]
+        _measurements = [
+            Measurement(
+                valve_open_interval=0.5,
+                valve_open_time=t,
+                water_weight=list(water_mock_model(t, 10.1, 0.3) * 100 + rng.normal(0, 0.05, size=3)),
+                repeat_count=100,
+            )
+            for t in _delta_times * 2
+        ]
+
+        accumulator = WaterValveCalibrationAccumulator()
+        with self.assertRaises(ValueError):
+            accumulator.calibrate_output()
+        for i, measurement in enumerate(_measurements):
+            accumulator.update(measurement)
+            if i == 0:
+                continue
+            expected = WaterValveCalibrationInput(measurements=_measurements[: i + 1]).calibrate_output()
+            output = accumulator.calibrate_output()
+            self.assertAlmostEqual(output.slope, expected.slope)
+            self.assertAlmostEqual(output.offset, expected.offset)
+            self.assertAlmostEqual(output.r2, expected.r2)
+            self.assertEqual(output.valid_domain, expected.valid_domain)
+            self.assertEqual(list(output.interval_average), list(expected.interval_average))
+            for x, volume in expected.interval_average.items():
+                self.assertAlmostEqual(output.interval_average[x], volume)
+
+        self.assertEqual(accumulator.to_input(), WaterValveCalibrationInput(measurements=_measurements))
+        self.assertEqual(
+            WaterValveCalibrationAccumulator(_measurements).calibrate_output(), accumulator.calibrate_output()
+        )
+
+
+class ValveOpenTimeEvaluatorTests(unittest.TestCase):
+    """Tests the conversion of volumes to valve open times."""
+
+    def setUp(self):
+        self.output = WaterValveCalibrationOutput(
+            interval_average={0.1: 0.7, 0.2: 1.9, 0.4: 3.7},
+            slope=10.0,
+            offset=-0.3,
+            r2=0.99,
+            valid_domain=[0.1, 0.2, 0.4],
+        )
+
+    def test_linear(self):
+        evaluator = ValveOpenTimeEvaluator(self.output)
+        self.assertAlmostEqual(evaluator(1.7), 0.2)
+        self.assertIsInstance(evaluator(1.7), float)
+        volumes = np.array([[0.7, 1.7], [2.7, 3.7]])
+        np.testing.assert_allclose(evaluator(volumes), [[0.1, 0.2], [0.3, 0.4]])
+        np.testing.assert_allclose(evaluator.volume(evaluator(volumes)), volumes)
+        np.testing.assert_allclose(evaluator.volume_domain, (0.7, 3.7))
+
+    def test_interpolation(self):
+        evaluator = ValveOpenTimeEvaluator(self.output, method="interpolation")
+        np.testing.assert_allclose(evaluator([0.7, 1.3, 1.9, 2.8, 3.7]), [0.1, 0.15, 0.2, 0.3, 0.4])
+
+        with self.assertRaises(ValueError):
+            ValveOpenTimeEvaluator(
+                self.output.model_copy(update={"interval_average": {0.1: 0.7, 0.2: 0.6}}), method="interpolation"
+            )
+
+    def test_out_of_range(self):
+        volumes = [0.1, 2.7, 10.0]
+        for method in ("linear", "interpolation"):
+            with self.subTest(method=method):
+                np.testing.assert_allclose(ValveOpenTimeEvaluator(self.output, method)(volumes)[[0, 2]], [0.1, 0.4])
+                result = ValveOpenTimeEvaluator(self.output, method, out_of_range="nan")(volumes)
+                self.assertTrue(np.isnan(result[0]) and np.isnan(result[2]) and np.isfinite(result[1]))
+                with self.assertRaises(ValueError):
+                    ValveOpenTimeEvaluator(self.output, method, out_of_range="raise")(volumes)
+
+        unbounded = ValveOpenTimeEvaluator(self.output.model_copy(update={"valid_domain": None}))
+        self.assertAlmostEqual(unbounded(10.3), 1.06)
+        with self.assertRaises(ValueError):
+            unbounded.lookup_table(0.01)
+
+    def test_lookup_table(self):
+        evaluator = ValveOpenTimeEvaluator(self.output)
+        times, volumes = evaluator.lookup_table(0.01)
+        self.assertEqual(len(times), 31)
+        self.assertAlmostEqual(times[0], 0.1)
+        self.assertAlmostEqual(times[-1], 0.4)
+        np.testing.assert_allclose(evaluator(volumes), times)
+
 
 def water_mock_model(time: float, slope: float, offset: float) -> float:
     return slope * time + offset